@@ -0,0 +1,87 @@
+"""
+Compare batch assembly of `SegmentsGenerator.to_samples` (preallocated arrays gathered
+through augmentation index arrays) against the previous list based assembly
+(lists of augmented items zipped into per sample tuples, then stacked) on synthetic pairs.
+
+    PYTHONPATH=src python benchmarks/generator.py
+"""
+import random
+import time
+from functools import reduce
+
+import numpy as np
+
+from core.augmentor import Augmentor
+from core.augmentor_impl import Scale
+from core.generator import SegmentsGenerator
+from core.models import AVOLNet
+
+batch_size = 16
+frame_shape = (256, 341, 3)
+
+
+def legacy(generator, batch, rng):
+    batch_x, batch_y = zip(*batch)
+    frames, spectrograms = zip(*batch_x)
+
+    frames = list(reduce(list.__add__, list(map(lambda f: generator.augment_vision(f, rng), frames))))
+    spectrograms = list(reduce(list.__add__, list(map(generator.augment_audio, spectrograms))))
+    labels = generator.to_labels(batch_y)
+
+    samples = list()
+    for i in range(len(labels)):
+        for v in range(len(generator.vision_augmentor)):
+            for a in range(len(generator.audio_augmentor)):
+                samples.append((frames[v + i * len(generator.vision_augmentor)],
+                                spectrograms[a + i * len(generator.audio_augmentor)],
+                                labels[i]))
+
+    frames, spectrograms, labels = zip(*samples)
+    return (np.asarray(frames, dtype=np.float32),
+            np.asarray(spectrograms, dtype=np.float32),
+            np.asarray(labels, dtype=np.float32))
+
+
+def vectorized(generator, batch, rng):
+    return generator.to_samples(batch, rng)
+
+
+def measure(function, generator, batch, repeat=5):
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(generator, batch, random.Random(0))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    model = AVOLNet()
+    np_random = np.random.RandomState(0)
+    batch = list()
+    for i in range(2 * batch_size):
+        frame = np_random.randint(0, 256, frame_shape, dtype=np.uint8)
+        spectrogram = np_random.uniform(0, 255, model.audio_input_shape[:-1]).astype(np.float32)
+        batch.append(((frame, spectrogram), i % 2))
+
+    for augmentor in (None, Augmentor(Scale(2)), Augmentor(Scale(2), Scale(.5))):
+        # only the augmentation state is needed to assemble batches, no segments are loaded
+        generator = object.__new__(SegmentsGenerator)
+        generator.model = model
+        generator.batch_size = batch_size
+        generator.vision_augmentor = generator.audio_augmentor = augmentor or SegmentsGenerator.default_augmentor
+        generator.augmentation_factor = len(generator.vision_augmentor) * len(generator.audio_augmentor)
+
+        legacy_time = measure(legacy, generator, batch)
+        vectorized_time = measure(vectorized, generator, batch)
+        same = all(map(lambda x: np.allclose(*x), zip(legacy(generator, batch, random.Random(0)),
+                                                      vectorized(generator, batch, random.Random(0)))))
+
+        print('augmentation factor {}:'.format(generator.augmentation_factor))
+        print('  legacy:     {:.1f} batches/s'.format(1 / legacy_time))
+        print('  vectorized: {:.1f} batches/s ({:.1f}x)'.format(1 / vectorized_time, legacy_time / vectorized_time))
+        print('  same samples: {}'.format(same))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare retrieving every AudioSet class from the ontology root by its id, name and slug with the
+previous recursive `Entry.__getitem__` (depth first search, `item in child` then `child[item]`,
+with the per entry `_keys_cache`) against the hash index of `Entry` and `Ontology`.
+
+    PYTHONPATH=src python benchmarks/ontology.py [ONTOLOGY_FILE]
+"""
+import sys
+import time
+from collections import defaultdict
+
+from core.ontology import Ontology
+
+keys_caches = defaultdict(dict)
+
+
+def legacy_contains(entry, key):
+    keys_cache = keys_caches[id(entry)]
+    if key not in keys_cache:
+        keys_cache[key] = entry == key or any(map(lambda child: legacy_contains(child, key), entry.children))
+    return keys_cache[key]
+
+
+def legacy_getitem(entry, item):
+    if item == entry:
+        return entry
+
+    for child in entry.children:
+        if legacy_contains(child, item):
+            return legacy_getitem(child, item)
+
+    raise KeyError(item)
+
+
+def measure(function, keys):
+    start = time.perf_counter()
+    for key in keys:
+        function(key)
+    return time.perf_counter() - start
+
+
+def main(filename='tests/data/ontology/ontology.json'):
+    ontology = Ontology(filename, None)
+    root = ontology.retrieve()
+    keys = [key for entry in ontology.entries for key in entry.identifiers]
+
+    cold_legacy_time = measure(lambda key: legacy_getitem(root, key), keys)
+    legacy_time = measure(lambda key: legacy_getitem(root, key), keys)
+    cold_index_time = measure(lambda key: root[key], keys)
+    index_time = measure(lambda key: root[key], keys)
+    ontology_time = measure(lambda key: ontology[key], keys)
+    same = all(map(lambda key: legacy_getitem(root, key) is root[key] is ontology[key], keys))
+
+    print('{} lookups ({} classes)'.format(len(keys), len(ontology.entries)))
+    print('  legacy:         {:.4f}s (first pass {:.4f}s)'.format(legacy_time, cold_legacy_time))
+    print('  entry index:    {:.4f}s (first pass {:.4f}s, {:.0f}x)'.format(index_time, cold_index_time,
+                                                                           legacy_time / index_time))
+    print('  ontology index: {:.4f}s ({:.0f}x)'.format(ontology_time, legacy_time / ontology_time))
+    print('  same entries: {}'.format(same))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,89 @@
+"""
+Compare loading the AudioSet segments csv files with the previous `SegmentsWrapper.segments`
+(python parser, one `Segment` per `iterrows` row) against the columnar `SegmentsWrapper.table`
+with `Segment` objects created on access, and report the memory held by the table.
+
+    PYTHONPATH=src python benchmarks/segments.py [DATA_DIR]
+
+Files missing from DATA_DIR/segments are replaced by synthetic files with the same number of rows.
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from core.segments import Segment, SegmentsWrapper
+
+segments_files = {
+    'eval_segments.csv': 20383,
+    'balanced_train_segments.csv': 22160,
+    'unbalanced_train_segments.csv': 2041789
+}
+
+
+def synthesize(filename, rows):
+    rng = random.Random(0)
+    labels = ['/m/{}'.format(''.join(rng.choices(string.ascii_lowercase + string.digits, k=5)))
+              for _ in range(527)]
+
+    with open(filename, 'w') as outfile:
+        outfile.write('# Segments csv created for benchmarking\n')
+        outfile.write('# YTID, start_seconds, end_seconds, positive_labels\n')
+        for _ in range(rows):
+            ytid = ''.join(rng.choices(string.ascii_letters + string.digits + '-_', k=11))
+            start = rng.randrange(0, 600)
+            outfile.write('{}, {:.3f}, {:.3f}, "{}"\n'.format(ytid, start, start + 10,
+                                                              ','.join(rng.sample(labels, rng.randint(1, 4)))))
+
+
+def legacy(filename, root_dir):
+    def to_segment(row):
+        row = [*row[1]]
+        row[-1] = row[-1].strip('"').split(',')
+        return Segment(root_dir, *row)
+
+    csv = pd.read_csv(filename,
+                      sep=', ',
+                      header=None,
+                      engine='python',
+                      comment='#')
+    return list(map(to_segment, csv.iterrows()))
+
+
+def measure(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main(data_dir='data'):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root_dir = os.path.join(temp_dir, 'raw')
+
+        for file, rows in segments_files.items():
+            filename = os.path.join(data_dir, 'segments', file)
+            if not os.path.exists(filename):
+                filename = os.path.join(temp_dir, file)
+                synthesize(filename, rows)
+                file = '{} (synthetic)'.format(file)
+
+            wrapper = SegmentsWrapper(filename, root_dir)
+            legacy_time = measure(lambda: legacy(filename, root_dir))
+            table_time = measure(lambda: wrapper.table)
+            access_time = measure(lambda: wrapper[len(wrapper) // 2])
+            lookup_time = measure(lambda: wrapper.table.ytids[0] in wrapper)
+
+            print('{}: {} rows'.format(file, len(wrapper)))
+            print('  legacy:       {:.3f}s'.format(legacy_time))
+            print('  table:        {:.3f}s ({:.1f}x)'.format(table_time, legacy_time / table_time))
+            print('  first access: {:.6f}s'.format(access_time))
+            print('  first lookup: {:.3f}s'.format(lookup_time))
+            print('  table memory: {:.1f} MiB'.format(wrapper.table.nbytes / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,73 @@
+"""
+Compare per-frame spectrogram computation (one `tp.spectrogram` call per frame index)
+against `ops.compute_full_spectrogram` sliced with `ops.spectrogram_columns` on a 10 seconds segment.
+Values only differ where the -80 dB floor of a one-second spectrogram (relative to its own maximum)
+is above the floor of the full spectrogram.
+
+    PYTHONPATH=src python benchmarks/spectrogram.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from core import ops
+from util import tensorplow as tp
+
+frame_rate = 25
+sample_rate = ops.spectrogram_sample_rate
+segment_seconds = 10
+
+
+def loop(waveform):
+    spectrograms = list()
+    for j in range(segment_seconds * frame_rate):
+        start = j * sample_rate // frame_rate
+        spc = tp.spectrogram(waveform[start:start + sample_rate],
+                             sample_rate=sample_rate,
+                             window_length=ops.spectrogram_window_length,
+                             overlap=ops.spectrogram_overlap)
+        spectrograms.append(spc.numpy().astype(np.float32))
+    return np.stack(spectrograms)
+
+
+def full(waveform, output):
+    ops.compute_full_spectrogram(waveform, output, overwrite=True)
+    spectrogram = ops.load_full_spectrogram(output)
+    ops.release_memmaps(output)
+    return np.stack([spectrogram[:, ops.spectrogram_columns(j * sample_rate // frame_rate, sample_rate)]
+                     for j in range(segment_seconds * frame_rate)])
+
+
+def measure(function, *args, repeat=3):
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    random = np.random.RandomState(0)
+    waveform = random.uniform(-1, 1, ((segment_seconds + 1) * sample_rate, 1)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = os.path.join(temp_dir, 'spectrogram.npy')
+
+        # warm up tensorflow
+        tp.spectrogram(waveform[:sample_rate], sample_rate=sample_rate,
+                       window_length=ops.spectrogram_window_length, overlap=ops.spectrogram_overlap)
+
+        loop_time = measure(loop, waveform)
+        full_time = measure(full, waveform, output)
+        error = np.abs(loop(waveform) - full(waveform, output)).max()
+
+    print('loop: {:.3f}s'.format(loop_time))
+    print('full: {:.3f}s ({:.1f}x)'.format(full_time, loop_time / full_time))
+    print('max abs difference: {:.2e}'.format(error))
+
+
+if __name__ == '__main__':
+    main()
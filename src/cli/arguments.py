@@ -28,3 +28,9 @@ output_file =\
                    nargs=1,
                    required=True,
                    type=click.Path(dir_okay=False, resolve_path=True))
+
+output_dir =\
+    click.argument('output_dir',
+                   nargs=1,
+                   required=True,
+                   type=click.Path(file_okay=False, resolve_path=True))
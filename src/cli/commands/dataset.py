@@ -20,6 +20,9 @@ def init(**kwargs):
 @options.limit
 @options.min_size
 @options.max_size
+@options.workers
+@options.info_ttl
+@options.trim
 @arguments.labels
 @utils.display_params
 def download(**kwargs):
@@ -31,12 +34,29 @@ def download(**kwargs):
 @arguments.data_dir
 @options.segments
 @options.workers
+@options.features
+@options.spectrogram_backend
 @utils.display_params
 def preprocess(**kwargs):
     """ Preprocess the dataset. """
     commands.dataset.preprocess(**kwargs)
 
 
+@groups.dataset.command()
+@options.data_dir
+@options.segments
+@options.ontology
+@options.shard_size
+@options.features
+@options.spectrogram_backend
+@arguments.labels
+@arguments.output_dir
+@utils.display_params
+def pack(**kwargs):
+    """ Pack preprocessed segments into sequential shards. """
+    commands.dataset.pack(**kwargs)
+
+
 @groups.dataset.command()
 @arguments.data_dir
 @options.segments
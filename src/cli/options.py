@@ -104,6 +104,38 @@ workers =\
                  show_default=True,
                  help='number of workers/thread to use.')
 
+info_ttl =\
+    click.option('-it', '--info-ttl',
+                 type=click.IntRange(min=0),
+                 default=7,
+                 show_default=True,
+                 help='number of days a youtube info is reused from cache.')
+
+trim =\
+    click.option('-t', '--trim',
+                 type=click.FloatRange(min=0),
+                 help='only keep the segment window of the downloaded videos, with TRIM seconds before and after.')
+
+shard_size =\
+    click.option('-ss', '--shard-size',
+                 type=click.IntRange(min=1),
+                 default=1024,
+                 show_default=True,
+                 help='approximate size of each shard (in MB).')
+
+features =\
+    click.option('-ft', '--features',
+                 type=types.Features(),
+                 help='features to extract, e.g. "frame_rate=30,window_length=0.02" '
+                      '(frame_rate, frame_size, sample_rate, window_length and overlap).')
+
+spectrogram_backend =\
+    click.option('-sb', '--spectrogram-backend',
+                 type=click.Choice(['numpy', 'tensorflow']),
+                 default='numpy',
+                 show_default=True,
+                 help='library computing the spectrograms.')
+
 preprocess =\
     click.option('--preprocess',
                  is_flag=True,
@@ -3,6 +3,8 @@ from operator import attrgetter
 
 import click
 
+from core import ops
+
 
 class DataDir(click.Path):
     name = 'data_dir'
@@ -213,3 +215,31 @@ class TempDir(DataDirDependent):
 
     def get_subpath(self, value):
         return '.temp'
+
+
+class Features(click.ParamType):
+    name = 'features'
+
+    def get_metavar(self, param):
+        return 'KEY=VALUE[,KEY=VALUE...]'
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, ops.FeatureConfig):
+            return value
+
+        params = dict()
+        for item in filter(None, value.split(',')):
+            key, _, number = item.partition('=')
+            key = key.strip()
+            if key not in ops.FeatureConfig._fields:
+                self.fail('Unknown feature "{}" (one of {})'.format(key, ', '.join(ops.FeatureConfig._fields)),
+                          param, ctx)
+            try:
+                params[key] = type(getattr(ops.default_features, key))(number)
+            except ValueError:
+                self.fail('Invalid value for feature "{}": {}'.format(key, number), param, ctx)
+
+            if params[key] <= 0:
+                self.fail('Feature "{}" must be positive (not {})'.format(key, number), param, ctx)
+
+        return ops.default_features._replace(**params)
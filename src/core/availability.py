@@ -0,0 +1,97 @@
+import json
+import os
+
+from util import youtube as yt
+from util.filesystem import atomic_output
+
+availability_filename = 'availability.json'
+
+
+class AvailabilityIndex:
+    """
+    Index of the raw video of every segment directory under `root_dir`, built with a single scan
+    of the directory instead of globbing each segment. With `cache`, the index is saved in `root_dir`
+    and on the next scan only the segment directories modified since then are listed again.
+    """
+
+    def __init__(self, root_dir, cache=True):
+        self.root_dir = root_dir
+        self.cache = cache
+        self.__raws = None
+
+    @property
+    def cache_file(self):
+        return os.path.join(self.root_dir, availability_filename)
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return dict()
+
+    @staticmethod
+    def scan_segment(segment_dir, ytid):
+        with os.scandir(segment_dir) as entries:
+            return sorted(entry.name for entry in entries if yt.is_outfile(entry.name, ytid))
+
+    def save_cache(self, scanned):
+        try:
+            with atomic_output(self.cache_file) as output:
+                with open(output, 'w') as cache_file:
+                    json.dump(scanned, cache_file)
+        except OSError:
+            # the index is still usable from a read only directory
+            pass
+
+    def scan(self):
+        if not os.path.isdir(self.root_dir):
+            self.__raws = dict()
+            return self.__raws
+
+        cached = self.load_cache() if self.cache else dict()
+        scanned = dict()
+
+        with os.scandir(self.root_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+
+                mtime = entry.stat().st_mtime_ns
+                if entry.name in cached and cached[entry.name][0] == mtime:
+                    scanned[entry.name] = cached[entry.name]
+                else:
+                    scanned[entry.name] = [mtime, self.scan_segment(entry.path, entry.name)]
+
+        if self.cache and scanned != cached:
+            self.save_cache(scanned)
+
+        self.__raws = {ytid: raws for ytid, (_, raws) in scanned.items() if raws}
+        return self.__raws
+
+    @property
+    def raws(self):
+        if self.__raws is None:
+            self.scan()
+        return self.__raws
+
+    def raw(self, ytid):
+        files = self.raws.get(ytid)
+
+        if not files:
+            raise FileNotFoundError('RAW ({})'.format(ytid))
+        if len(files) > 1:
+            raise AssertionError('Multiple RAW files found: {}'.format(files))
+        return os.path.join(self.root_dir, ytid, files[0])
+
+    def get(self, ytid, default=None):
+        try:
+            return self.raw(ytid)
+        except (FileNotFoundError, AssertionError):
+            return default
+
+    def __contains__(self, ytid):
+        return ytid in self.raws
+
+    def __len__(self):
+        return len(self.raws)
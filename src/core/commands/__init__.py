@@ -1,2 +1,10 @@
-from . import avc
+import importlib
+
 from . import dataset
+
+
+def __getattr__(name):
+    # avc imports TensorFlow, which the dataset commands (and their workers) don't need
+    if name == 'avc':
+        return importlib.import_module('.avc', __name__)
+    raise AttributeError('module {} has no attribute {}'.format(__name__, name))
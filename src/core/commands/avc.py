@@ -24,29 +24,19 @@ def train(data_dir, train_segments, negative_segments, valid_segments, ontology,
     random.seed(seed)
     tf.random.set_seed(seed)
 
-    raw_dir = os.path.join(data_dir, 'raw')
-    train_segments = SegmentsWrapper(train_segments, raw_dir)
-    valid_segments = SegmentsWrapper(valid_segments, raw_dir)
-    negative_segments = SegmentsWrapper(negative_segments, raw_dir)
-
-    def segment_in_ontology(o):
-        def decorator(s):
-            return any(map(o.__contains__, s.positive_labels))
-
-        return decorator
-
     videos_dir = os.path.join(data_dir, 'videos')
     ontology = Ontology(ontology, videos_dir)
-    ontologies = ontology.retrieve(*labels)
 
-    train_segments = filter(segment_in_ontology(ontologies), train_segments)
-    train_segments = list(filter(attrgetter('is_available'), train_segments))
+    raw_dir = os.path.join(data_dir, 'raw')
+    train_segments = SegmentsWrapper(train_segments, raw_dir, ontology=ontology).available()
+    valid_segments = SegmentsWrapper(valid_segments, raw_dir, ontology=ontology).available()
+    negative_segments = SegmentsWrapper(negative_segments, raw_dir, ontology=ontology).available()
+
+    train_segments = train_segments.filter(*labels, ontology=ontology)
 
-    valid_segments = filter(segment_in_ontology(ontologies), valid_segments)
-    valid_segments = list(filter(attrgetter('is_available'), valid_segments))
+    valid_segments = valid_segments.filter(*labels, ontology=ontology)
 
-    negative_segments = filter(segment_in_ontology(ontologies), negative_segments)
-    negative_segments = list(filter(attrgetter('is_available'), negative_segments))
+    negative_segments = negative_segments.filter(*labels, ontology=ontology)
 
     os.makedirs(logdir, exist_ok=True)
 
@@ -59,8 +49,8 @@ def train(data_dir, train_segments, negative_segments, valid_segments, ontology,
     print(len(train_segments), len(valid_segments))
     model = models.retrieve_model(network)()
 
-    train_generator = SegmentsGenerator(train_segments, negative_segments, model, 55)
-    valid_generator = SegmentsGenerator(valid_segments, negative_segments, model, 34)
+    train_generator = SegmentsGenerator(train_segments, model, 55, negative_segments=negative_segments)
+    valid_generator = SegmentsGenerator(valid_segments, model, 34, negative_segments=negative_segments)
 
     def decayer(epoch):
         return 1e-5 * math.pow((94. / 100), ((1 + epoch) // 16))
@@ -84,13 +74,13 @@ def train(data_dir, train_segments, negative_segments, valid_segments, ontology,
     else:
         model: Model = model.compile()
 
-    model.fit_generator(train_generator,
-                        epochs=epochs,
-                        callbacks=callbacks,
-                        validation_data=valid_generator,
-                        workers=34,
-                        max_queue_size=21,
-                        initial_epoch=initial_epoch)
+    model.fit(train_generator.to_dataset(seed),
+              steps_per_epoch=len(train_generator),
+              epochs=epochs,
+              callbacks=callbacks,
+              validation_data=valid_generator.to_dataset(seed),
+              validation_steps=len(valid_generator),
+              initial_epoch=initial_epoch)
 
     model_filepath = os.path.join(modeldir, '{}.h5'.format(output))
     model.save(model_filepath)
@@ -203,5 +193,6 @@ def test(input_file, model, output_file, data_dir, tempdir, threshold, workers):
     if len(failed_frames) > 0:
         print('The following frames cannot be processed:', failed_frames)
     else:
+        ops.extract_audio(segment.raw, segment.wav)
         ops.merge_frames(outputs_dir, segment.wav, output_file)
         print('Output saved to', output_file)
@@ -1,19 +1,20 @@
+import multiprocessing
 import os
 import pprint
 import random
 import shutil
 import stat
-from operator import attrgetter, itemgetter
+from multiprocessing.pool import ThreadPool
 
-import math
 import pandas as pd
 import wget
 
 import util.youtube as yt
-from core import ops
+from core import ops, packs
+from core.manifest import PreprocessManifest
 from core.ontology import Ontology
+from core.quota import LabelQuota
 from core.segments import SegmentsWrapper
-from util.threading import fork
 
 
 def init(data_dir, overwrite=False):
@@ -67,149 +68,241 @@ def init(data_dir, overwrite=False):
                 os.remove(os.path.join(parent_dir, file))
 
 
-def download(labels, data_dir, segments, ontology, limit=None, min_size=None, max_size=None, blacklist=None, seed=None):
+def download_segment(segment, quota, blacklist, downloader, min_size=None, max_size=None, trim=None):
+    if quota.finished:
+        return
+
+    print(list(quota.counts.values()))
+
+    if segment.ytid in blacklist:
+        print('[{}] is blacklisted. {}.'.format(segment.ytid, blacklist[segment.ytid]))
+        return
+
+    if segment.ytid in downloader.failures:
+        print('[{}] has failed before. {}'.format(segment.ytid, downloader.failures[segment.ytid]))
+        return
+
+    exceeded = quota.reserve(segment)
+    if exceeded:
+        print('[{}] "{}" has reached limit.'.format(segment.ytid, exceeded))
+        return
+
+    downloaded = False
+    try:
+        info = downloader.probe(segment.ytid)
+        if info == -1:
+            return
+
+        filesize = int(info['filesize'] / 1024 / 1024) if info['filesize'] is not None else None
+
+        if filesize is None:
+            print('[{}] cannot retrieve filesize from youtube info'.format(segment.ytid))
+            return
+
+        if min_size is not None and filesize < min_size:
+            print('[{}] smaller than min_size ({} MiB).'.format(segment.ytid, filesize))
+            return
+
+        if max_size is not None and filesize > max_size:
+            print('[{}] exceeds max_size ({} MiB).'.format(segment.ytid, filesize))
+            return
+
+        downloaded = downloader.dl(segment.ytid, outtmpl=segment.ydl_outtmpl) != -1
+
+        if downloaded and trim is not None:
+            try:
+                print('[{}] trimmed to {}.'.format(segment.ytid, os.path.basename(segment.trim(trim))))
+            except (FileNotFoundError, RuntimeError, ValueError) as e:
+                # the full video is kept (e.g. a segment starting after the end of the video)
+                print('[{}] cannot be trimmed ({}).'.format(segment.ytid, e))
+    finally:
+        if downloaded:
+            quota.commit(segment)
+        else:
+            quota.release(segment)
+
+
+def download(labels, data_dir, segments, ontology, limit=None, min_size=None, max_size=None, blacklist=None, seed=None,
+             workers=1, info_ttl=7, trim=None):
+    if not isinstance(workers, int):
+        raise TypeError('WORKERS can\'t be of type {}'.format(type(workers).__name__))
+
+    if workers < 0:
+        raise ValueError('WORKERS must be positive (not {}).'.format(workers))
+
+    if trim is not None and trim < 0:
+        raise ValueError('TRIM must be positive (not {}).'.format(trim))
+
     random.seed(seed)
-    segments = SegmentsWrapper(segments, os.path.join(data_dir, 'raw'))
     ontology = Ontology(ontology, os.path.join(data_dir, 'videos'))
+    segments = SegmentsWrapper(segments, os.path.join(data_dir, 'raw'), ontology=ontology)
+    available = segments.availability
+    downloader = yt.YoutubeDownloader(os.path.join(data_dir, yt.failures_filename),
+                                      info_file=os.path.join(data_dir, yt.info_cache_filename),
+                                      info_ttl=info_ttl * 24 * 60 * 60)
 
     if blacklist is None:
-        blacklist = pd.DataFrame(columns=['YTID', 'reason'])
+        blacklist = dict()
     else:
-        blacklist = pd.read_csv(blacklist)
+        blacklist = pd.read_csv(blacklist, dtype=str, keep_default_na=False)
+        blacklist = dict(zip(blacklist['YTID'], blacklist['reason']))
 
-    def segment_in_ontology(o):
-        def decorator(s):
-            return any(map(o.__contains__, s.positive_labels))
-        return decorator
+    segments = list(segments.filter(*labels, ontology=ontology))
+    downloaded = list(filter(lambda s: s.ytid in available, segments))
+    segments = list(filter(lambda s: s.ytid not in available, segments))
 
-    def filter_by_ontology(s):
-        def decorator(o):
-            return list(filter(segment_in_ontology(o), s))
-        return decorator
-
-    ontologies = ontology.retrieve(*labels)
-    segments = list(filter(segment_in_ontology(ontologies), segments))
-
-    ontologies = list(map(ontology.retrieve, labels))
-    downloaded = list(filter(attrgetter('is_available'), segments))
-    downloaded = map(filter_by_ontology(downloaded), ontologies)
-    downloaded = zip(map(attrgetter('name'), ontologies), downloaded)
-
-    counter = {name: s for name, s in downloaded}
-    pprint.pprint({name: len(s) for name, s in counter.items()})
+    quota = LabelQuota({label: ontology.descendants(label) for label in labels}, limit, downloaded)
+    pprint.pprint(quota.counts)
 
     random.shuffle(segments)
 
-    for segment in segments:
-        finished = limit is not None and all(map(limit.__le__, map(len, counter.values())))
-        print(list(map(len, counter.values())))
-
-        if finished:
-            break
+    def download_function(segment):
+        return download_segment(segment, quota, blacklist, downloader, min_size, max_size, trim)
 
-        if not any(map(lambda x: segment.ytid in x, counter.values())):
+    if workers == 1:
+        for _ in map(download_function, segments):
+            if quota.finished:
+                break
+        return
 
-            if limit is not None:
-                ok = True
-                exceeded = list()
+    # downloads are network bound, a thread pool is enough to keep several of them in flight
+    with ThreadPool(workers or None) as pool:
+        for _ in pool.imap_unordered(download_function, segments):
+            pass
 
-                for ont in ontologies:
-                    if segment_in_ontology(ont)(segment) and len(counter[ont.name]) >= limit:
-                        ok = False
-                        exceeded.append(ont.proper_name)
 
-                if not ok:
-                    print('[{}] "{}" has reached limit.'.format(segment.ytid, exceeded))
-                    continue
+def preprocess_segment(segment, outputs=PreprocessManifest.outputs):
+    worker = multiprocessing.current_process()
+    in_worker = worker.name != 'MainProcess'
 
-            blacklisted = blacklist[blacklist['YTID'] == segment.ytid]
-            if not blacklisted.empty:
-                print('[{}] is blacklisted. {}.'.format(*blacklisted.values[0]))
-                continue
+    def print_function(*args, wait=False, **kwargs):
+        end = '\n' if in_worker or not wait else '\r'
+        if in_worker:
+            args = ('[{}]'.format(worker.name),) + args
+        print(*args, **kwargs, end=end)
 
-            info = yt.info(segment.ytid)
-            if info == -1:
-                continue
+    outputs_name = ' and '.join(outputs)
 
-            formats = filter(lambda x: 'filesize' in x, info['formats'])
-            filesizes = map(itemgetter('filesize'), formats)
-            filesizes = list(filter(lambda x: x is not None, filesizes))
-            filesize = int(max(filesizes) / 1024 / 1024) if filesizes else None
+    try:
+        print_function('{}: Extracting {}'.format(segment.ytid, outputs_name), wait=True)
 
-            if filesize is None:
-                print('[{}] cannot retrieve filesize from youtube info'.format(segment.ytid))
-                continue
+        # both outputs are written atomically, so a segment interrupted
+        # halfway is simply picked up again from its missing output
+        segment.extract(outputs)
 
-            if min_size is not None and filesize < min_size:
-                print('[{}] smaller than min_size ({} MiB).'.format(segment.ytid, filesize))
-                continue
+        print_function('{}: Extracting {} (finished)'.format(segment.ytid, outputs_name))
+    except Exception as e:
+        # a broken segment is reported with the other failures instead of stopping the whole preprocess
+        print_function('{}: Failed ({})'.format(segment.ytid, e))
+        return segment.ytid, False
 
-            if max_size is not None and filesize > max_size:
-                print('[{}] exceeds max_size ({} MiB).'.format(segment.ytid, filesize))
-                continue
+    return segment.ytid, True
 
-            yt.dl(segment.ytid, outtmpl=segment.ydl_outtmpl)
 
-            for ont in ontologies:
-                if segment_in_ontology(ont)(segment):
-                    counter[ont.name].append(segment)
+def preprocess_task(task):
+    return preprocess_segment(*task)
 
 
-def preprocess(data_dir, segments, workers=1):
+def stale_segments(segments, manifest):
+    """
+    Return the (segment, outputs) of the `segments` with missing or stale outputs.
+    Up to date segments missing from `manifest` are added to it.
+    """
+    tasks = list()
+    for segment in segments:
+        outputs = manifest.stale(segment)
+        if outputs:
+            tasks.append((segment, outputs))
+        elif segment.ytid not in manifest:
+            manifest.add(segment.ytid, manifest.entry(segment))
+    return tasks
+
+
+def preprocess_segments(tasks, manifest, workers=1):
+    """
+    Extract the outputs of the `tasks` from `stale_segments` and record every finished segment
+    in `manifest`, which is saved even if preprocessing is interrupted. Yield (ytid, ok) of each task.
+    """
+    # the manifest entries are taken before extracting, a raw video modified meanwhile is stale next time
+    entries = {segment.ytid: manifest.entry(segment) for segment, _ in tasks}
+
+    try:
+        if workers == 1 or len(tasks) <= 1:
+            for ytid, ok in map(preprocess_task, tasks):
+                if ok:
+                    manifest.add(ytid, entries[ytid])
+                yield ytid, ok
+            return
+
+        # segments are handed out one at a time, so a slow video only holds up its own worker
+        with multiprocessing.Pool(workers or None, ops.set_spectrogram_backend, (ops.spectrogram_backend,)) as pool:
+            for ytid, ok in pool.imap_unordered(preprocess_task, tasks):
+                if ok:
+                    manifest.add(ytid, entries[ytid])
+                yield ytid, ok
+    finally:
+        manifest.flush()
+
+
+def preprocess(data_dir, segments, workers=1, features=None, spectrogram_backend=None):
     if not isinstance(workers, int):
         raise TypeError('WORKERS can\'t be of type {}'.format(type(workers).__name__))
 
     if workers < 0:
         raise ValueError('WORKERS must be positive (not {}).'.format(workers))
 
-    def thread_print_function(thread_id):
-        def decorator(*args, wait=False, **kwargs):
-            end = '\r' if wait and workers == 1 else '\n'
-            if workers > 1:
-                args = ('[Thread {}]'.format(thread_id),) + args
-            print(*args, **kwargs, end=end)
-        return decorator
+    if spectrogram_backend is not None:
+        ops.set_spectrogram_backend(spectrogram_backend)
+
+    segments = SegmentsWrapper(segments, os.path.join(data_dir, 'raw'), features)
+    manifest = PreprocessManifest(segments.root_dir)
+    segments = list(segments.available())
 
-    def thread_function(thread_id, thread_segments):
-        print_function = thread_print_function(thread_id)
+    tasks = stale_segments(segments, manifest)
+    print('{} segments are up to date, {} to preprocess.'.format(len(segments) - len(tasks), len(tasks)))
 
-        for i, segment in enumerate(thread_segments):
-            print_function('{}: ({} / {})'.format(segment.ytid, i+1, len(thread_segments)))
-            print_function('{}: Extracting frames'.format(segment.ytid), wait=True)
+    failed = list()
+    for i, (ytid, ok) in enumerate(preprocess_segments(tasks, manifest, workers)):
+        print('{}: ({} / {})'.format(ytid, i + 1, len(tasks)))
+        if not ok:
+            failed.append(ytid)
 
-            ops.extract_frames(segment.raw, segment.frames_dir, segment.start_seconds)
+    if failed:
+        print('The following segments cannot be processed:', failed)
 
-            print_function('{}: Extracting frames (finished)'.format(segment.ytid))
-            print_function('{}: Computing spectrograms'.format(segment.ytid), wait=True)
 
-            waveform, sr = segment.waveform
-            for j in range(segment.start_frames, min(segment.end_frames, len(segment))):
-                if workers == 1:
-                    print_function('{}: Computing spectrograms ({})'.format(segment.ytid, j), wait=True)
+def pack(data_dir, segments, ontology, labels, output_dir, shard_size=1024, features=None,
+         spectrogram_backend=None):
+    if not isinstance(shard_size, int):
+        raise TypeError('SHARD_SIZE can\'t be of type {}'.format(type(shard_size).__name__))
 
-                if not os.path.exists(segment.spectrogram(j)):
-                    start_samples = segment.get_sample_index(j)
-                    samples_slice = slice(start_samples, start_samples+segment.sample_rate)
-                    ops.compute_spectrogram(waveform[samples_slice], segment.spectrogram(j))
+    if shard_size <= 0:
+        raise ValueError('SHARD_SIZE must be positive (not {}).'.format(shard_size))
 
-            print_function('{}: Computing spectrograms (finished)'.format(segment.ytid))
+    if spectrogram_backend is not None:
+        ops.set_spectrogram_backend(spectrogram_backend)
 
-    segments = SegmentsWrapper(segments, os.path.join(data_dir, 'raw'))
-    segments = list(filter(attrgetter('is_available'), segments))
+    ontology = Ontology(ontology, os.path.join(data_dir, 'videos'))
+    segments = SegmentsWrapper(segments, os.path.join(data_dir, 'raw'), features, ontology)
+    manifest = PreprocessManifest(segments.root_dir)
+
+    segments = list(segments.available().filter(*labels, ontology=ontology))
 
-    thread_args = list()
+    # segments which are not preprocessed (or stale) are extracted first, failures are left out of the pack
+    tasks = stale_segments(segments, manifest)
+    failed = [ytid for ytid, ok in preprocess_segments(tasks, manifest) if not ok]
+    failed_ytids = set(failed)
+    segments = [segment for segment in segments if segment.ytid not in failed_ytids]
 
-    for idx in range(workers):
-        thread_size = math.ceil(len(segments) / workers)
-        thread_start = idx * thread_size
-        thread_args.append((idx, segments[thread_start:thread_start + thread_size]))
+    count = packs.write_pack(segments, output_dir, shard_size * 1024 * 1024)
+    print('{} segments packed to {}'.format(count, output_dir))
 
-    fork(workers, thread_function, *thread_args)
+    if failed:
+        print('The following segments cannot be packed:', failed)
 
 
 def cleanup(data_dir, segments, audio, frames, spectrograms):
-    segments = SegmentsWrapper(segments, os.path.join(data_dir, 'raw'))
-    segments = list(filter(attrgetter('is_available'), segments))
+    segments = list(SegmentsWrapper(segments, os.path.join(data_dir, 'raw')).available())
 
     for s in segments:
         if os.path.exists(s.wav) and audio:
@@ -230,8 +323,8 @@ def cleanup(data_dir, segments, audio, frames, spectrograms):
 
 def compress_segments(data_dir, segments, ontology, labels, output_file):
     raw_dir = os.path.join(data_dir, 'raw')
-    segments = SegmentsWrapper(segments, raw_dir)
     ontology = Ontology(ontology, os.path.join(data_dir, 'videos'))
+    segments = SegmentsWrapper(segments, raw_dir, ontology=ontology)
 
     def transform_segment(s):
         return (s.ytid,
@@ -239,18 +332,8 @@ def compress_segments(data_dir, segments, ontology, labels, output_file):
                 str(float(s.end_seconds)),
                 '"{}"'.format(','.join(s.positive_labels)))
 
-    def segment_in_ontology(o):
-        def decorator(s):
-            return any(map(o.__contains__, s.positive_labels))
-        return decorator
-
-    ontologies = ontology.retrieve(*labels)
-
-    available_segments = os.listdir(raw_dir)
-    available_segments = filter(segments.__contains__, available_segments)
-    available_segments = map(segments.__getitem__, available_segments)
-    available_segments = filter(attrgetter('is_available'), available_segments)
-    available_segments = filter(segment_in_ontology(ontologies), available_segments)
+    available_segments = segments.available()
+    available_segments = available_segments.filter(*labels, ontology=ontology)
     available_segments = map(transform_segment, available_segments)
     available_segments = map(', '.join, available_segments)
     available_segments = '\n'.join(available_segments)
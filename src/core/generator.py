@@ -4,27 +4,30 @@ from functools import reduce
 import cv2
 import math
 import numpy as np
+import tensorflow as tf
 from tensorflow.keras import utils as keras_utils
 
 from core.augmentor import Augmentor
 from core.models import AVC
+from core.packs import SegmentsPack
 from core.segments import SegmentsWrapper, Segment
 
 
 class SegmentsGenerator(keras_utils.Sequence):
     default_augmentor = Augmentor()
 
-    def __init__(self, segments, model, batch_size=None, vision_augmentor=None, audio_augmentor=None):
+    def __init__(self, segments, model, batch_size=None, vision_augmentor=None, audio_augmentor=None,
+                 negative_segments=None):
         self.segments = self.__validate_segments(segments)
-        self.negative_segments = self.__validate_segments(segments)
+        self.negative_segments = self.__validate_segments(segments if negative_segments is None else negative_segments)
         self.__validate_batch_size(batch_size)
         self.__validate_model(model)
         self.__validate_augmentors(vision_augmentor, audio_augmentor)
 
     def __validate_segments(self, segments):
-        allowed_segments_types = (SegmentsWrapper, list, Segment)
+        allowed_segments_types = (SegmentsWrapper, SegmentsPack, list, Segment)
         if not isinstance(segments, allowed_segments_types):
-            raise TypeError('\'segments\' must be of type {} or {}'.format(*allowed_segments_types))
+            raise TypeError('\'segments\' must be of type {}, {}, {} or {}'.format(*allowed_segments_types))
 
         if isinstance(segments, Segment):
             segments = [segments]
@@ -72,10 +75,10 @@ class SegmentsGenerator(keras_utils.Sequence):
         self.augmentation_factor = len(self.vision_augmentor) * len(self.audio_augmentor)
         self.sample_size = 2 * self.batch_size * self.augmentation_factor
 
-    def augment_vision(self, frame):
+    def augment_vision(self, frame, rng=random):
         if min(np.subtract(frame.shape, self.model.vision_input_shape)[:-1]) >= 0:
             crop_space = np.subtract(frame.shape, self.model.vision_input_shape)[:-1]
-            crop_start = list(map(lambda x: random.randint(0, x), crop_space))
+            crop_start = list(map(lambda x: rng.randint(0, x), crop_space))
             x1, y1 = crop_start
             x2, y2 = list(map(lambda x: x + self.model.vision_input_shape[0], crop_start))
             out = frame[x1:x2, y1:y2]
@@ -106,45 +109,106 @@ class SegmentsGenerator(keras_utils.Sequence):
         out = out / 255.
         return self.audio_augmentor(out)
 
+    def sample_indices(self, count):
+        """
+        Index arrays of every (vision, audio) augmentation combination of `count` pairs.
+        Returns the indices into the augmented frames, the augmented spectrograms and the labels,
+        ordered by pair, then vision augmentation, then audio augmentation.
+        """
+        vision_factor, audio_factor = len(self.vision_augmentor), len(self.audio_augmentor)
+        labels = np.repeat(np.arange(count), vision_factor * audio_factor)
+        frames = labels * vision_factor + np.tile(np.repeat(np.arange(vision_factor), audio_factor), count)
+        spectrograms = labels * audio_factor + np.tile(np.arange(audio_factor), count * vision_factor)
+        return frames, spectrograms, labels
+
     def zip_samples(self, frames, spectrograms, labels):
-        samples = list()
-        for i in range(len(labels)):
-            for v in range(len(self.vision_augmentor)):
-                for a in range(len(self.audio_augmentor)):
-                    samples.append((frames[v + i * len(self.vision_augmentor)],
-                                    spectrograms[a + i * len(self.audio_augmentor)],
-                                    labels[i]))
-        return samples
+        return list(map(lambda idx: (frames[idx[0]], spectrograms[idx[1]], labels[idx[2]]),
+                        zip(*self.sample_indices(len(labels)))))
 
-    def __getitem__(self, index):
-        batch_slice = slice(index * self.batch_size, (index+1) * self.batch_size)
-        batch_segments = self.segments[batch_slice]
-        batch = list()
+    def load_item(self, segment, rng=random):
+        """
+        Load a positive frame of `segment` and pair it with its own audio (positive)
+        and with the audio of a random negative segment (negative).
+        """
+        frame_index, frame = segment.sample_frame(rng)
+        positive_audio = segment.sample_spectrogram(frame_index, rng)
+        negative_audio = rng.choice(self.negative_segments).sample_spectrogram(rng=rng)
 
-        for i, segment in enumerate(batch_segments):
-            batch.append((segment.get_positive_sample(), 1))
+        return [((frame, positive_audio), 1), ((frame, negative_audio), 0)]
 
-            positive_frame = segment.get_positive_sample()[0]
-            negative_pair = random.choice(self.negative_segments)
-            negative_audio = negative_pair.get_positive_sample()[1]
-            batch.append(((positive_frame, negative_audio), 0))
+    def to_labels(self, batch_y):
+        try:
+            return list(map(lambda y: np.reshape(y, self.model.output_shape), batch_y))
+        except ValueError:
+            return keras_utils.to_categorical(batch_y)
 
-        random.shuffle(batch)
+    def to_samples(self, batch, rng=random):
+        """
+        Augment the (frame, spectrogram) pairs of `batch` into preallocated float32 arrays
+        and gather every augmentation combination of them into samples.
+        """
         batch_x, batch_y = zip(*batch)
         frames, spectrograms = zip(*batch_x)
+        vision_factor, audio_factor = len(self.vision_augmentor), len(self.audio_augmentor)
 
-        frames = list(reduce(list.__add__, list(map(self.augment_vision, frames))))
-        spectrograms = list(reduce(list.__add__, list(map(self.augment_audio, spectrograms))))
-        try:
-            labels = list(map(lambda y: np.reshape(y, self.model.output_shape), batch_y))
-        except ValueError:
-            labels = keras_utils.to_categorical(batch_y)
+        vision = np.empty((len(frames) * vision_factor, *self.model.vision_input_shape), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            vision[i * vision_factor:(i + 1) * vision_factor] = self.augment_vision(frame, rng)
+
+        audio = np.empty((len(spectrograms) * audio_factor, *self.model.audio_input_shape), dtype=np.float32)
+        for i, spectrogram in enumerate(spectrograms):
+            audio[i * audio_factor:(i + 1) * audio_factor] = self.augment_audio(spectrogram)
 
-        samples = self.zip_samples(frames, spectrograms, labels)
-        frames, spectrograms, labels = zip(*samples)
+        labels = np.asarray(self.to_labels(batch_y), dtype=np.float32)
+
+        if self.augmentation_factor == 1:
+            return vision, audio, labels
+
+        frame_indices, spectrogram_indices, label_indices = self.sample_indices(len(batch))
+        return vision[frame_indices], audio[spectrogram_indices], labels[label_indices]
+
+    def __getitem__(self, index):
+        batch_slice = slice(index * self.batch_size, (index+1) * self.batch_size)
+        batch_segments = self.segments[batch_slice]
+        batch = reduce(list.__add__, map(self.load_item, batch_segments))
+
+        random.shuffle(batch)
+        frames, spectrograms, labels = self.to_samples(batch)
 
         return [frames, spectrograms], [labels]
 
+    def to_dataset(self, seed=None, num_parallel_calls=tf.data.experimental.AUTOTUNE):
+        """
+        Build a `tf.data.Dataset` yielding the same kind of batches as this generator.
+        Segments are reshuffled on every epoch, loaded in parallel, interleaved and prefetched.
+        Every segment is loaded with its own random generator drawn from `seed`, so the batches
+        are deterministic for a given seed. The dataset repeats indefinitely: use `len(self)`
+        as the number of steps per epoch.
+        """
+        label_shape = np.shape(self.to_labels([1, 0]))[1:]
+
+        def load(index, item_seed):
+            rng = random.Random(int(item_seed))
+            batch = self.load_item(self.segments[int(index)], rng)
+            return self.to_samples(batch, rng)
+
+        def load_segment(index, item_seed):
+            frames, spectrograms, labels = tf.numpy_function(load, [index, item_seed], 3 * [tf.float32])
+            frames.set_shape((None, *self.model.vision_input_shape))
+            spectrograms.set_shape((None, *self.model.audio_input_shape))
+            labels.set_shape((None, *label_shape))
+            return tf.data.Dataset.from_tensor_slices(((frames, spectrograms), labels))
+
+        indices = tf.data.Dataset.range(len(self.segments))
+        indices = indices.shuffle(len(self.segments), seed=seed, reshuffle_each_iteration=True).repeat()
+        item_seeds = tf.data.experimental.RandomDataset(seed)
+
+        return tf.data.Dataset.zip((indices, item_seeds))\
+            .interleave(load_segment, cycle_length=self.batch_size, num_parallel_calls=num_parallel_calls)\
+            .shuffle(self.sample_size, seed=seed)\
+            .batch(self.sample_size)\
+            .prefetch(tf.data.experimental.AUTOTUNE)
+
     def on_epoch_end(self):
         random.shuffle(self.segments)
 
@@ -0,0 +1,138 @@
+import json
+import os
+
+from core import ops
+
+manifest_filename = 'preprocess.jsonl'
+legacy_manifest_filename = 'preprocess.json'
+
+
+class PreprocessManifest:
+    """
+    Record of the preprocessed segments under `root_dir`: the raw video (name, mtime and size)
+    each one was extracted from, and the signature of its frames and spectrogram (see `ops`).
+    A finished segment is skipped with a few stats, and only the outputs which are missing or
+    stale (another raw video or another signature) are extracted again.
+    Outputs of different features (see `ops.FeatureConfig`) are recorded side by side, by key.
+    Entries are appended as json lines in batches of `batch_size` (or on `flush`), so an interrupted
+    preprocess only extracts the last few segments again. The latest entry of a segment wins.
+    """
+
+    outputs = ('frames', 'spectrogram')
+
+    def __init__(self, root_dir, batch_size=100):
+        self.root_dir = root_dir
+        self.batch_size = batch_size
+        self.__entries = None
+        self.__pending = list()
+
+    @property
+    def filename(self):
+        return os.path.join(self.root_dir, manifest_filename)
+
+    @property
+    def legacy_filename(self):
+        return os.path.join(self.root_dir, legacy_manifest_filename)
+
+    def load(self):
+        entries = dict()
+
+        # manifests saved as a single json object are read first, their segments are overridden by newer lines
+        try:
+            with open(self.legacy_filename) as manifest_file:
+                entries.update(json.load(manifest_file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        if not os.path.exists(self.filename):
+            return entries
+
+        with open(self.filename) as manifest_file:
+            for line in manifest_file:
+                try:
+                    line = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by an interrupted preprocess
+                    continue
+                entries[line['id']] = line['entry']
+        return entries
+
+    @property
+    def entries(self):
+        if self.__entries is None:
+            self.__entries = self.load()
+        return self.__entries
+
+    @staticmethod
+    def source(segment):
+        raw = segment.raw
+        stat = os.stat(raw)
+        return [os.path.basename(raw), stat.st_mtime_ns, stat.st_size]
+
+    @staticmethod
+    def signatures(features=ops.default_features):
+        return {'frames': ops.frames_signature(features), 'spectrogram': ops.spectrogram_signature(features)}
+
+    @staticmethod
+    def keys(features=ops.default_features):
+        return {'frames': features.frames_key or 'default', 'spectrogram': features.spectrogram_key or 'default'}
+
+    @staticmethod
+    def variants(entry, output):
+        variants = entry.get(output)
+        # entries written before features could be configured only have the default signature
+        return {'default': variants} if isinstance(variants, list) else variants or dict()
+
+    def entry(self, segment):
+        """
+        Return the entry of `segment` with the signatures of its features, keeping the other
+        variants of its current entry if it was extracted from the same raw video.
+        """
+        source = self.source(segment)
+        current = self.entries.get(segment.ytid)
+        current = current if current is not None and current['raw'] == source else dict()
+
+        keys, signatures = self.keys(segment.features), self.signatures(segment.features)
+        return {'raw': source, **{output: {**self.variants(current, output), keys[output]: signatures[output]}
+                                  for output in self.outputs}}
+
+    def stale(self, segment):
+        """
+        Return the outputs of `segment` to extract (again).
+        Outputs saved before the manifest existed are assumed to be up to date.
+        """
+        # full spectrograms without an offset are from before they only covered the segment
+        files = {'frames': [segment.frames_index_file],
+                 'spectrogram': [segment.spectrogram_file, segment.spectrogram_offset_file]}
+        missing = [output for output in self.outputs if not all(map(os.path.exists, files[output]))]
+        entry = self.entries.get(segment.ytid)
+
+        if entry is None:
+            return missing
+
+        if entry['raw'] != self.source(segment):
+            return list(self.outputs)
+
+        keys, signatures = self.keys(segment.features), self.signatures(segment.features)
+        return [output for output in self.outputs
+                if output in missing or self.variants(entry, output).get(keys[output]) != signatures[output]]
+
+    def add(self, ytid, entry):
+        self.entries[ytid] = entry
+        self.__pending.append({'id': ytid, 'entry': entry})
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.__pending or not os.path.isdir(self.root_dir):
+            return
+
+        with open(self.filename, 'a') as manifest_file:
+            manifest_file.writelines(json.dumps(line) + '\n' for line in self.__pending)
+        self.__pending = list()
+
+    def __contains__(self, ytid):
+        return ytid in self.entries
+
+    def __len__(self):
+        return len(self.entries)
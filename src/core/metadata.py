@@ -0,0 +1,100 @@
+import atexit
+import json
+import os
+import sqlite3
+import weakref
+from contextlib import closing
+
+metadata_filename = 'metadata.sqlite'
+
+# stores created in this process, flushed at exit as long as they are alive
+stores = weakref.WeakSet()
+
+
+def flush_all():
+    for store in list(stores):
+        store.flush()
+
+
+atexit.register(flush_all)
+
+
+class MetadataStore:
+    """
+    Dataset wide store of segment attributes in a single SQLite database.
+    Every attribute is read with a single query on first access, and writes are buffered
+    and committed in batches of `batch_size` (or on `flush`).
+    As with the attributes files, an attribute is only saved if it was not saved before,
+    unless it is saved with `overwrite` (e.g. when it was computed again from another raw video).
+    """
+
+    def __init__(self, filename, batch_size=1000):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.__attributes = None
+        self.__pending = list()
+        stores.add(self)
+
+    def connect(self):
+        connection = sqlite3.connect(self.filename, timeout=60)
+        connection.execute('CREATE TABLE IF NOT EXISTS attributes ('
+                           'ytid TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                           'PRIMARY KEY (ytid, key))')
+        return connection
+
+    def load(self):
+        attributes = dict()
+        if os.path.exists(self.filename):
+            with closing(self.connect()) as connection:
+                for ytid, key, value in connection.execute('SELECT ytid, key, value FROM attributes'):
+                    attributes.setdefault(ytid, dict())[key] = json.loads(value)
+        return attributes
+
+    def attributes(self, ytid):
+        if self.__attributes is None:
+            self.__attributes = self.load()
+            for pending_ytid, key, value, overwrite in self.__pending:
+                attributes = self.__attributes.setdefault(pending_ytid, dict())
+                if overwrite or key not in attributes:
+                    attributes[key] = json.loads(value)
+        return dict(self.__attributes.get(ytid, dict()))
+
+    def save(self, ytid, key, value, overwrite=False):
+        if self.__attributes is not None:
+            attributes = self.__attributes.setdefault(ytid, dict())
+            if key in attributes and not overwrite:
+                return
+            attributes[key] = value
+
+        self.__pending.append((ytid, key, json.dumps(value), overwrite))
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.__pending:
+            return
+
+        if not os.path.exists(os.path.dirname(self.filename) or '.'):
+            return
+
+        with closing(self.connect()) as connection:
+            with connection:
+                # overwritten attributes are written last, so they replace any value saved before
+                connection.executemany('INSERT OR IGNORE INTO attributes VALUES (?, ?, ?)',
+                                       [row[:3] for row in self.__pending if not row[3]])
+                connection.executemany('INSERT OR REPLACE INTO attributes VALUES (?, ?, ?)',
+                                       [row[:3] for row in self.__pending if row[3]])
+        self.__pending = list()
+
+    def __getstate__(self):
+        # connections and cached attributes are not shared with other processes
+        self.flush()
+        return {'filename': self.filename, 'batch_size': self.batch_size}
+
+    def __setstate__(self, state):
+        # stores sent to pool workers are flushed explicitly (e.g. by `Segment.extract`): workers exit
+        # without running atexit handlers, so unpickled stores are not added to `stores`
+        self.filename = state['filename']
+        self.batch_size = state['batch_size']
+        self.__attributes = None
+        self.__pending = list()
@@ -1,8 +1,15 @@
+import json
 import os
-import pandas as pd
 import re
+import zipfile
 from typing import List, Dict
 
+import numpy as np
+
+from util.filesystem import atomic_output
+
+ontology_cache_version = 1
+
 
 class Entry:
     # noinspection PyShadowingBuiltins
@@ -21,7 +28,7 @@ class Entry:
 
         self._children: List[Entry] = list()
         self._parents: List[Entry] = list()
-        self._keys_cache = dict()
+        self._index: Dict[str, Entry] = None
 
     @property
     def slug_name(self):
@@ -35,6 +42,11 @@ class Entry:
     def identifiers(self):
         return self.id, self.name, self.slug_name
 
+    @property
+    def lookup_keys(self):
+        """ identifiers this entry can be retrieved with. """
+        return self.id, self.name, self.slug_name, self.proper_name
+
     @property
     def children(self):
         return self._children
@@ -56,11 +68,28 @@ class Entry:
     def dirs(self):
         return list(map(lambda p: os.path.join(self.root_dir, p), self.paths))
 
+    @property
+    def index(self):
+        """
+        Every entry of this hierarchy by each of its `lookup_keys`, built once from the index of the children.
+        The first entry found depth first wins when two of them share a key.
+        """
+        if self._index is None:
+            index = dict.fromkeys(self.lookup_keys, self)
+            for child in self.children:
+                for key, entry in child.index.items():
+                    index.setdefault(key, entry)
+            self._index = index
+        return self._index
+
+    def invalidate_index(self):
+        self._index = None
+        for parent in self.parents:
+            parent.invalidate_index()
+
     def items(self):
         """ return flat list of all children. """
-        return list(set([self.id] + [item                          # item
-                                     for child in self.children    # list of child
-                                     for item in child.items()]))  # list of item in each child
+        return list({entry.id for entry in self.index.values()})
 
     def link(self, *children: 'Entry'):
         if not all(map(lambda x: isinstance(x, Entry), children)):
@@ -77,20 +106,14 @@ class Entry:
         self.children.extend(children)
         for child in children:
             child.parents.append(self)
+        self.invalidate_index()
 
     def __getitem__(self, item):
         """
         Retrieve entry with provided `item` identifier from any of `id`, `name`, `slug_name` or `proper_name`.
         """
         if isinstance(item, str):
-            if item == self:
-                return self
-
-            for child in self.children:
-                if item in child:
-                    return child[item]
-
-            raise KeyError(item)
+            return self.index[item]
 
         raise KeyError('Can only retrieve entry by its identifiers')
 
@@ -108,11 +131,7 @@ class Entry:
             if not isinstance(key, str):
                 return False
 
-            if key not in self._keys_cache:
-                self._keys_cache[key] =\
-                    self == key or any(map(lambda child: key in child, self.children))
-
-            return self._keys_cache[key]
+            return key in self.index
 
         return all(map(contains, item))
 
@@ -140,6 +159,11 @@ class RootEntry(Entry):
     def identifiers(self):
         return (*super().identifiers, self.root_identifier)
 
+    @property
+    def lookup_keys(self):
+        # a root entry is never retrieved by its identifiers, only its children are
+        return ()
+
     def link(self, *childre):
         raise NotImplementedError('Root Entry can\'t be linked with another Entry'
                                   'Use wrap instead')
@@ -150,12 +174,7 @@ class RootEntry(Entry):
 
         self._children = children
         self.child_ids = list(set(self.child_ids + list(map(lambda x: x.id, children))))
-
-    def items(self):
-        items_ = super().items()
-        # exclude self.id from items
-        items_.remove(self.id)
-        return items_
+        self.invalidate_index()
 
     def __eq__(self, other):
         if isinstance(other, Entry):
@@ -163,8 +182,92 @@ class RootEntry(Entry):
         return False
 
 
+def flatten(lists, dtype):
+    """ flat array of all items of `lists` and the boundaries of each list in it. """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum(list(map(len, lists)), out=offsets[1:])
+    return np.asarray([item for items in lists for item in items], dtype=dtype), offsets
+
+
+def unflatten(values, offsets):
+    values = values.tolist()
+    return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def compile_ontology(filename):
+    """
+    Compile an ontology json into flat arrays: the fields of every entry, the children of every
+    entry as indices, the transitive closure of the hierarchy as a packed boolean matrix
+    (entry x ancestor, including itself) and every identifier (id, name, slug and proper name)
+    with the index of its entry.
+    """
+    with open(filename) as infile:
+        records = json.load(infile)
+
+    entries = [Entry(None, **record) for record in records]
+    indices = {entry.id: i for i, entry in enumerate(entries)}
+
+    children = list()
+    parents = [list() for _ in entries]
+    for i, entry in enumerate(entries):
+        missing_ids = list(filter(lambda x: x not in indices, entry.child_ids))
+        if missing_ids:
+            raise AssertionError(
+                'Can\'t build ontology. '
+                'Missing child id(s) {} for {}'.format(missing_ids, entry.id))
+
+        children.append(list(map(indices.get, entry.child_ids)))
+        for child in children[-1]:
+            parents[child].append(i)
+
+    ancestors = np.zeros((len(entries), len(entries)), dtype=bool)
+    closed = np.zeros(len(entries), dtype=bool)
+
+    def closure(index):
+        if not closed[index]:
+            ancestors[index, index] = True
+            for parent in parents[index]:
+                ancestors[index] |= closure(parent)
+            closed[index] = True
+        return ancestors[index]
+
+    for i in range(len(entries)):
+        closure(i)
+
+    identifiers = dict()
+    for i, entry in enumerate(entries):
+        for identifier in entry.lookup_keys:
+            identifiers.setdefault(identifier, i)
+
+    positive_examples, positive_examples_offsets = flatten([e.positive_examples for e in entries], str)
+    restrictions, restrictions_offsets = flatten([e.restrictions for e in entries], str)
+    children, children_offsets = flatten(children, np.int32)
+
+    return {
+        'version': np.array(ontology_cache_version),
+        'ids': np.asarray([e.id for e in entries], dtype=str),
+        'names': np.asarray([e.name for e in entries], dtype=str),
+        'descriptions': np.asarray([e.description for e in entries], dtype=str),
+        'citation_uris': np.asarray([e.citation_uri for e in entries], dtype=str),
+        'positive_examples': positive_examples,
+        'positive_examples_offsets': positive_examples_offsets,
+        'restrictions': restrictions,
+        'restrictions_offsets': restrictions_offsets,
+        'children': children,
+        'children_offsets': children_offsets,
+        'ancestors': np.packbits(ancestors, axis=1),
+        'identifiers': np.asarray(list(identifiers), dtype=str),
+        'identifier_indices': np.asarray(list(identifiers.values()), dtype=np.int32)
+    }
+
+
 class Ontology:
-    def __init__(self, filename, root_dir):
+    """
+    The ontology is compiled once into arrays (see `compile_ontology`), cached next to `filename`
+    with `cache` and loaded back with a single read for as long as `filename` is unchanged.
+    """
+
+    def __init__(self, filename, root_dir, cache=True):
         if not os.path.exists(filename):
             raise FileNotFoundError('FILE ({})'.format(filename))
 
@@ -174,6 +277,13 @@ class Ontology:
         self.__root__ = None
         self.__root_dir = root_dir
         self.__filename = filename
+        self.cache = cache
+
+        self.__graph = None
+        self.__entries = None
+        self.__indices = None
+        self.__identifiers = None
+        self.__ancestors_matrix = None
 
     @property
     def filename(self):
@@ -183,46 +293,150 @@ class Ontology:
     def root_dir(self):
         return self.__root_dir
 
+    @property
+    def cache_file(self):
+        return '{}.cache.npz'.format(os.path.splitext(self.filename)[0])
+
+    def source(self):
+        stat = os.stat(self.filename)
+        return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+    def load_cache(self, source):
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as cache:
+                graph = dict(cache)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None
+
+        if graph.get('version') != ontology_cache_version or not np.array_equal(graph.get('source'), source):
+            return None
+        return graph
+
+    def save_cache(self, graph):
+        try:
+            with atomic_output(self.cache_file) as output:
+                np.savez(output, **graph)
+        except OSError:
+            # the ontology is still usable from a read only directory
+            pass
+
+    @property
+    def graph(self):
+        if self.__graph is None:
+            source = self.source()
+            graph = self.load_cache(source) if self.cache else None
+
+            if graph is None:
+                graph = compile_ontology(self.filename)
+                graph['source'] = source
+                if self.cache:
+                    self.save_cache(graph)
+
+            self.__graph = graph
+        return self.__graph
+
+    @property
+    def ids(self):
+        return self.graph['ids']
+
+    @property
+    def entries(self):
+        if self.__entries is None:
+            graph = self.graph
+            ids = graph['ids'].tolist()
+            children = unflatten(graph['children'], graph['children_offsets'])
+
+            entries = list(map(lambda x: Entry(self.root_dir, *x),
+                               zip(ids,
+                                   graph['names'].tolist(),
+                                   graph['descriptions'].tolist(),
+                                   graph['citation_uris'].tolist(),
+                                   unflatten(graph['positive_examples'], graph['positive_examples_offsets']),
+                                   map(lambda x: list(map(ids.__getitem__, x)), children),
+                                   unflatten(graph['restrictions'], graph['restrictions_offsets']))))
+
+            for entry, entry_children in zip(entries, children):
+                entry.link(*map(entries.__getitem__, entry_children))
+            self.__entries = entries
+        return self.__entries
+
     @property
     def __root(self):
         if not self.__root__:
-            ontology = pd.read_json(self.__filename).set_index('id')
-            labels: Dict[str, Entry] =\
-                {mid: Entry(root_dir=self.root_dir,
-                            id=mid,
-                            **row.to_dict())
-                 for mid, row
-                 in ontology.iterrows()}
-
-            for label in labels.values():
-                missing_ids = list(filter(lambda x: x not in labels, label.child_ids))
-                if missing_ids:
-                    raise AssertionError(
-                        'Can\'t build ontology. '
-                        'Missing child id(s) {} for {}'.format(missing_ids, label.id))
-                label.link(*map(lambda x: labels[x], label.child_ids))
-
-            root_labels = {mid: label for mid, label in labels.items() if not label.parents}
             self.__root__ = RootEntry('/r/00t', 'AudioSet Ontology')
-            self.__root__.wrap(*root_labels.values())
+            self.__root__.wrap(*filter(lambda x: not x.parents, self.entries))
         return self.__root__
 
+    def index(self, label):
+        """
+        Index of the entry with `label` as any of its `id`, `name`, `slug_name` or `proper_name`.
+        """
+        if self.__identifiers is None:
+            self.__identifiers = dict(zip(self.graph['identifiers'].tolist(),
+                                          self.graph['identifier_indices'].tolist()))
+        return self.__identifiers[label]
+
+    @property
+    def __ancestors(self):
+        if self.__ancestors_matrix is None:
+            self.__ancestors_matrix = np.unpackbits(self.graph['ancestors'], axis=1, count=len(self.ids)).view(bool)
+        return self.__ancestors_matrix
+
+    def ancestors(self, label):
+        """
+        Ids of `label` (any of its identifiers) and of all of its ancestors.
+        """
+        return frozenset(self.ids[self.__ancestors[self.index(label)]].tolist())
+
+    def descendants(self, *labels):
+        """
+        Ids of `labels` and of everything below them, or all ids without `labels`.
+        """
+        return frozenset(self.ids[self.descendants_mask(*labels)].tolist())
+
+    def descendants_mask(self, *labels):
+        """
+        Boolean mask over `ids` of `labels` and of everything below them, or of all ids without `labels`.
+        """
+        if not labels:
+            return np.ones(len(self.ids), dtype=bool)
+        return self.__ancestors[:, list(map(self.index, labels))].any(axis=1)
+
+    def matches(self, table, *labels):
+        """
+        Boolean mask of the rows of a `SegmentsTable` with at least one positive label
+        in the hierarchy of `labels` (or anywhere in the ontology without `labels`).
+        """
+        if self.__indices is None:
+            self.__indices = {mid: i for i, mid in enumerate(self.ids.tolist())}
+
+        descendants = self.descendants_mask(*labels)
+        vocabulary = np.fromiter(map(lambda x: self.__indices.get(x, -1), table.labels.tolist()),
+                                 dtype=np.int64, count=len(table.labels))
+        return table.rows_with_labels((vocabulary >= 0) & descendants[vocabulary])
+
+    def __getitem__(self, label) -> Entry:
+        return self.entries[self.index(label)]
+
+    def __contains__(self, label):
+        try:
+            self.index(label)
+        except (KeyError, TypeError):
+            return False
+        return True
+
     def retrieve(self, *labels):
         if not labels:
             labels = ['*']
             result = self.__root.children
         else:
-            result = [self.__root[label] for label in labels]
+            result = [self[label] for label in labels]
 
         result = {label.id: label for label in result if label}
 
-        # check if any Label superset another
-        result_keys = list(result.keys())
-        result_copy = [set(label.items()) for label in result.values()]
-        for it1 in result_copy:
-            for i, it2 in enumerate(result_copy):
-                if it1 != it2 and it1.issuperset(it2) and result_keys[i] in result:
-                    del result[result_keys[i]]
+        # drop labels which are already under another retrieved label
+        result = {mid: label for mid, label in result.items()
+                  if not (self.ancestors(mid) - {mid}) & result.keys()}
 
         if len(labels) == 1:
             labels = labels[0]
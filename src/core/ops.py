@@ -1,8 +1,121 @@
+import hashlib
+import json
 import os
+import threading
+from collections import OrderedDict, namedtuple
 
 import numpy as np
 
-from util import ffmpeg, tensorplow as tp
+from util import ffmpeg, stft
+from util.filesystem import atomic_output
+
+spectrogram_sample_rate = 48000
+spectrogram_window_length = 0.01
+spectrogram_overlap = 0.5
+
+# bumped whenever the frames or the spectrogram extracted from a raw video change
+frames_version = 1
+spectrogram_version = 2
+
+# segments are 10 seconds long
+segment_length = 10
+
+# spectrograms are computed with NumPy unless the tensorflow backend is selected, so preprocessing
+# never imports (nor initializes) TensorFlow. Both backends match within float32 precision.
+spectrogram_backends = ('numpy', 'tensorflow')
+spectrogram_backend = 'numpy'
+
+# every memory map keeps a file descriptor open, so segments share the most recently used ones
+memmap_cache_size = 128
+memmaps = OrderedDict()
+memmaps_lock = threading.Lock()
+
+Waveform = namedtuple('Waveform', ['audio', 'sample_rate'])
+
+
+class FeatureConfig(namedtuple('FeatureConfig',
+                               ['frame_rate', 'frame_size', 'sample_rate', 'window_length', 'overlap'])):
+    """
+    Parameters of the features extracted from the raw videos: `frame_rate` frames per second,
+    scaled to cover `frame_size` x `frame_size`, and the spectrogram of the audio resampled at `sample_rate`
+    with windows of `window_length` seconds overlapping by `overlap`.
+
+    The frames and spectrogram files of a config are named after a hash of the parameters they
+    depend on (`frames_key` and `spectrogram_key`), so several configs can be extracted side by side.
+    The default config keeps the plain names, and the files extracted before configs existed.
+    """
+    __slots__ = ()
+
+    @property
+    def frames_params(self):
+        return {'frame_rate': self.frame_rate, 'frame_size': self.frame_size}
+
+    @property
+    def spectrogram_params(self):
+        return {'sample_rate': self.sample_rate, 'window_length': self.window_length, 'overlap': self.overlap}
+
+    @property
+    def frames_key(self):
+        return params_key(self.frames_params, default_features.frames_params)
+
+    @property
+    def spectrogram_key(self):
+        return params_key(self.spectrogram_params, default_features.spectrogram_params)
+
+    @property
+    def window_size(self):
+        return int(self.sample_rate * self.window_length)
+
+    @property
+    def stride(self):
+        return int(self.window_size * self.overlap)
+
+
+def params_key(params, default_params):
+    if params == default_params:
+        return None
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def keyed_filename(filename, key):
+    """
+    Insert `key` before the extension of `filename` (e.g. frames.npy -> frames.KEY.npy), if any.
+    """
+    if key is None:
+        return filename
+    name, ext = os.path.splitext(filename)
+    return '{}.{}{}'.format(name, key, ext)
+
+
+default_features = FeatureConfig(frame_rate=25,
+                                 frame_size=256,
+                                 sample_rate=spectrogram_sample_rate,
+                                 window_length=spectrogram_window_length,
+                                 overlap=spectrogram_overlap)
+
+
+def set_spectrogram_backend(backend):
+    global spectrogram_backend
+
+    if backend not in spectrogram_backends:
+        raise ValueError('SPECTROGRAM_BACKEND must be one of {} (not {}).'.format(spectrogram_backends, backend))
+    spectrogram_backend = backend
+
+
+def spectrogram_ops():
+    """
+    Return the module computing the spectrograms with the selected `spectrogram_backend`.
+    """
+    if spectrogram_backend == 'tensorflow':
+        from util import tensorplow
+        return tensorplow
+    return stft
+
+
+def load_image(filename):
+    # imported here, as tensorplow imports TensorFlow
+    from util import tensorplow
+    return tensorplow.load_image(filename)
 
 
 def extract_frames(raw, output_dir, start_time=0):
@@ -33,6 +146,139 @@ def extract_all_frames(raw, output_dir):
                   vf='scale=256:256:force_original_aspect_ratio=increase')
 
 
+def scale_filter(features):
+    return 'scale={0}:{0}:force_original_aspect_ratio=increase'.format(features.frame_size)
+
+
+def decode_frames(raw, start_time=0, features=default_features):
+    """
+    Decode the same frames as `extract_frames` (with the default `features`) straight
+    into a uint8 array of shape (frames, height, width, 3) without writing any file.
+    """
+    output, log = ffmpeg.pipe(raw,
+                              r=features.frame_rate,
+                              frames=segment_length * features.frame_rate,
+                              ss=start_time,
+                              vf=scale_filter(features),
+                              f='rawvideo',
+                              pix_fmt='rgb24')
+
+    width, height = ffmpeg.parse_video_size(log)
+    return np.frombuffer(output, dtype=np.uint8).reshape((-1, height, width, 3))
+
+
+def decode_audio(raw, sample_rate=48000):
+    """
+    Decode the mono audio of `raw` straight into memory. The result has the same
+    values and shape as loading the output of `extract_audio` with `tensorplow.load_wav`.
+    """
+    output, _ = ffmpeg.pipe(raw,
+                            ac=1,
+                            ar=sample_rate,
+                            f='s16le',
+                            acodec='pcm_s16le')
+
+    audio = np.frombuffer(output, dtype='<i2').astype(np.float32) / 32768.
+    return Waveform(audio.reshape((-1, 1)), sample_rate)
+
+
+def decode_segment(raw, start_time=0, features=default_features):
+    """
+    Decode the frames of `decode_frames`, the waveform of `decode_audio` and the duration
+    of `raw` with a single ffmpeg process. Return (frames, waveform, duration).
+    """
+    sample_rate = features.sample_rate
+
+    if os.name == 'nt':
+        return (decode_frames(raw, start_time, features),
+                decode_audio(raw, sample_rate),
+                get_video_duration(raw))
+
+    (video, audio), log = ffmpeg.pipes(raw,
+                                       dict(r=features.frame_rate,
+                                            frames=segment_length * features.frame_rate,
+                                            ss=start_time,
+                                            vf=scale_filter(features),
+                                            an=None,
+                                            f='rawvideo',
+                                            pix_fmt='rgb24'),
+                                       dict(vn=None,
+                                            ac=1,
+                                            ar=sample_rate,
+                                            f='s16le',
+                                            acodec='pcm_s16le'))
+
+    width, height = ffmpeg.parse_video_size(log, output=0)
+    frames = np.frombuffer(video, dtype=np.uint8).reshape((-1, height, width, 3))
+
+    audio = np.frombuffer(audio, dtype='<i2').astype(np.float32) / 32768.
+    waveform = Waveform(audio.reshape((-1, 1)), sample_rate)
+
+    return frames, waveform, ffmpeg.parse_duration(log)
+
+
+def save_packed_frames(frames, indices, output, index_output):
+    if len(frames) != len(indices):
+        raise ValueError('FRAMES and INDICES must have the same length ({} != {})'.format(len(frames), len(indices)))
+
+    if not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+
+    with atomic_output(output) as temp_output:
+        np.save(temp_output, np.asarray(frames, dtype=np.uint8))
+
+    # the index is written last, so its presence marks a complete pack
+    with atomic_output(index_output) as temp_index_output:
+        np.save(temp_index_output, np.asarray(indices, dtype=np.int32))
+
+
+def load_memmap(filename):
+    """
+    Memory map the `.npy` file `filename` read-only. Only the `memmap_cache_size` most recently
+    used maps are kept open, a map is opened again once evicted (or once the file is replaced).
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        raise FileNotFoundError('FILE ({})'.format(filename))
+
+    key = (filename, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with memmaps_lock:
+        if key in memmaps:
+            memmaps.move_to_end(key)
+            return memmaps[key]
+
+    array = np.load(filename, mmap_mode='r')
+    with memmaps_lock:
+        for other in [other for other in memmaps if other[0] == filename]:
+            del memmaps[other]
+        memmaps[key] = array
+        while len(memmaps) > memmap_cache_size:
+            memmaps.popitem(last=False)
+    return array
+
+
+def release_memmaps(*filenames):
+    """
+    Close the memory maps of `filenames` (once the arrays mapped from them are no longer referenced).
+    """
+    with memmaps_lock:
+        for key in [key for key in memmaps if key[0] in filenames]:
+            del memmaps[key]
+
+
+def load_packed_frames(filename, index_filename):
+    if not os.path.exists(filename):
+        raise FileNotFoundError('FILE ({})'.format(filename))
+
+    if not os.path.exists(index_filename):
+        raise FileNotFoundError('INDEX ({})'.format(index_filename))
+
+    frames = load_memmap(filename)
+    index = np.load(index_filename)
+    return frames, index
+
+
 def extract_audio(raw, output):
     if os.path.exists(output):
         return
@@ -40,9 +286,39 @@ def extract_audio(raw, output):
     if not os.path.exists(os.path.dirname(output)):
         os.makedirs(os.path.dirname(output))
 
-    ffmpeg.ffmpeg(raw, output,
-                  ac=1,
-                  ar=48000)
+    with atomic_output(output) as temp_output:
+        ffmpeg.ffmpeg(raw, temp_output,
+                      ac=1,
+                      ar=48000)
+
+
+def trim_video(raw, output, start_time, end_time):
+    """
+    Write the part of `raw` between `start_time` and `end_time` (in seconds) to `output`.
+    The streams are copied from the last keyframe before `start_time`, and only re-encoded from
+    `start_time` when they can't be copied. Return the time (in seconds) `output` starts at in `raw`.
+    """
+    start_time = max(0., start_time)
+    duration = ffmpeg.duration(raw)
+
+    if start_time >= duration:
+        raise ValueError('START_TIME must be before the end of the video ({} >= {}).'.format(start_time, duration))
+
+    try:
+        offset = max(time for time in ffmpeg.keyframes(raw) if time <= start_time)
+        ffmpeg.cut(raw, output, offset, end_time - offset)
+    except (RuntimeError, ValueError):
+        # no video stream, no keyframe before `start_time` or streams that can't be copied
+        offset = start_time
+        ffmpeg.cut(raw, output, offset, end_time - offset, copy=False)
+
+    # some containers (e.g. mkv) can't start with the audio packets preceding the keyframe,
+    # and delay every stream instead
+    try:
+        delay = min(ffmpeg.keyframes(output), default=0.)
+    except RuntimeError:
+        delay = 0.
+    return max(0., offset - delay)
 
 
 def get_video_duration(filename):
@@ -53,20 +329,21 @@ def get_video_duration(filename):
     return float(output.strip())
 
 
-def compute_spectrogram(waveform, output):
+def compute_spectrogram(waveform, output, features=default_features):
     if os.path.exists(output):
         return
 
     if not os.path.exists(os.path.dirname(output)):
         os.makedirs(os.path.dirname(output))
 
-    spc = tp.spectrogram(waveform,
-                         sample_rate=48000,
-                         window_length=0.01,
-                         overlap=0.5)
+    spc = spectrogram_ops().spectrogram(waveform,
+                                        sample_rate=features.sample_rate,
+                                        window_length=features.window_length,
+                                        overlap=features.overlap)
 
-    float32 = spc.numpy().astype(np.float32)
-    np.savez_compressed(output, spectrogram=float32)
+    float32 = np.asarray(spc).astype(np.float32)
+    with atomic_output(output) as temp_output:
+        np.savez_compressed(temp_output, spectrogram=float32)
 
 
 def load_spectrogram(filename):
@@ -75,6 +352,82 @@ def load_spectrogram(filename):
     return np.expand_dims(spc, -1)
 
 
+def frames_signature(features=default_features):
+    return [frames_version, features.frame_rate, features.frame_size]
+
+
+def spectrogram_signature(features=default_features):
+    """
+    Everything the saved spectrograms depend on: a spectrogram saved with another signature is stale.
+    """
+    return [spectrogram_version, features.sample_rate, features.window_length, features.overlap]
+
+
+def spectrogram_offset_file(output):
+    """
+    File saved next to the full spectrogram `output` with the column it starts at (e.g. spectrogram.offset.npy).
+    """
+    name, ext = os.path.splitext(output)
+    return '{}.offset{}'.format(name, ext)
+
+
+def compute_full_spectrogram(waveform, output, dtype=np.float32, overwrite=False, features=default_features,
+                             start_sample=0, end_sample=None):
+    """
+    Compute a single log-spectrogram over `waveform[start_sample:end_sample]` and save it as `.npy`.
+    `start_sample` is rounded down to a column of the spectrogram of the whole `waveform`, and that column
+    is saved next to `output` (see `load_spectrogram_offset`), so per-frame spectrograms are column slices
+    of it (see `spectrogram_columns`).
+    """
+    if os.path.exists(output) and not overwrite:
+        return
+
+    if not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+
+    start_column = max(0, start_sample) // features.stride
+    waveform = np.reshape(np.asarray(waveform), -1)[start_column * features.stride:end_sample]
+
+    spc = spectrogram_ops().spectrogram(waveform,
+                                        sample_rate=features.sample_rate,
+                                        window_length=features.window_length,
+                                        overlap=features.overlap)
+
+    # the spectrogram is written last, so its presence marks a complete output
+    with atomic_output(spectrogram_offset_file(output)) as temp_output:
+        np.save(temp_output, np.array([start_column], dtype=np.int64))
+
+    with atomic_output(output) as temp_output:
+        np.save(temp_output, np.asarray(spc).astype(dtype))
+
+
+def load_full_spectrogram(filename):
+    return load_memmap(filename)
+
+
+def load_spectrogram_offset(filename):
+    """
+    Column the full spectrogram `filename` starts at, 0 for spectrograms of whole waveforms saved without it.
+    """
+    try:
+        return int(np.load(spectrogram_offset_file(filename))[0])
+    except FileNotFoundError:
+        return 0
+
+
+def spectrogram_columns(start_sample, length, features=default_features, start_column=0):
+    """
+    Return the column slice of a full spectrogram starting at `start_column`
+    that matches the spectrogram of `length` samples starting at `start_sample`.
+    """
+    window_size = features.window_size
+    stride = features.stride
+
+    start = start_sample // stride - start_column
+    count = 1 + (length - window_size) // stride
+    return slice(start, start + count)
+
+
 def merge_frames(frames_dir, audio, output):
     if not os.path.exists(frames_dir):
         raise FileNotFoundError('FRAMES_DIR ({})'.format(frames_dir))
@@ -0,0 +1,266 @@
+import json
+import os
+from typing import Union, List
+
+import numpy as np
+import pandas as pd
+
+from core import ops
+from core.segments import Segment
+from util.filesystem import atomic_output
+
+index_filename = 'index.csv'
+features_filename = 'features.json'
+shard_filename = 'shard-{:05d}.bin'
+record_alignment = 64
+
+frames_dtype = np.uint8
+frame_indices_dtype = np.int64
+spectrogram_dtype = np.float32
+
+index_columns = [
+    'ytid',
+    'start_seconds',
+    'end_seconds',
+    'positive_labels',
+    'duration',
+    'wavelength',
+    'raw_offset',
+    'shard',
+    'frames_offset',
+    'frames_count',
+    'frame_height',
+    'frame_width',
+    'frame_indices_offset',
+    'spectrogram_offset',
+    'spectrogram_height',
+    'spectrogram_length',
+    'spectrogram_column'
+]
+
+
+def write_array(outfile, array):
+    outfile.write(bytes(-outfile.tell() % record_alignment))
+    offset = outfile.tell()
+    np.ascontiguousarray(array).tofile(outfile)
+    return offset
+
+
+def write_pack(segments, pack_dir, shard_size=1024 * 1024 * 1024):
+    """
+    Serialize the packed frames and the full spectrogram of preprocessed `segments` into
+    sequential shards of about `shard_size` bytes, described by an index written last.
+    Spectrograms are stored time-major, so the window of a frame is a single contiguous read.
+    All the `segments` must have the same features, which are saved with the pack.
+    """
+    os.makedirs(pack_dir, exist_ok=True)
+
+    records = list()
+    features = None
+    shard, outfile = -1, None
+
+    try:
+        for segment in segments:
+            if segment.packed_frames is None or segment.full_spectrogram is None:
+                raise FileNotFoundError('PREPROCESSED ({})'.format(segment.ytid))
+
+            if features is None:
+                features = segment.features
+            elif segment.features != features:
+                raise ValueError('Can\'t pack segments with different features ({} != {})'.format(
+                    segment.features, features))
+
+            if outfile is None or outfile.tell() >= shard_size:
+                if outfile is not None:
+                    outfile.close()
+                shard += 1
+                outfile = open(os.path.join(pack_dir, shard_filename.format(shard)), 'wb')
+
+            frames, frame_indices = segment.packed_frames
+            spectrogram = segment.full_spectrogram
+
+            records.append({
+                'ytid': segment.ytid,
+                'start_seconds': segment.start_seconds,
+                'end_seconds': segment.end_seconds,
+                'positive_labels': ','.join(segment.positive_labels),
+                'duration': segment.duration,
+                'wavelength': segment.wavelength,
+                'raw_offset': segment.raw_offset,
+                'shard': shard,
+                'frames_offset': write_array(outfile, frames.astype(frames_dtype, copy=False)),
+                'frames_count': frames.shape[0],
+                'frame_height': frames.shape[1],
+                'frame_width': frames.shape[2],
+                'frame_indices_offset': write_array(outfile, np.asarray(frame_indices, dtype=frame_indices_dtype)),
+                'spectrogram_offset': write_array(outfile, spectrogram.T.astype(spectrogram_dtype, copy=False)),
+                'spectrogram_height': spectrogram.shape[0],
+                'spectrogram_length': spectrogram.shape[1],
+                'spectrogram_column': segment.spectrogram_offset
+            })
+            # the maps of packed segments are not needed anymore
+            del frames, frame_indices, spectrogram
+            ops.release_memmaps(segment.frames_file, segment.spectrogram_file)
+            print('{}: packed into {}'.format(segment.ytid, shard_filename.format(shard)))
+    finally:
+        if outfile is not None:
+            outfile.close()
+
+    with atomic_output(os.path.join(pack_dir, features_filename)) as output:
+        with open(output, 'w') as features_file:
+            json.dump((features or ops.default_features)._asdict(), features_file)
+
+    with atomic_output(os.path.join(pack_dir, index_filename)) as output:
+        pd.DataFrame(records, columns=index_columns).to_csv(output, index=False)
+
+    return len(records)
+
+
+class PackedSegment(Segment):
+    """
+    A segment read back from a pack. Frames and spectrogram are views into memory mapped shards
+    and nothing is read from (or written to) the segment directory.
+    """
+
+    def __init__(self, pack, record):
+        super().__init__(pack.pack_dir,
+                         record.ytid,
+                         record.start_seconds,
+                         record.end_seconds,
+                         record.positive_labels.split(',') if record.positive_labels else [],
+                         features=pack.features)
+
+        self.__wavelength = int(record.wavelength)
+        # packs written before trimmed videos have no offset
+        self.__raw_offset = float(getattr(record, 'raw_offset', 0.))
+        # and packs written before durations end with their audio
+        self.__duration = float(getattr(record, 'duration', self.__raw_offset + self.__wavelength / self.sample_rate))
+        self.__frames = pack.read(record.shard, record.frames_offset, frames_dtype,
+                                  (record.frames_count, record.frame_height, record.frame_width, 3))
+        self.__frame_indices = pack.read(record.shard, record.frame_indices_offset, frame_indices_dtype,
+                                         (record.frames_count,))
+        self.__spectrogram = pack.read(record.shard, record.spectrogram_offset, spectrogram_dtype,
+                                       (record.spectrogram_length, record.spectrogram_height))
+        # packs written before spectrograms only covered the segment start at the first column
+        self.__spectrogram_column = int(getattr(record, 'spectrogram_column', 0))
+        self.__positive_indices = None
+
+    def load_attributes(self):
+        # the computed attributes come from the pack index
+        pass
+
+    def save_attribute(self, key, value, overwrite=False):
+        pass
+
+    @property
+    def duration(self):
+        return self.__duration
+
+    @property
+    def wavelength(self):
+        return self.__wavelength
+
+    @property
+    def raw_offset(self):
+        return self.__raw_offset
+
+    @property
+    def packed_frames(self):
+        return self.__frames, self.__frame_indices
+
+    @property
+    def full_spectrogram(self):
+        return self.__spectrogram.T
+
+    @property
+    def spectrogram_offset(self):
+        return self.__spectrogram_column
+
+    @property
+    def positive_indices(self):
+        if self.__positive_indices is None:
+            max_frame_index = int(self.__frame_indices[-1]) if len(self.__frame_indices) else len(self)
+            self.__positive_indices = range(self.start_frames, min(self.end_frames, len(self), max_frame_index))
+        return self.__positive_indices
+
+    def load_spectrogram(self, index):
+        columns = ops.spectrogram_columns(self.get_sample_index(index), self.sample_rate, self.features,
+                                          self.spectrogram_offset)
+        if columns.start < 0:
+            raise FileNotFoundError('SPECTROGRAM ({}: {})'.format(self.ytid, index))
+        return self.__spectrogram[columns].T[:, :, np.newaxis]
+
+    @property
+    def is_available(self):
+        return True
+
+
+class SegmentsPack:
+    def __init__(self, pack_dir):
+        if not isinstance(pack_dir, str):
+            raise TypeError('PACK_DIR can\'t be of type {}'.format(type(pack_dir).__name__))
+
+        if not os.path.exists(os.path.join(pack_dir, index_filename)):
+            raise FileNotFoundError('PACK ({})'.format(pack_dir))
+
+        self.__pack_dir = pack_dir
+        self.__features = None
+        self.__shards = dict()
+        self.__segments = None
+        self.__segments_dict = None
+
+    @property
+    def pack_dir(self):
+        return self.__pack_dir
+
+    @property
+    def features(self):
+        if self.__features is None:
+            try:
+                with open(os.path.join(self.pack_dir, features_filename)) as features_file:
+                    self.__features = ops.FeatureConfig(**json.load(features_file))
+            except FileNotFoundError:
+                # packs written before features could be configured
+                self.__features = ops.default_features
+        return self.__features
+
+    @property
+    def index(self):
+        return pd.read_csv(os.path.join(self.pack_dir, index_filename),
+                           dtype={'ytid': str, 'positive_labels': str},
+                           keep_default_na=False)
+
+    def shard(self, shard):
+        if shard not in self.__shards:
+            filename = os.path.join(self.pack_dir, shard_filename.format(shard))
+            self.__shards[shard] = np.memmap(filename, dtype=np.uint8, mode='r')
+        return self.__shards[shard]
+
+    def read(self, shard, offset, dtype, shape):
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return self.shard(int(shard))[offset:offset + size].view(dtype).reshape(shape)
+
+    @property
+    def segments(self):
+        if self.__segments is None:
+            self.__segments = [PackedSegment(self, record) for record in self.index.itertuples(index=False)]
+        return self.__segments
+
+    def to_dict(self):
+        if self.__segments_dict is None:
+            self.__segments_dict =\
+                {segment.ytid: segment for segment in self.segments}
+        return self.__segments_dict
+
+    def __contains__(self, item):
+        return item in self.to_dict()
+
+    def __getitem__(self, item) -> Union[PackedSegment, List[PackedSegment]]:
+        if isinstance(item, str):
+            return self.to_dict()[item]
+        if isinstance(item, (int, slice)):
+            return self.segments[item]
+        raise KeyError('Can only retrieve item by ytid or row index')
+
+    def __len__(self):
+        return len(self.segments)
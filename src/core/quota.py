@@ -0,0 +1,57 @@
+import threading
+from typing import Dict, Iterable
+
+
+class LabelQuota:
+    """
+    Number of segments downloaded for each label, shared by concurrent download workers.
+    `labels` maps each label to the ids it covers (e.g. its ontology descendants).
+    A segment reserves a place in every label it belongs to before being downloaded, then keeps it
+    (`commit`) or gives it back (`release`), so in-flight downloads never take a label past `limit`.
+    """
+
+    def __init__(self, labels: Dict[str, Iterable[str]], limit=None, downloaded=()):
+        self.labels = {label: frozenset(ids) for label, ids in labels.items()}
+        self.limit = limit
+        self.counts = dict.fromkeys(self.labels, 0)
+        self.reserved = dict.fromkeys(self.labels, 0)
+        self.lock = threading.Lock()
+
+        for segment in downloaded:
+            for label in self.labels_of(segment):
+                self.counts[label] += 1
+
+    def labels_of(self, segment):
+        return [label for label, ids in self.labels.items() if any(map(ids.__contains__, segment.positive_labels))]
+
+    def reserve(self, segment):
+        """
+        Reserve a place for `segment` in all of its labels. Nothing is reserved if any of them
+        is already full, and the full labels are returned.
+        """
+        labels = self.labels_of(segment)
+
+        with self.lock:
+            if self.limit is not None:
+                exceeded = [label for label in labels if self.counts[label] + self.reserved[label] >= self.limit]
+                if exceeded:
+                    return exceeded
+
+            for label in labels:
+                self.reserved[label] += 1
+        return []
+
+    def commit(self, segment):
+        with self.lock:
+            for label in self.labels_of(segment):
+                self.reserved[label] -= 1
+                self.counts[label] += 1
+
+    def release(self, segment):
+        with self.lock:
+            for label in self.labels_of(segment):
+                self.reserved[label] -= 1
+
+    @property
+    def finished(self):
+        return self.limit is not None and all(map(self.limit.__le__, self.counts.values()))
@@ -2,15 +2,18 @@ import glob
 import json
 import os
 import random
-from functools import reduce
+import weakref
 from operator import itemgetter
 from typing import Union, List
 
 import math
+import numpy as np
 import pandas as pd
 
 from core import ops
-from util import tensorplow as tp, youtube as yt
+from core.availability import AvailabilityIndex
+from core.metadata import MetadataStore, metadata_filename
+from util import youtube as yt
 
 
 class Segment:
@@ -22,7 +25,34 @@ class Segment:
         'wavelength'
     ]
 
-    def __init__(self, root_dir, ytid, start_seconds, end_seconds, positive_labels):
+    computed_attr_names = [
+        'duration',
+        'wavelength'
+    ]
+
+    __slots__ = (
+        'root_dir',
+        'metadata',
+        'features',
+        'ytid',
+        'start_seconds',
+        'end_seconds',
+        'positive_labels',
+        '__raw',
+        '__duration',
+        '__wavelength',
+        '__raw_offset',
+        '__positive_indices',
+        '__frame_indices',
+        '__spectrogram_offset',
+        '__weakref__'
+    )
+
+    def __init__(self, root_dir, ytid, start_seconds, end_seconds, positive_labels, metadata=None, raw=None,
+                 features=None):
+        self.metadata = metadata
+        self.features = features if features is not None else ops.default_features
+        self.__raw = raw
         self.root_dir = root_dir
         self.ytid = ytid
         self.start_seconds = start_seconds
@@ -31,28 +61,68 @@ class Segment:
 
         self.__duration = None
         self.__wavelength = None
+        self.__raw_offset = None
         self.__positive_indices = None
+        self.__frame_indices = None
+        self.__spectrogram_offset = None
 
         self.load_attributes()
         self.start_seconds = math.ceil(self.start_seconds)
         self.end_seconds = math.floor(self.end_seconds)
 
+    def read_attributes_file(self):
+        if not os.path.exists(self.attrs_file):
+            return dict()
+
+        with open(self.attrs_file) as attrs_file:
+            try:
+                return json.load(attrs_file)
+            except json.JSONDecodeError:
+                return dict()
+
     def load_attributes(self):
-        if os.path.exists(self.attrs_file):
-            with open(self.attrs_file) as attrs_file:
-                try:
-                    attrs = json.load(attrs_file)
-                except json.JSONDecodeError:
-                    attrs = dict()
-
-            for name in self.attr_names:
-                if name in attrs:
-                    setattr(self, '_Segment__' + name, attrs[name])
-
-    def save_attribute(self, key, value):
+        """
+        Restore the computed attributes from the metadata store if the segment has one,
+        from its attributes file otherwise. The others always come from the segments file.
+        """
+        if self.metadata is not None:
+            attrs = self.metadata.attributes(self.ytid)
+        else:
+            attrs = self.read_attributes_file()
+
+        for name in self.saved_attr_names:
+            if name in attrs:
+                setattr(self, '_Segment__' + name, attrs[name])
+
+    @property
+    def saved_attr_names(self):
+        # the wavelength is only saved for the sample rate of the default features
+        if self.sample_rate == ops.default_features.sample_rate:
+            return self.computed_attr_names
+        return [name for name in self.computed_attr_names if name != 'wavelength']
+
+    def import_attributes_file(self):
+        """
+        Move the computed attributes of an attributes file written before the metadata store into the store.
+        """
+        attrs = self.read_attributes_file()
+        for name in self.saved_attr_names:
+            if name in attrs:
+                setattr(self, '_Segment__' + name, attrs[name])
+                self.save_attribute(name, attrs[name])
+
+    def save_attribute(self, key, value, overwrite=False):
         if key not in self.attr_names:
             raise ValueError('key {} can\'t be saved to attributes file'.format(key))
 
+        if key in self.computed_attr_names and key not in self.saved_attr_names:
+            return
+
+        if self.metadata is not None:
+            if key in self.computed_attr_names:
+                self.metadata.save(self.ytid, key, value, overwrite)
+            return
+
         if not os.path.exists(self.dir):
             return
 
@@ -67,7 +137,7 @@ class Segment:
             except json.JSONDecodeError:
                 attrs = dict()
 
-        if key not in attrs:
+        if key not in attrs or overwrite:
             attrs[key] = value
 
         with open(self.attrs_file, 'w') as attrs_file:
@@ -95,9 +165,12 @@ class Segment:
 
     @property
     def raw(self):
-        paths = map((self.raw_prefix + '.{}').format, yt.outfile_extensions)
-        globs = map(glob.glob, paths)
-        files = reduce(lambda a, b: a + b, globs)
+        # a raw file already known (e.g. from an `AvailabilityIndex`) only costs a stat
+        if self.__raw is not None and os.path.exists(self.__raw):
+            return self.__raw
+
+        files = glob.glob(glob.escape(self.raw_prefix) + '.*')
+        files = sorted(filter(lambda f: yt.is_outfile(f, self.ytid), files))
 
         if not files:
             raise FileNotFoundError('RAW ({})'.format(self.ytid))
@@ -113,21 +186,36 @@ class Segment:
     def attrs_file(self):
         return os.path.join(self.dir, '{}.json'.format(self.ytid))
 
+    @property
+    def frames_file(self):
+        return os.path.join(self.frames_dir, ops.keyed_filename('frames.npy', self.features.frames_key))
+
+    @property
+    def frames_index_file(self):
+        return os.path.join(self.frames_dir, ops.keyed_filename('index.npy', self.features.frames_key))
+
     def frame(self, index):
         return os.path.join(self.frames_dir, '{}.jpg'.format(index))
 
+    @property
+    def spectrogram_file(self):
+        return os.path.join(self.spectrograms_dir,
+                            ops.keyed_filename('spectrogram.npy', self.features.spectrogram_key))
+
+    @property
+    def spectrogram_offset_file(self):
+        return ops.spectrogram_offset_file(self.spectrogram_file)
+
     def spectrogram(self, index):
         return os.path.join(self.spectrograms_dir, '{}.npz'.format(index))
 
     @property
     def frame_rate(self):
-        # TODO: Do not use constant value
-        return 25
+        return self.features.frame_rate
 
     @property
     def sample_rate(self):
-        # TODO: Do not use constant value
-        return 48000
+        return self.features.sample_rate
 
     @property
     def start_frames(self):
@@ -148,18 +236,26 @@ class Segment:
     def get_seconds(self, frame_index):
         return frame_index / self.frame_rate
 
+    @property
+    def raw_offset_frames(self):
+        return math.ceil(self.raw_offset * self.frame_rate)
+
     def get_sample_index(self, frame_index):
-        return int(self.get_seconds(frame_index) * self.sample_rate)
+        # index in the waveform of the raw video, which starts at `raw_offset`
+        return int(self.get_seconds(frame_index) * self.sample_rate) - round(self.raw_offset * self.sample_rate)
 
     @property
     def positive_indices(self):
         if self.__positive_indices is None:
-            if os.path.exists(self.frames_dir):
+            if self.packed_frames is not None:
+                max_frame_index = int(self.packed_frames[1][-1])
+            elif os.path.exists(self.frames_dir):
                 frames = os.listdir(self.frames_dir)
+                frames = filter(lambda f: f.endswith('.jpg'), frames)
                 frames = map(lambda f: f.split('.'), frames)
                 frames = map(itemgetter(0), frames)
                 frames = map(int, frames)
-                max_frame_index = max(frames)
+                max_frame_index = max(frames, default=len(self))
             else:
                 max_frame_index = len(self)
             self.__positive_indices = range(self.start_frames, min(self.end_frames, len(self), max_frame_index))
@@ -167,48 +263,224 @@ class Segment:
 
     @property
     def duration(self):
+        if self.__duration is None and self.metadata is not None:
+            self.import_attributes_file()
         if self.__duration is None:
             self.__duration = ops.get_video_duration(self.raw)
         return self.__duration
 
     @property
     def wavelength(self):
+        if self.__wavelength is None and self.metadata is not None:
+            self.import_attributes_file()
         if self.__wavelength is None:
             self.__wavelength = len(self.waveform.audio)
         return self.__wavelength
 
+    @property
+    def raw_offset(self):
+        """
+        Time (in seconds) the raw video starts at in the original video, which is not 0 once trimmed.
+        It is always read from the name of the raw video, which changes whenever the raw video does.
+        """
+        if self.__raw_offset is None:
+            # videos downloaded before trimming was possible start at 0
+            self.__raw_offset = (yt.parse_outfile(self.raw)[1] or 0.) if self.is_available else 0.
+        return self.__raw_offset
+
+    def trim(self, margin=1.):
+        """
+        Replace the raw video by its part covering the segment, with `margin` seconds before and after,
+        so it takes less space and every later decode is shorter. Frame and sample indices don't change,
+        only the floor of the spectrograms may (it is relative to the loudest part of the raw video).
+        """
+        raw = self.raw
+        _, offset, ext = yt.parse_outfile(raw)
+
+        if offset is not None:
+            return raw
+
+        temp_output = yt.outfile(self.raw_prefix + '.part', ext)
+        try:
+            offset = ops.trim_video(raw, temp_output, self.start_seconds - margin, self.end_seconds + margin)
+            output = yt.outfile(self.raw_prefix, ext, offset)
+            os.replace(temp_output, output)
+        except BaseException:
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+            raise
+
+        os.remove(raw)
+        self.__raw = output
+        self.__raw_offset = yt.parse_outfile(output)[1]
+        # computed from the previous raw video, they are saved again by the next `extract`
+        self.__duration = None
+        self.__wavelength = None
+        return output
+
     @property
     def waveform(self):
-        if not os.path.exists(self.wav):
-            ops.extract_audio(self.raw, self.wav)
-        return tp.load_wav(self.wav)
+        if os.path.exists(self.wav):
+            # imported here, as tensorplow imports TensorFlow
+            from util import tensorplow as tp
+            wav = tp.load_wav(self.wav)
+            if int(wav.sample_rate) == self.sample_rate:
+                return ops.Waveform(wav.audio.numpy(), int(wav.sample_rate))
+        return ops.decode_audio(self.raw, self.sample_rate)
+
+    @property
+    def packed_frames(self):
+        """
+        The packed frames and their indices, or None if the frames are not extracted yet.
+        Only the indices are kept, the frames are mapped through the shared maps of `ops.load_memmap`.
+        """
+        if self.__frame_indices is None:
+            if not os.path.exists(self.frames_index_file):
+                return None
+            self.__frame_indices = np.load(self.frames_index_file)
+        return ops.load_memmap(self.frames_file), self.__frame_indices
+
+    def extract_frames(self):
+        frames = ops.decode_frames(self.raw, self.start_seconds - self.raw_offset, self.features)
+        indices = range(self.start_frames, self.start_frames + len(frames))
+        ops.save_packed_frames(frames, indices, self.frames_file, self.frames_index_file)
+        self.__frame_indices = None
+
+    def extract(self, outputs=()):
+        """
+        Decode frames, audio and duration from the raw video in a single ffmpeg pass,
+        then save the packed frames and the full spectrogram that are still missing.
+        The `outputs` ('frames' and/or 'spectrogram') are saved again even if they exist,
+        and only the audio is decoded when the frames are not needed.
+        """
+        outputs = set(outputs)
+        # the raw video may have been replaced (e.g. trimmed) since the offset was read
+        self.__raw_offset = None
+        if not os.path.exists(self.frames_index_file):
+            outputs.add('frames')
+        # full spectrograms without an offset are from before they only covered the segment
+        if not os.path.exists(self.spectrogram_file) or not os.path.exists(self.spectrogram_offset_file):
+            outputs.add('spectrogram')
+
+        start_time = self.start_seconds - self.raw_offset
+
+        if 'frames' in outputs:
+            frames, waveform, duration = ops.decode_segment(self.raw, start_time, self.features)
+            indices = range(self.start_frames, self.start_frames + len(frames))
+            ops.save_packed_frames(frames, indices, self.frames_file, self.frames_index_file)
+            self.__frame_indices = None
+            self.__duration = duration
+        else:
+            waveform = ops.decode_audio(self.raw, self.sample_rate)
+
+        if 'spectrogram' in outputs:
+            self.compute_spectrogram(waveform, overwrite=True)
+
+        # both are computed again from the raw video, which may not be the one they were saved from
+        self.__wavelength = len(waveform.audio)
+        if 'frames' in outputs:
+            self.save_attribute('duration', self.__duration, overwrite=True)
+        elif self.__duration is not None:
+            self.save_attribute('duration', self.__duration)
+        self.save_attribute('wavelength', self.__wavelength, overwrite=True)
+
+        if self.metadata is not None:
+            self.metadata.flush()
 
     def load_frame(self, index):
-        if not os.path.exists(self.frame(index)):
-            ops.extract_frames(self.raw,
-                               self.frames_dir,
-                               self.start_seconds)
-        return tp.load_image(self.frame(index))
+        if self.packed_frames is None:
+            # frames saved one by one are from before features could be configured
+            if self.features.frames_key is None and os.path.exists(self.frame(index)):
+                return ops.load_image(self.frame(index))
+            self.extract_frames()
 
-    def load_spectrogram(self, index):
-        if not os.path.exists(self.spectrogram(index)):
-            start_index = self.get_sample_index(index)
-            end_index = start_index + self.sample_rate
-            waveform = self.waveform.audio[start_index:end_index]
-            ops.compute_spectrogram(waveform, self.spectrogram(index))
-        return ops.load_spectrogram(self.spectrogram(index))
+        frames, frame_indices = self.packed_frames
+        position = np.searchsorted(frame_indices, index)
 
-    def get_positive_sample_index(self):
-        frame_index = random.choice(self.positive_indices)
+        if position == len(frame_indices) or frame_indices[position] != index:
+            raise FileNotFoundError('FRAME ({}: {})'.format(self.ytid, index))
+        return frames[position]
+
+    @property
+    def full_spectrogram(self):
+        # mapped through the shared maps of `ops.load_memmap`, not kept by the segment
+        try:
+            return ops.load_full_spectrogram(self.spectrogram_file)
+        except FileNotFoundError:
+            return None
+
+    @property
+    def spectrogram_window(self):
+        """
+        Samples of the raw video covered by the full spectrogram: the audio windows sampled for the segment
+        start up to one second before its first frame and end up to one second after its last frame.
+        Segments without a window (e.g. a whole video to localize, from -1 to -1) cover the whole audio.
+        """
+        if self.end_seconds <= self.start_seconds:
+            return 0, None
+        return (max(0, self.get_sample_index(self.start_frames - self.frame_rate)),
+                self.get_sample_index(self.end_frames) + self.sample_rate)
+
+    @property
+    def spectrogram_offset(self):
+        if self.__spectrogram_offset is None:
+            self.__spectrogram_offset = ops.load_spectrogram_offset(self.spectrogram_file)
+        return self.__spectrogram_offset
+
+    def compute_spectrogram(self, waveform=None, overwrite=False):
+        waveform = waveform if waveform is not None else self.waveform
+        start_sample, end_sample = self.spectrogram_window
+        ops.compute_full_spectrogram(waveform.audio, self.spectrogram_file, overwrite=overwrite,
+                                     features=self.features, start_sample=start_sample, end_sample=end_sample)
+        self.__spectrogram_offset = None
+
+    def load_spectrogram(self, index):
+        spectrogram = self.full_spectrogram
+        if spectrogram is None:
+            # spectrograms saved one by one are from before features could be configured
+            if self.features.spectrogram_key is None and os.path.exists(self.spectrogram(index)):
+                return ops.load_spectrogram(self.spectrogram(index))
+            self.compute_spectrogram()
+            spectrogram = self.full_spectrogram
+
+        columns = ops.spectrogram_columns(self.get_sample_index(index), self.sample_rate, self.features,
+                                          self.spectrogram_offset)
+        if columns.start < 0:
+            raise FileNotFoundError('SPECTROGRAM ({}: {})'.format(self.ytid, index))
+        return spectrogram[:, columns, np.newaxis]
+
+    def sample_frame_index(self, rng=random):
+        return rng.choice(self.positive_indices)
+
+    def sample_audio_index(self, frame_index=None, rng=random):
+        """
+        Index of an audio window positive to `frame_index` (any window ending within one second
+        after the frame), or to a randomly sampled frame if `frame_index` is None.
+        """
+        if frame_index is None:
+            frame_index = self.sample_frame_index(rng)
 
         audio_positive_indices = range(frame_index - self.frame_rate + 1, frame_index + 1)
-        audio_index = max(0, random.choice(audio_positive_indices))
+        return max(self.raw_offset_frames, rng.choice(audio_positive_indices))
+
+    def sample_frame(self, rng=random):
+        """
+        Load a random positive frame. Returns the frame index along with the frame,
+        so that a matching spectrogram can be sampled with `sample_spectrogram`.
+        """
+        frame_index = self.sample_frame_index(rng)
+        return frame_index, self.load_frame(frame_index)
+
+    def sample_spectrogram(self, frame_index=None, rng=random):
+        return self.load_spectrogram(self.sample_audio_index(frame_index, rng))
 
-        return frame_index, audio_index
+    def get_positive_sample_index(self, rng=random):
+        frame_index = self.sample_frame_index(rng)
+        return frame_index, self.sample_audio_index(frame_index, rng)
 
-    def get_positive_sample(self):
-        frame_index, audio_index = self.get_positive_sample_index()
-        return self.load_frame(frame_index), self.load_spectrogram(audio_index)
+    def get_positive_sample(self, rng=random):
+        frame_index, frame = self.sample_frame(rng)
+        return frame, self.sample_spectrogram(frame_index, rng)
 
     @property
     def is_available(self):
@@ -223,6 +495,12 @@ class Segment:
         if key in self.attr_names:
             self.save_attribute(key, value)
 
+    def __setstate__(self, state):
+        # restore the slots of an unpickled segment without saving them as attributes again
+        state, slots = state if isinstance(state, tuple) else (state, None)
+        for key, value in {**(state or dict()), **(slots or dict())}.items():
+            object.__setattr__(self, key, value)
+
     def __eq__(self, other):
         if isinstance(other, Segment):
             return self.ytid == other.ytid
@@ -231,12 +509,143 @@ class Segment:
         return False
 
     def __len__(self):
-        waveform_end = math.floor(self.wavelength / self.sample_rate)
+        waveform_end = math.floor(self.raw_offset + self.wavelength / self.sample_rate)
         return (waveform_end - 1) * self.frame_rate
 
 
+segments_columns = ['ytid', 'start_seconds', 'end_seconds', 'positive_labels']
+
+
+def read_segments(filename):
+    """
+    Parse an AudioSet segments csv into a table with the C parser.
+    `positive_labels` are kept as comma separated strings.
+    """
+    try:
+        return pd.read_csv(filename,
+                           sep=',',
+                           header=None,
+                           names=segments_columns,
+                           dtype={'ytid': str, 'positive_labels': str},
+                           skipinitialspace=True,
+                           keep_default_na=False,
+                           comment='#',
+                           engine='c')
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=segments_columns)
+
+
+class SegmentsTable:
+    """
+    Compact columnar table of segments: fixed width ytids, start and end seconds, and the
+    positive labels of every row interned to integer ids into `labels`, stored flat in
+    `label_ids` with row boundaries in `label_offsets`.
+    """
+
+    def __init__(self, ytids, start_seconds, end_seconds, label_ids, label_offsets, labels):
+        self.ytids = ytids
+        self.start_seconds = start_seconds
+        self.end_seconds = end_seconds
+        self.label_ids = label_ids
+        self.label_offsets = label_offsets
+        self.labels = labels
+        self.__sorted_ytids = None
+        self.__sorted_positions = None
+        self.__label_rows = None
+
+    @classmethod
+    def from_csv(cls, filename, labels=None):
+        """
+        Read a segments csv. Labels are interned to their index in `labels` when given
+        (e.g. the ontology ids), labels missing from it are appended to the vocabulary.
+        """
+        csv = read_segments(filename)
+        positive_labels = csv['positive_labels'].astype(str)
+
+        label_counts = np.where(positive_labels == '', 0, positive_labels.str.count(',') + 1)
+        label_offsets = np.zeros(len(csv) + 1, dtype=np.int64)
+        np.cumsum(label_counts, out=label_offsets[1:])
+
+        flat_labels = ','.join(positive_labels[label_counts > 0]).split(',') if label_offsets[-1] else []
+        codes, uniques = pd.factorize(pd.Series(flat_labels, dtype=object))
+
+        vocabulary = dict(map(reversed, enumerate(labels or [])))
+        for label in uniques:
+            vocabulary.setdefault(label, len(vocabulary))
+        unique_ids = np.array([vocabulary[label] for label in uniques], dtype=np.int32)
+
+        return cls(ytids=np.asarray(csv['ytid'].to_numpy(), dtype=str),
+                   start_seconds=csv['start_seconds'].to_numpy(dtype=np.float64),
+                   end_seconds=csv['end_seconds'].to_numpy(dtype=np.float64),
+                   label_ids=unique_ids[codes] if len(codes) else np.zeros(0, dtype=np.int32),
+                   label_offsets=label_offsets,
+                   labels=np.asarray(list(vocabulary), dtype=str))
+
+    def positive_label_ids(self, position):
+        return self.label_ids[self.label_offsets[position]:self.label_offsets[position + 1]]
+
+    def positive_labels(self, position):
+        return self.labels[self.positive_label_ids(position)].tolist()
+
+    def label_rows(self):
+        """
+        Row position of every item of `label_ids`.
+        """
+        if self.__label_rows is None:
+            self.__label_rows = np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.label_offsets))
+        return self.__label_rows
+
+    def rows_with_labels(self, selected):
+        """
+        Boolean mask of the rows with at least one positive label flagged in `selected`
+        (a boolean mask over `labels`).
+        """
+        matches = np.zeros(len(self), dtype=bool)
+        matches[self.label_rows()[np.asarray(selected, dtype=bool)[self.label_ids]]] = True
+        return matches
+
+    def position(self, ytid):
+        if self.__sorted_positions is None:
+            self.__sorted_positions = np.argsort(self.ytids, kind='stable')
+            self.__sorted_ytids = self.ytids[self.__sorted_positions]
+
+        # the last row wins on duplicated ytids
+        index = np.searchsorted(self.__sorted_ytids, ytid, side='right') - 1
+        if index < 0 or self.__sorted_ytids[index] != ytid:
+            raise KeyError(ytid)
+        return int(self.__sorted_positions[index])
+
+    def take(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        label_counts = np.diff(self.label_offsets)[positions]
+        label_offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(label_counts, out=label_offsets[1:])
+
+        starts = np.repeat(self.label_offsets[positions] - label_offsets[:-1], label_counts)
+        label_ids = self.label_ids[starts + np.arange(label_offsets[-1])]
+
+        return SegmentsTable(self.ytids[positions],
+                             self.start_seconds[positions],
+                             self.end_seconds[positions],
+                             label_ids,
+                             label_offsets,
+                             self.labels)
+
+    @property
+    def nbytes(self):
+        arrays = self.ytids, self.start_seconds, self.end_seconds, self.label_ids, self.label_offsets, self.labels
+        return sum(map(lambda x: x.nbytes, arrays))
+
+    def __len__(self):
+        return len(self.ytids)
+
+
 class SegmentsWrapper:
-    def __init__(self, filename, root_dir):
+    """
+    Segments of a csv under `root_dir`. With an `ontology`, label ids are the indices of its ids.
+    """
+
+    def __init__(self, filename, root_dir, features=None, ontology=None):
         if not isinstance(filename, str):
             raise TypeError('FILENAME can\'t be of type {}'.format(type(filename).__name__))
 
@@ -245,8 +654,12 @@ class SegmentsWrapper:
 
         self.__filename = filename
         self.__root_dir = root_dir
-        self.__segments = None
-        self.__segments_dict = None
+        self.__features = features if features is not None else ops.default_features
+        self.__ontology = ontology
+        self.__table = None
+        self.__metadata = None
+        self.__availability = None
+        self.__segments = weakref.WeakValueDictionary()
 
     @property
     def filename(self):
@@ -256,48 +669,130 @@ class SegmentsWrapper:
     def root_dir(self):
         return self.__root_dir
 
+    @property
+    def features(self):
+        return self.__features
+
+    @property
+    def ontology(self):
+        return self.__ontology
+
+    @property
+    def table(self):
+        if self.__table is None:
+            labels = self.ontology.ids.tolist() if self.ontology is not None else None
+            self.__table = SegmentsTable.from_csv(self.filename, labels)
+        return self.__table
+
+    @property
+    def metadata(self):
+        if self.__metadata is None:
+            self.__metadata = MetadataStore(os.path.join(self.root_dir, metadata_filename))
+        return self.__metadata
+
+    @property
+    def availability(self):
+        if self.__availability is None:
+            self.__availability = AvailabilityIndex(self.root_dir)
+        return self.__availability
+
+    def __segment(self, position):
+        """
+        `Segment` objects are only created (and their attributes loaded) when they are accessed,
+        and are kept only as long as they are referenced elsewhere.
+        """
+        segment = self.__segments.get(position)
+        if segment is None:
+            ytid = str(self.table.ytids[position])
+            segment = Segment(self.root_dir,
+                              ytid,
+                              float(self.table.start_seconds[position]),
+                              float(self.table.end_seconds[position]),
+                              self.table.positive_labels(position),
+                              self.metadata,
+                              self.availability.get(ytid),
+                              self.features)
+            self.__segments[position] = segment
+        return segment
+
     @property
     def segments(self):
-        if self.__segments is None:
-            def to_segment(row):
-                row = [*row[1]]
-                row[-1] = row[-1].strip('"').split(',')
-                return Segment(self.root_dir, *row)
-
-            csv = pd.read_csv(self.filename,
-                              sep=', ',
-                              header=None,
-                              engine='python',
-                              comment='#')
-            self.__segments = list(map(to_segment, csv.iterrows()))
-        return self.__segments
+        return list(map(self.__segment, range(len(self))))
+
+    def position(self, ytid):
+        return self.table.position(ytid)
 
     def to_dict(self):
-        if self.__segments_dict is None:
-            self.__segments_dict =\
-                {segment.ytid: segment for segment in self.segments}
-        return self.__segments_dict
+        return {segment.ytid: segment for segment in self}
+
+    def take(self, positions):
+        """
+        New wrapper over the rows at `positions` (sorted), sharing the segments already created.
+        """
+        new_segments = SegmentsWrapper(self.filename, self.root_dir, self.features, self.ontology)
+        new_segments.__table = self.table.take(positions)
+        new_segments.__metadata = self.__metadata
+        new_segments.__availability = self.__availability
+        for position, segment in list(self.__segments.items()):
+            new_position = np.searchsorted(positions, position)
+            if new_position < len(positions) and positions[new_position] == position:
+                new_segments.__segments[int(new_position)] = segment
+        return new_segments
 
-    def filter(self, *labels: str):
-        if not all(map(lambda x: isinstance(x, str), labels)):
+    def filter(self, *labels: str, ontology=None, exclude=None):
+        """
+        Segments with at least one of `labels` as positive label, and none of `exclude`.
+        With an `ontology`, both are expanded to everything below them in its hierarchy
+        (and no `labels` selects every label of the ontology), and selected by id if it is the one
+        of the segments.
+        """
+        exclude = exclude or ()
+        if not all(map(lambda x: isinstance(x, str), [*labels, *exclude])):
             raise TypeError('Can only filter by str')
 
-        new_segments = SegmentsWrapper('.', self.root_dir)
+        def selected(labels_):
+            if ontology is None:
+                return np.isin(self.table.labels, labels_)
 
-        # at least one positive label match the filter label
-        new_segments.__segments =\
-            list(filter(lambda s: any(map(lambda l: l in labels, s.positive_labels)), self.segments))
-        return new_segments
+            descendants = ontology.descendants_mask(*labels_)
+            if ontology is not self.ontology:
+                return np.isin(self.table.labels, ontology.ids[descendants])
+
+            # the first labels of the table are the ontology ids, labels outside of it are never selected
+            mask = np.zeros(len(self.table.labels), dtype=bool)
+            mask[:len(descendants)] = descendants
+            return mask
+
+        matches = self.table.rows_with_labels(selected(labels))
+        if exclude:
+            matches &= ~self.table.rows_with_labels(selected(exclude))
+        return self.take(np.flatnonzero(matches))
+
+    def available(self):
+        """
+        Segments whose raw video is downloaded, answered by the availability index.
+        """
+        available = np.fromiter(map(self.availability.__contains__, self.table.ytids), dtype=bool, count=len(self))
+        return self.take(np.flatnonzero(available))
 
     def __contains__(self, item):
-        return item in self.to_dict()
+        try:
+            self.position(item)
+        except (KeyError, TypeError):
+            return False
+        return True
 
     def __getitem__(self, item) -> Union[Segment, List[Segment]]:
         if isinstance(item, str):
-            return self.to_dict()[item]
-        if isinstance(item, (int, slice)):
-            return self.segments[item]
+            return self.__segment(self.position(item))
+        if isinstance(item, int):
+            return self.__segment(range(len(self))[item])
+        if isinstance(item, slice):
+            return list(map(self.__segment, range(len(self))[item]))
         raise KeyError('Can only retrieve item by ytid or row index')
 
+    def __iter__(self):
+        return map(self.__segment, range(len(self)))
+
     def __len__(self):
-        return len(self.segments)
+        return len(self.table)
@@ -1,6 +1,8 @@
 import os
+import re
 import shutil
 import subprocess
+import threading
 
 
 def ffmpeg(infile, outfile, *flags, **options):
@@ -28,6 +30,130 @@ def ffmpeg(infile, outfile, *flags, **options):
         raise RuntimeError('FFMPEG ({})'.format(command))
 
 
+def pipe(infile, *flags, **options):
+    """
+    Run ffmpeg with its output written to stdout instead of a file.
+    The output format has to be set with the `f` option (e.g. `f='rawvideo'`).
+    Return the raw output bytes and ffmpeg's log.
+    """
+    if not shutil.which('ffmpeg'):
+        raise AssertionError('ffmpeg not available')
+
+    if not os.path.exists(infile):
+        raise FileNotFoundError('INFILE ({})'.format(infile))
+
+    command = 'ffmpeg -i infile {flags} {options} -loglevel info -nostats -hide_banner pipe:1'.format(
+        flags=' '.join(map(lambda flag: '-' + flag, flags)).strip(),
+        options=' '.join(map(lambda item: '-{} {}'.format(*item), options.items())).strip())
+
+    command = command.split()
+    command[2] = infile
+
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return process.stdout, process.stderr.decode(errors='replace')
+    except subprocess.SubprocessError:
+        raise RuntimeError('FFMPEG ({})'.format(command))
+
+
+def parse_video_size(log, output=0):
+    """
+    Return (width, height) of the video stream of `output` from ffmpeg's log.
+    """
+    log = log[log.index('Output #{}'.format(output)):]
+    match = re.search(r'Stream #{}:\d+.*?: Video: [^\n]*?, (\d+)x(\d+)'.format(output), log)
+
+    if match is None:
+        raise ValueError('No video stream found for output #{}'.format(output))
+    return int(match.group(1)), int(match.group(2))
+
+
+def pipes(infile, *outputs):
+    """
+    Run a single ffmpeg process with several outputs, each one written to its own pipe,
+    so the input is demuxed and decoded only once.
+    Each output is a dict of options (use None as the value of a flag, e.g. `vn=None`)
+    and has to set its format with the `f` option.
+    Return the list of output bytes and ffmpeg's log.
+    """
+    if not shutil.which('ffmpeg'):
+        raise AssertionError('ffmpeg not available')
+
+    if not os.path.exists(infile):
+        raise FileNotFoundError('INFILE ({})'.format(infile))
+
+    if os.name == 'nt':
+        raise NotImplementedError('Multiple output pipes are not supported on Windows')
+
+    pipe_fds = [os.pipe() for _ in outputs[1:]]
+    write_fds = [write_fd for _, write_fd in pipe_fds]
+    urls = ['pipe:1'] + list(map('pipe:{}'.format, write_fds))
+
+    command = ['ffmpeg', '-i', infile]
+    for options, url in zip(outputs, urls):
+        for key, value in options.items():
+            command += ['-' + key] if value is None else ['-' + key, str(value)]
+        command.append(url)
+    command += ['-loglevel', 'info', '-nostats', '-hide_banner']
+
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=write_fds)
+    except OSError:
+        raise RuntimeError('FFMPEG ({})'.format(command))
+    finally:
+        for write_fd in write_fds:
+            os.close(write_fd)
+
+    readers = [process.stdout] + [os.fdopen(read_fd, 'rb') for read_fd, _ in pipe_fds] + [process.stderr]
+    results = [None] * len(readers)
+
+    # every pipe is drained concurrently, otherwise ffmpeg blocks on the first full one
+    def read(i):
+        with readers[i]:
+            results[i] = readers[i].read()
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(len(readers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if process.wait() != 0:
+        raise RuntimeError('FFMPEG ({})'.format(command))
+
+    return results[:-1], results[-1].decode(errors='replace')
+
+
+def parse_duration(log, index=0):
+    """
+    Return the duration (in seconds) of the input at `index` from ffmpeg's log.
+    """
+    log = log[log.index('Input #{}'.format(index)):]
+    match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', log)
+
+    if match is None:
+        raise ValueError('No duration found for input #{}'.format(index))
+
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def duration(infile):
+    """
+    Return the duration (in seconds) of `infile` from ffmpeg's log. Nothing is decoded.
+    """
+    if not shutil.which('ffmpeg'):
+        raise AssertionError('ffmpeg not available')
+
+    if not os.path.exists(infile):
+        raise FileNotFoundError('INFILE ({})'.format(infile))
+
+    # without any output, ffmpeg only prints the input (and fails)
+    command = ['ffmpeg', '-hide_banner', '-i', infile]
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return parse_duration(process.stderr.decode(errors='replace'))
+
+
 def ffprobe(input_file, *flags, **options):
     if not shutil.which('ffprobe'):
         raise AssertionError('ffprobe not available')
@@ -47,3 +173,62 @@ def ffprobe(input_file, *flags, **options):
         return output.decode()
     except subprocess.SubprocessError:
         raise RuntimeError('FFPROBE ({})'.format(command))
+
+
+def keyframes(infile):
+    """
+    Return the timestamps (in seconds) of the video keyframes of `infile`.
+    The packets are only demuxed (framecrc flags every packet that is not a keyframe),
+    so nothing is decoded.
+    """
+    if not shutil.which('ffmpeg'):
+        raise AssertionError('ffmpeg not available')
+
+    if not os.path.exists(infile):
+        raise FileNotFoundError('INFILE ({})'.format(infile))
+
+    command = ['ffmpeg', '-i', infile, '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-',
+               '-loglevel', 'error', '-nostats', '-hide_banner']
+
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except subprocess.SubprocessError:
+        raise RuntimeError('FFMPEG ({})'.format(command))
+
+    output = process.stdout.decode(errors='replace')
+    match = re.search(r'^#tb 0: (\d+)/(\d+)$', output, re.MULTILINE)
+
+    if match is None:
+        return []
+
+    time_base = int(match.group(1)) / int(match.group(2))
+    packets = (line.split(',') for line in output.splitlines() if line and not line.startswith('#'))
+    return sorted(int(packet[2]) * time_base for packet in packets if len(packet) == 6)
+
+
+def cut(infile, outfile, start_time, duration, copy=True):
+    """
+    Write the `duration` seconds of `infile` from `start_time` to `outfile`.
+    With `copy`, the streams are remuxed without being re-encoded: the output then starts
+    exactly at `start_time` only if it is the time of a keyframe (see `keyframes`).
+    """
+    if not shutil.which('ffmpeg'):
+        raise AssertionError('ffmpeg not available')
+
+    if not os.path.exists(infile):
+        raise FileNotFoundError('INFILE ({})'.format(infile))
+
+    if os.path.dirname(outfile) and not os.path.exists(os.path.dirname(outfile)):
+        os.makedirs(os.path.dirname(outfile))
+
+    command = ['ffmpeg', '-ss', str(start_time), '-i', infile, '-t', str(duration), '-map', '0:v?', '-map', '0:a?']
+    command += ['-c', 'copy'] if copy else []
+    command += ['-loglevel', 'panic', '-hide_banner', '-y', outfile]
+
+    try:
+        subprocess.check_output(command)
+    except subprocess.SubprocessError:
+        raise RuntimeError('FFMPEG ({})'.format(command))
+
+    if not os.path.exists(outfile) or not os.path.getsize(outfile):
+        raise RuntimeError('FFMPEG ({})'.format(command))
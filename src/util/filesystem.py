@@ -1,6 +1,7 @@
 import os
 import platform
 import subprocess
+from contextlib import contextmanager
 
 
 def symlink(source, target, alias=None):
@@ -29,3 +30,22 @@ def symlink(source, target, alias=None):
 
     link_name = os.path.join(target, alias or os.path.basename(source))
     return symlink_func(os.path.abspath(source), link_name)
+
+
+@contextmanager
+def atomic_output(filename):
+    """
+    Yield a temporary path next to `filename` and move it to `filename` only
+    when the block succeeds, so an interrupted write never leaves a partial file.
+    """
+    name, ext = os.path.splitext(filename)
+    temp_filename = '{}.part{}'.format(name, ext)
+
+    try:
+        yield temp_filename
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+    os.replace(temp_filename, filename)
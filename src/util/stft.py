@@ -0,0 +1,67 @@
+import numpy as np
+
+
+def hann_window(window_length):
+    """
+    Periodic Hann window, like `tf.signal.hann_window`.
+    """
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(window_length) / window_length)
+
+
+def frame(signals, frame_length, frame_step):
+    """
+    Return a read-only strided view of the last axis of `signals` split into frames of `frame_length`
+    samples every `frame_step` samples, like `tf.signal.frame` (without padding). No samples are copied.
+    """
+    signals = np.ascontiguousarray(signals)
+    count = max(0, 1 + (signals.shape[-1] - frame_length) // frame_step)
+    stride = signals.strides[-1]
+    return np.lib.stride_tricks.as_strided(signals,
+                                           shape=signals.shape[:-1] + (count, frame_length),
+                                           strides=signals.strides[:-1] + (frame_step * stride, stride),
+                                           writeable=False)
+
+
+def stft(signals, frame_length, frame_step, fft_length=None):
+    """
+    Short-time Fourier transform of the last axis of `signals`, with the same defaults
+    as `tf.signal.stft`: a periodic Hann window and the smallest power of 2 enclosing `frame_length`.
+    """
+    if fft_length is None:
+        fft_length = 1 << (frame_length - 1).bit_length()
+
+    frames = frame(signals, frame_length, frame_step) * hann_window(frame_length)
+    return np.fft.rfft(frames, fft_length)
+
+
+def log_spectrogram(signals, window_size, stride):
+    spec = np.abs(stft(signals, window_size, stride)) ** 2
+    return 10 * np.log10(spec + 1e-10)
+
+
+def spectrogram(waveform, sample_rate, window_length, overlap):
+    """
+    Same as `tensorplow.spectrogram`, computed with NumPy (without importing TensorFlow).
+    Values match within float32 precision, and are returned as a (frequencies, time) float32 array.
+    """
+    window_size = int(sample_rate * window_length)
+    stride = int(window_size * overlap)
+
+    log_spec = log_spectrogram(np.reshape(np.asarray(waveform, dtype=np.float32), -1), window_size, stride)
+    log_spec_normalized = np.maximum(log_spec, log_spec.max() - 80.0)
+
+    return log_spec_normalized.T.astype(np.float32)
+
+
+def batch_spectrogram(waveforms, sample_rate, window_length, overlap):
+    """
+    Same as `tensorplow.batch_spectrogram`, computed with NumPy (without importing TensorFlow).
+    """
+    window_size = int(sample_rate * window_length)
+    stride = int(window_size * overlap)
+
+    log_spec = log_spectrogram(np.asarray(waveforms, dtype=np.float32), window_size, stride)
+    log_spec_max = log_spec.max(axis=(-2, -1), keepdims=True)
+    log_spec_normalized = np.maximum(log_spec, log_spec_max - 80.0)
+
+    return np.transpose(log_spec_normalized, (0, 2, 1)).astype(np.float32)
@@ -60,3 +60,21 @@ def spectrogram(waveform, sample_rate, window_length, overlap):
     log_spec_transposed = tf.transpose(log_spec_normalized)
 
     return log_spec_transposed
+
+
+def batch_spectrogram(waveforms, sample_rate, window_length, overlap):
+    """
+    Same as `spectrogram`, but computed for a batch of equal length `waveforms`
+    of shape (batch, samples) in a single call. Each item is normalized on its own.
+    """
+    window_size = int(sample_rate * window_length)
+    stride = int(window_size * overlap)
+
+    stft = tf.signal.stft(waveforms, window_size, stride)
+    spec = tf.square(tf.math.abs(stft))
+    log_spec = 10 * tf.math.log(spec + 1e-10) / tf.math.log(10.)
+
+    log_spec_max = tf.math.reduce_max(log_spec, axis=[-2, -1], keepdims=True)
+    log_spec_normalized = tf.math.maximum(log_spec, log_spec_max - 80.0)
+
+    return tf.transpose(log_spec_normalized, [0, 2, 1])
@@ -8,7 +8,7 @@ def fork(count, target, *args):
     threads = list()
 
     for idx in range(count):
-        thread = threading.Thread(target=target, args=args[0])
+        thread = threading.Thread(target=target, args=args[idx])
         threads.append(thread)
         thread.start()
 
@@ -1,12 +1,22 @@
+import csv
+import json
 import logging
 import os
+import re
 import sys
+import threading
+import time
 
 import youtube_dl
 from furl import furl
 
 url_template = 'https://youtube.com/watch'
 outfile_extensions = ('mkv', 'mp4', 'webm')
+# a trimmed video keeps the time (in milliseconds) it starts at in the original one: YTID.OFFSETms.EXT
+outfile_pattern = re.compile(r'^(?P<ytid>[^.]+)(?:\.(?P<offset>\d+)ms)?\.(?P<ext>{})$'
+                             .format('|'.join(outfile_extensions)))
+failures_filename = 'failures.csv'
+info_cache_filename = 'info_cache.jsonl'
 
 # non-network keyword errors
 err_keywords = ['"token" parameter not in video info for unknown reason;',
@@ -34,6 +44,32 @@ err_keywords = ['"token" parameter not in video info for unknown reason;',
                 ', who has blocked it on copyright grounds.',
                 ', one or more of whom have blocked it on copyright grounds.', ]
 
+
+def outfile(prefix, ext, offset=None):
+    if offset is None:
+        return '{}.{}'.format(prefix, ext)
+    return '{}.{}ms.{}'.format(prefix, int(round(offset * 1000)), ext)
+
+
+def parse_outfile(filename):
+    """
+    Return the (ytid, offset, ext) of a downloaded video filename, with the offset in seconds
+    (None for a video that has not been trimmed), or None if `filename` is not a downloaded video.
+    """
+    match = outfile_pattern.match(os.path.basename(filename))
+
+    if match is None:
+        return None
+
+    offset = int(match.group('offset')) / 1000 if match.group('offset') is not None else None
+    return match.group('ytid'), offset, match.group('ext')
+
+
+def is_outfile(filename, ytid):
+    outfile_info = parse_outfile(filename)
+    return outfile_info is not None and outfile_info[0] == ytid
+
+
 logger = logging.Logger('youtube_logger')
 logger.addHandler(logging.StreamHandler(sys.stdout))
 
@@ -42,29 +78,202 @@ YDL_NORMAL_MODE = '0'
 YDL_TESTING_MODE = '-1'
 
 
-def dl(v, raise_exception=False, **options):
+def summarize(info):
     """
+    The part of a video info worth keeping: its duration, its formats (without their urls, which expire)
+    and the largest known filesize of all formats (in bytes).
+    """
+    formats = list(map(lambda x: {'format_id': x.get('format_id'),
+                                  'ext': x.get('ext'),
+                                  'filesize': x.get('filesize')},
+                       info.get('formats') or []))
+    filesizes = list(filter(lambda x: x is not None, map(lambda x: x['filesize'], formats)))
+
+    return {'id': info.get('id'),
+            'duration': info.get('duration'),
+            'filesize': max(filesizes) if filesizes else None,
+            'formats': formats}
+
+
+class InfoCache:
+    """
+    Persistent cache of video info summaries (see `summarize`), valid for `ttl` seconds.
+    Entries are appended as json lines, so concurrent probes and interrupted runs never lose
+    what was already written. The latest entry of a video wins.
+    """
+
+    def __init__(self, filename, ttl=7 * 24 * 60 * 60):
+        self.filename = filename
+        self.ttl = ttl
+        self.entries = self.load()
+        self.__lock = threading.Lock()
+
+    def load(self):
+        entries = dict()
+        if not os.path.exists(self.filename):
+            return entries
+
+        with open(self.filename) as infile:
+            for line in infile:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by an interrupted run
+                    continue
+                entries[entry['id']] = entry
+        return entries
+
+    def get(self, v):
+        entry = self.entries.get(v)
+        if entry is None or time.time() - entry['fetched'] >= self.ttl:
+            return None
+        return entry['info']
+
+    def put(self, v, info):
+        entry = {'id': v, 'fetched': time.time(), 'info': summarize(info)}
+        with self.__lock:
+            self.entries[v] = entry
+            os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+            with open(self.filename, 'a') as outfile:
+                outfile.write(json.dumps(entry) + '\n')
+        return entry['info']
+
+
+class YoutubeDownloader:
+    """
+    Reusable downloader keeping one `YoutubeDL` per thread. Network errors are retried with
+    exponential backoff (`backoff` * 2 ** attempt seconds, up to `max_backoff`) for at most
+    `max_attempts` attempts. Videos failing permanently (any of `err_keywords`) are saved with
+    their reason in `failures_file` and are never requested again.
+    With `info_file`, `probe` answers from a persistent `InfoCache` of info summaries kept for
+    `info_ttl` seconds, and the last info extracted in a thread is reused by `dl` for the same video.
+
     Open
     `YoutubeDL Options <https://github.com/rg3/youtube-dl/blob/master/youtube_dl/YoutubeDL.py#L118-L320>`_
     to see all available options
     """
-    if os.environ.get(YDL_EXECUTE_MODE, YDL_NORMAL_MODE) == YDL_TESTING_MODE:
-        options['logger'] = logger
-
-    ydl = youtube_dl.YoutubeDL(options)
-
-    while True:
-        try:
-            # youtube video url: https://www.youtube.com/watch?v=[video_id]
-            yt = furl(url_template).add(dict(v=v))
-            return ydl.download([yt.url])
-        except youtube_dl.DownloadError as e:
-            if any(map(lambda k: k in str(e), err_keywords)):
-                if raise_exception:
-                    raise e
-                else:
+
+    def __init__(self, failures_file=None, max_attempts=5, backoff=1., max_backoff=60.,
+                 info_file=None, info_ttl=7 * 24 * 60 * 60, **options):
+        if not isinstance(max_attempts, int):
+            raise TypeError('MAX_ATTEMPTS can\'t be of type {}'.format(type(max_attempts).__name__))
+
+        if max_attempts < 1:
+            raise ValueError('MAX_ATTEMPTS must be positive (not {}).'.format(max_attempts))
+
+        if os.environ.get(YDL_EXECUTE_MODE, YDL_NORMAL_MODE) == YDL_TESTING_MODE:
+            options['logger'] = logger
+
+        self.failures_file = failures_file
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.options = options
+        self.failures = self.load_failures()
+        self.info_cache = InfoCache(info_file, info_ttl) if info_file is not None else None
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+
+    def load_failures(self):
+        if self.failures_file is None or not os.path.exists(self.failures_file):
+            return dict()
+
+        with open(self.failures_file, newline='') as infile:
+            return {row['YTID']: row['reason'] for row in csv.DictReader(infile)}
+
+    def add_failure(self, v, reason):
+        with self.__lock:
+            self.failures[v] = reason
+            if self.failures_file is None:
+                return
+
+            os.makedirs(os.path.dirname(self.failures_file) or '.', exist_ok=True)
+            exists = os.path.exists(self.failures_file)
+            with open(self.failures_file, 'a', newline='') as outfile:
+                writer = csv.writer(outfile)
+                if not exists:
+                    writer.writerow(['YTID', 'reason'])
+                writer.writerow([v, reason])
+
+    @property
+    def ydl(self):
+        if not hasattr(self.__local, 'ydl'):
+            self.__local.ydl = youtube_dl.YoutubeDL(dict(self.options))
+        return self.__local.ydl
+
+    def request(self, v, function, raise_exception=False):
+        if v in self.failures:
+            if raise_exception:
+                raise youtube_dl.DownloadError(self.failures[v])
+            return -1
+
+        # youtube video url: https://www.youtube.com/watch?v=[video_id]
+        url = furl(url_template).add(dict(v=v)).url
+
+        for attempt in range(self.max_attempts):
+            try:
+                return function(url)
+            except youtube_dl.DownloadError as e:
+                permanent = any(map(lambda k: k in str(e), err_keywords))
+                if permanent:
+                    self.add_failure(v, str(e))
+
+                if permanent or attempt + 1 == self.max_attempts:
+                    if raise_exception:
+                        raise e
                     return -1
 
+                time.sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+
+    def dl(self, v, raise_exception=False, outtmpl=None):
+        # the formats of an info just extracted are still valid, an expired one is extracted again on retry
+        info, self.__local.info = getattr(self.__local, 'info', None), None
+        info = info if info is not None and info.get('id') == v else None
+
+        def download(url):
+            nonlocal info
+            ydl = self.ydl
+            ydl.params['outtmpl'] = outtmpl or self.options.get('outtmpl', youtube_dl.utils.DEFAULT_OUTTMPL)
+
+            if info is None:
+                return ydl.download([url])
+
+            reused_info, info = info, None
+            ydl.process_ie_result({key: value for key, value in reused_info.items()
+                                   if key not in ('requested_formats', 'requested_subtitles')}, download=True)
+            return 0
+
+        return self.request(v, download, raise_exception)
+
+    def info(self, v, raise_exception=False):
+        info = self.request(v, lambda url: self.ydl.extract_info(url, download=False), raise_exception)
+        if info != -1:
+            self.__local.info = info
+            if self.info_cache is not None:
+                self.info_cache.put(v, info)
+        return info
+
+    def probe(self, v, raise_exception=False):
+        """
+        Info summary of `v` (see `summarize`), extracted only when it's not in the info cache.
+        """
+        if self.info_cache is not None:
+            summary = self.info_cache.get(v)
+            if summary is not None:
+                return summary
+
+        info = self.info(v, raise_exception)
+        return summarize(info) if info != -1 else -1
+
+
+def dl(v, raise_exception=False, **options):
+    """
+    Open
+    `YoutubeDL Options <https://github.com/rg3/youtube-dl/blob/master/youtube_dl/YoutubeDL.py#L118-L320>`_
+    to see all available options
+    """
+    return YoutubeDownloader(**options).dl(v, raise_exception)
+
 
 def info(v, raise_exception=False, **options):
     """
@@ -72,19 +281,4 @@ def info(v, raise_exception=False, **options):
     `YoutubeDL Options <https://github.com/rg3/youtube-dl/blob/master/youtube_dl/YoutubeDL.py#L118-L320>`_
     to see all available options
     """
-    if os.environ.get(YDL_EXECUTE_MODE, YDL_NORMAL_MODE) == YDL_TESTING_MODE:
-        options['logger'] = logger
-
-    ydl = youtube_dl.YoutubeDL(options)
-
-    while True:
-        try:
-            # youtube video url: https://www.youtube.com/watch?v=[video_id]
-            yt = furl(url_template).add(dict(v=v))
-            return ydl.extract_info(yt.url, download=False)
-        except youtube_dl.DownloadError as e:
-            if any(map(lambda k: k in str(e), err_keywords)):
-                if raise_exception:
-                    raise e
-                else:
-                    return -1
+    return YoutubeDownloader(**options).info(v, raise_exception)
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from core import availability
+from core.availability import AvailabilityIndex
+from tests.utils import *
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def root_dir():
+    return 'tests/.temp/availability/raw'
+
+
+@pytest.fixture
+def segment_dir(root_dir):
+    return os.path.join(root_dir, '0qZ3tI4nAZE')
+
+
+def test_scan(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir), temp_dir(os.path.join(root_dir, 'missing_raw')):
+        with temp_copy(test_raw_file, segment_dir):
+            index = AvailabilityIndex(root_dir)
+            assert '0qZ3tI4nAZE' in index
+            assert 'missing_raw' not in index
+            assert len(index) == 1
+
+
+def test_scan_without_root_dir(root_dir):
+    index = AvailabilityIndex(root_dir)
+    assert len(index) == 0
+    assert not os.path.exists(root_dir)
+
+
+def test_raw(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy(test_raw_file, segment_dir):
+            index = AvailabilityIndex(root_dir)
+            assert index.raw('0qZ3tI4nAZE') == os.path.join(segment_dir, '0qZ3tI4nAZE.mp4')
+
+
+def test_raw_with_missing_segment(root_dir):
+    with temp_dir(root_dir):
+        with pytest.raises(FileNotFoundError):
+            AvailabilityIndex(root_dir).raw('0qZ3tI4nAZE')
+
+
+def test_raw_with_multiple_raw_files(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy(test_raw_file, segment_dir):
+            with temp_copy_file(test_raw_file, os.path.join(segment_dir, '0qZ3tI4nAZE.mkv')):
+                index = AvailabilityIndex(root_dir)
+                with pytest.raises(AssertionError):
+                    index.raw('0qZ3tI4nAZE')
+                assert index.get('0qZ3tI4nAZE') is None
+
+
+def test_scan_should_ignore_other_files(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy_file(test_raw_file, os.path.join(segment_dir, 'other.mp4')):
+            assert '0qZ3tI4nAZE' not in AvailabilityIndex(root_dir)
+
+
+def test_scan_should_save_cache(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy(test_raw_file, segment_dir):
+            index = AvailabilityIndex(root_dir)
+            index.scan()
+            with open(index.cache_file) as cache_file:
+                assert json.load(cache_file)['0qZ3tI4nAZE'][1] == ['0qZ3tI4nAZE.mp4']
+
+
+def test_scan_should_ignore_unwritable_cache(test_raw_file, root_dir, segment_dir, monkeypatch):
+    def read_only(filename):
+        raise PermissionError(filename)
+
+    monkeypatch.setattr(availability, 'atomic_output', read_only)
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy(test_raw_file, segment_dir):
+            index = AvailabilityIndex(root_dir)
+            assert '0qZ3tI4nAZE' in index
+            assert not os.path.exists(index.cache_file)
+
+
+def test_scan_without_cache(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy(test_raw_file, segment_dir):
+            index = AvailabilityIndex(root_dir, cache=False)
+            index.scan()
+            assert not os.path.exists(index.cache_file)
+
+
+def test_scan_should_use_unmodified_cache_entries(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy(test_raw_file, segment_dir):
+            index = AvailabilityIndex(root_dir)
+            index.scan()
+            with open(index.cache_file) as cache_file:
+                cache = json.load(cache_file)
+            cache['0qZ3tI4nAZE'][1] = ['0qZ3tI4nAZE.webm']
+            with open(index.cache_file, 'w') as cache_file:
+                json.dump(cache, cache_file)
+            assert index.scan()['0qZ3tI4nAZE'] == ['0qZ3tI4nAZE.webm']
+
+
+def test_scan_should_rescan_modified_segment_dir(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        index = AvailabilityIndex(root_dir)
+        assert '0qZ3tI4nAZE' not in index.scan()
+        with temp_copy(test_raw_file, segment_dir):
+            os.utime(segment_dir, ns=(0, 0))
+            assert '0qZ3tI4nAZE' in index.scan()
+
+
+def test_raw_should_find_trimmed_raw_file(test_raw_file, root_dir, segment_dir):
+    with temp_dir(root_dir), temp_dir(segment_dir):
+        with temp_copy_file(test_raw_file, os.path.join(segment_dir, '0qZ3tI4nAZE.5000ms.mp4')):
+            index = AvailabilityIndex(root_dir, cache=False)
+            assert index.raw('0qZ3tI4nAZE') == os.path.join(segment_dir, '0qZ3tI4nAZE.5000ms.mp4')
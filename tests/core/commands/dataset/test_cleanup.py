@@ -4,7 +4,7 @@ import shutil
 
 import pytest
 
-from core import commands
+from core import commands, ops
 from core.segments import SegmentsWrapper
 from util import youtube as yt
 
@@ -32,6 +32,7 @@ def segments(data_dir):
 def test_cleanup_all(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename)
+        ops.extract_audio(s.raw, s.wav)
         commands.dataset.cleanup(data_dir, segments.filename, audio=True, frames=True, spectrograms=True)
         audio_removed = not os.path.exists(s.wav)
         frames_removed = not os.path.exists(s.frames_dir)
@@ -42,6 +43,7 @@ def test_cleanup_all(data_dir, segments):
 def test_cleanup_audio_only(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename)
+        ops.extract_audio(s.raw, s.wav)
         commands.dataset.cleanup(data_dir, segments.filename, audio=True, frames=False, spectrograms=False)
         audio_removed = not os.path.exists(s.wav)
         frames_removed = not os.path.exists(s.frames_dir)
@@ -52,6 +54,7 @@ def test_cleanup_audio_only(data_dir, segments):
 def test_cleanup_frames_only(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename)
+        ops.extract_audio(s.raw, s.wav)
         commands.dataset.cleanup(data_dir, segments.filename, audio=False, frames=True, spectrograms=False)
         audio_removed = not os.path.exists(s.wav)
         frames_removed = not os.path.exists(s.frames_dir)
@@ -62,6 +65,7 @@ def test_cleanup_frames_only(data_dir, segments):
 def test_cleanup_spectrograms_only(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename)
+        ops.extract_audio(s.raw, s.wav)
         commands.dataset.cleanup(data_dir, segments.filename, audio=False, frames=False, spectrograms=True)
         audio_removed = not os.path.exists(s.wav)
         frames_removed = not os.path.exists(s.frames_dir)
@@ -72,6 +76,7 @@ def test_cleanup_spectrograms_only(data_dir, segments):
 def test_cleanup_no_remove(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename)
+        ops.extract_audio(s.raw, s.wav)
         commands.dataset.cleanup(data_dir, segments.filename, audio=False, frames=False, spectrograms=False)
         audio_removed = not os.path.exists(s.wav)
         frames_removed = not os.path.exists(s.frames_dir)
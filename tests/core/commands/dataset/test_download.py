@@ -1,8 +1,12 @@
 import contextlib
 import os
 import shutil
+import threading
+import time
 
 import pytest
+import youtube_dl
+from furl import furl
 
 from core import commands
 import util.youtube as yt
@@ -37,6 +41,59 @@ def blacklist():
     return 'tests/data/dataset/blacklist.csv'
 
 
+@pytest.fixture
+def youtube_stub(monkeypatch):
+    """
+    Local stand-in for the youtube_dl backend: filesizes (MiB) by ytid, `xxxxxxxxxxx` is unavailable.
+    Every request is recorded, and downloads write an empty raw file (or a copy of `source` once set).
+    """
+    filesizes = {'SmOwn_OEJTo': 3, '--aE2O5G5WE': 12, 'iYWvaxU5OXk': 7, 'vmCvyAgLJWc': 4}
+    calls = {'info': [], 'dl': [], 'urls': [], 'concurrent': 0, 'max_concurrent': 0, 'source': None}
+    lock = threading.Lock()
+
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or dict()
+
+        @staticmethod
+        def video_id(url):
+            v = furl(url).args['v']
+            if v not in filesizes:
+                raise youtube_dl.DownloadError('ERROR: This video is unavailable.')
+            return v
+
+        def extract_info(self, url, download=True):
+            calls['info'].append(furl(url).args['v'])
+            v = self.video_id(url)
+            return {'id': v, 'formats': [{'filesize': filesizes[v] * 1024 * 1024}, {'filesize': None}]}
+
+        def process_ie_result(self, info, download=True):
+            with lock:
+                calls['concurrent'] += 1
+                calls['max_concurrent'] = max(calls['max_concurrent'], calls['concurrent'])
+            time.sleep(.05)
+
+            calls['dl'].append(info['id'])
+            filename = self.params['outtmpl'] % {'ext': 'mp4'}
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            if calls['source'] is None:
+                open(filename, 'w').close()
+            else:
+                shutil.copyfile(calls['source'], filename)
+
+            with lock:
+                calls['concurrent'] -= 1
+            return info
+
+        def download(self, urls):
+            calls['urls'].append(urls[0])
+            self.process_ie_result({'id': self.video_id(urls[0])})
+            return 0
+
+    monkeypatch.setattr(youtube_dl, 'YoutubeDL', YoutubeDL)
+    return calls
+
+
 def test_download(data_dir, segments, ontology):
     with temp_dir(data_dir):
         commands.dataset.download(('animal',), data_dir, segments, ontology, seed=1)
@@ -77,3 +134,147 @@ def test_download_with_blacklist(data_dir, segments, ontology, blacklist):
         commands.dataset.download(('animal',), data_dir, segments, ontology, blacklist=blacklist, seed=1)
         success = len(os.listdir(os.path.join(data_dir, 'raw'))) == 2
     assert success
+
+
+def raw_ytids(data_dir):
+    raw_dir = os.path.join(data_dir, 'raw')
+    return sorted(filter(lambda x: os.path.isdir(os.path.join(raw_dir, x)), os.listdir(raw_dir)))
+
+
+def test_download_with_stub(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk']
+
+
+def test_download_with_stub_and_unavailable_segment(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('human-sounds',), data_dir, segments, ontology, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['vmCvyAgLJWc']
+    assert 'xxxxxxxxxxx' not in youtube_stub['dl']
+
+
+def test_download_with_stub_should_skip_failed_segments(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('human-sounds',), data_dir, segments, ontology, seed=1)
+        with open(os.path.join(data_dir, yt.failures_filename)) as failures:
+            assert 'xxxxxxxxxxx' in failures.read()
+
+        shutil.rmtree(os.path.join(data_dir, 'raw'))
+        youtube_stub['info'].clear()
+        commands.dataset.download(('human-sounds',), data_dir, segments, ontology, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['vmCvyAgLJWc']
+    assert 'xxxxxxxxxxx' not in youtube_stub['info']
+
+
+def test_download_with_stub_and_limit(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal', 'human-sounds'), data_dir, segments, ontology, limit=1, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert len(ytids) == 2
+    assert 'vmCvyAgLJWc' in ytids
+
+
+def test_download_with_stub_and_sizes(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, min_size=5, max_size=10, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['iYWvaxU5OXk']
+
+
+def test_download_with_stub_should_reuse_info(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, seed=1, workers=2)
+    assert sorted(youtube_stub['info']) == ['--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk']
+    assert sorted(youtube_stub['dl']) == ['--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk']
+    assert not youtube_stub['urls']
+
+
+def test_download_with_stub_should_cache_info(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, max_size=5, seed=1)
+        commands.dataset.download(('animal',), data_dir, segments, ontology, min_size=5, max_size=10, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['SmOwn_OEJTo', 'iYWvaxU5OXk']
+    assert sorted(youtube_stub['info']) == ['--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk']
+    assert youtube_stub['urls'] == ['https://youtube.com/watch?v=iYWvaxU5OXk']
+
+
+def test_download_with_stub_and_expired_info(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, max_size=5, seed=1)
+        commands.dataset.download(('animal',), data_dir, segments, ontology, max_size=5, seed=1, info_ttl=0)
+    assert sorted(youtube_stub['info']) == ['--aE2O5G5WE', '--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk', 'iYWvaxU5OXk']
+
+
+def test_download_with_stub_and_blacklist(data_dir, segments, ontology, blacklist, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, blacklist=blacklist, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['--aE2O5G5WE', 'SmOwn_OEJTo']
+    assert 'iYWvaxU5OXk' not in youtube_stub['info']
+
+
+def test_download_with_stub_should_skip_available_segments(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        os.makedirs(os.path.join(data_dir, 'raw', 'SmOwn_OEJTo'))
+        open(os.path.join(data_dir, 'raw', 'SmOwn_OEJTo', 'SmOwn_OEJTo.mp4'), 'w').close()
+        commands.dataset.download(('animal',), data_dir, segments, ontology, limit=2, seed=1)
+        ytids = raw_ytids(data_dir)
+    assert len(ytids) == 2
+    assert 'SmOwn_OEJTo' not in youtube_stub['info']
+
+
+def test_download_with_stub_and_workers(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal', 'human-sounds'), data_dir, segments, ontology, seed=1, workers=4)
+        ytids = raw_ytids(data_dir)
+    assert ytids == ['--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk', 'vmCvyAgLJWc']
+    assert youtube_stub['max_concurrent'] > 1
+
+
+def test_download_with_stub_workers_and_limit(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, limit=2, seed=1, workers=4)
+        ytids = raw_ytids(data_dir)
+    assert len(ytids) == 2
+    assert len(youtube_stub['dl']) == 2
+
+
+def test_download_with_stub_and_trim(data_dir, segments, ontology, youtube_stub, capsys):
+    youtube_stub['source'] = 'tests/data/segments/0qZ3tI4nAZE.mp4'
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, seed=1, trim=1.)
+        raws = {ytid: os.listdir(os.path.join(data_dir, 'raw', ytid)) for ytid in raw_ytids(data_dir)}
+    out = capsys.readouterr().out
+    assert '[SmOwn_OEJTo] cannot be trimmed' in out
+    assert '[iYWvaxU5OXk] cannot be trimmed' in out
+    # the fixture video is 16 seconds long, the segments from 30 to 40 seconds are kept whole
+    assert raws == {'--aE2O5G5WE': ['--aE2O5G5WE.0ms.mp4'],
+                    'SmOwn_OEJTo': ['SmOwn_OEJTo.mp4'],
+                    'iYWvaxU5OXk': ['iYWvaxU5OXk.mp4']}
+
+
+def test_download_with_stub_should_keep_raw_that_cannot_be_trimmed(data_dir, segments, ontology, youtube_stub):
+    with temp_dir(data_dir):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, seed=1, trim=1.)
+        raws = {ytid: os.listdir(os.path.join(data_dir, 'raw', ytid)) for ytid in raw_ytids(data_dir)}
+    assert raws == {ytid: [ytid + '.mp4'] for ytid in ('--aE2O5G5WE', 'SmOwn_OEJTo', 'iYWvaxU5OXk')}
+
+
+def test_download_with_negative_trim(data_dir, segments, ontology):
+    with pytest.raises(ValueError):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, trim=-1.)
+
+
+def test_download_with_invalid_workers_type(data_dir, segments, ontology):
+    with pytest.raises(TypeError):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, workers='1')
+
+
+def test_download_with_negative_workers(data_dir, segments, ontology):
+    with pytest.raises(ValueError):
+        commands.dataset.download(('animal',), data_dir, segments, ontology, workers=-1)
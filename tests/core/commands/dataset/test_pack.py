@@ -0,0 +1,64 @@
+import contextlib
+import os
+import shutil
+
+import pytest
+
+from core import commands
+from core.packs import SegmentsPack
+
+
+@contextlib.contextmanager
+def local_data_dir(data_dir, raw_file):
+    ytid = os.path.splitext(os.path.basename(raw_file))[0]
+    segments_file = os.path.join(data_dir, 'segments.csv')
+    os.makedirs(os.path.join(data_dir, 'raw', ytid))
+    shutil.copy(raw_file, os.path.join(data_dir, 'raw', ytid))
+    with open(segments_file, 'w') as f:
+        f.write('{}, 6.000, 16.000, "/m/09x0r"\n'.format(ytid))
+        f.write('missing_ytid, 0.000, 10.000, "/m/09x0r"')
+    yield segments_file
+    shutil.rmtree(data_dir)
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def data_dir():
+    return 'tests/.temp/pack/data'
+
+
+@pytest.fixture
+def ontology():
+    return 'tests/data/ontology/ontology.json'
+
+
+def test_pack(data_dir, test_raw_file, ontology):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        output_dir = os.path.join(data_dir, 'packs', 'speech')
+        commands.dataset.pack(data_dir, segments, ontology, ('speech',), output_dir)
+        pack = SegmentsPack(output_dir)
+        assert len(pack) == 1
+        assert '0qZ3tI4nAZE' in pack
+
+
+def test_pack_should_filter_by_labels(data_dir, test_raw_file, ontology):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        output_dir = os.path.join(data_dir, 'packs', 'animal')
+        commands.dataset.pack(data_dir, segments, ontology, ('animal',), output_dir)
+        assert len(SegmentsPack(output_dir)) == 0
+
+
+def test_pack_with_invalid_type_of_shard_size(data_dir, test_raw_file, ontology):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        with pytest.raises(TypeError):
+            commands.dataset.pack(data_dir, segments, ontology, ('speech',), data_dir, shard_size='1')
+
+
+def test_pack_with_invalid_value_of_shard_size(data_dir, test_raw_file, ontology):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        with pytest.raises(ValueError):
+            commands.dataset.pack(data_dir, segments, ontology, ('speech',), data_dir, shard_size=0)
@@ -1,12 +1,16 @@
 import contextlib
+import multiprocessing
 import os
 import shutil
+import sys
 
+import numpy as np
 import pytest
 
-from core import commands
+from core import commands, ops
+from core.manifest import PreprocessManifest
 from core.ontology import Ontology
-from core.segments import SegmentsWrapper
+from core.segments import Segment, SegmentsWrapper
 from util import youtube as yt
 
 
@@ -18,6 +22,28 @@ def temp_data_dir(segments):
     shutil.rmtree(os.path.dirname(s.root_dir))
 
 
+@contextlib.contextmanager
+def local_data_dir(data_dir, raw_file):
+    ytid = os.path.splitext(os.path.basename(raw_file))[0]
+    segments_file = os.path.join(data_dir, 'segments.csv')
+    os.makedirs(os.path.join(data_dir, 'raw', ytid))
+    shutil.copy(raw_file, os.path.join(data_dir, 'raw', ytid))
+    with open(segments_file, 'w') as f:
+        f.write('{}, 6.000, 16.000, "/m/09x0r"'.format(ytid))
+    yield SegmentsWrapper(segments_file, os.path.join(data_dir, 'raw'))
+    shutil.rmtree(data_dir)
+
+
+def preprocess_task_modules(task):
+    _, ok = commands.dataset.preprocess_task(task)
+    return ok, 'tensorflow' in sys.modules
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
 @pytest.fixture
 def data_dir():
     return 'tests/.temp/preprocess/data'
@@ -41,19 +67,19 @@ def blacklist():
 def test_preprocess(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename)
-        assert os.path.exists(s.frame(s.start_frames))
-        assert os.path.exists(s.frame(s.end_frames - 1))
-        assert os.path.exists(s.spectrogram(s.start_frames))
-        assert os.path.exists(s.spectrogram(s.end_frames - 1))
+        assert os.path.exists(s.frames_file)
+        assert os.path.exists(s.frames_index_file)
+        assert not os.path.exists(s.frame(s.start_frames))
+        assert os.path.exists(s.spectrogram_file)
 
 
 def test_preprocess_with_workers(data_dir, segments):
     with temp_data_dir(segments) as s:
         commands.dataset.preprocess(data_dir, segments.filename, workers=4)
-        assert os.path.exists(s.frame(s.start_frames))
-        assert os.path.exists(s.frame(s.end_frames - 1))
-        assert os.path.exists(s.spectrogram(s.start_frames))
-        assert os.path.exists(s.spectrogram(s.end_frames - 1))
+        assert os.path.exists(s.frames_file)
+        assert os.path.exists(s.frames_index_file)
+        assert not os.path.exists(s.frame(s.start_frames))
+        assert os.path.exists(s.spectrogram_file)
 
 
 def test_preprocess_with_invalid_type_of_workers(data_dir, segments):
@@ -71,7 +97,136 @@ def test_preprocess_with_invalid_value_of_workers(data_dir, segments):
 def test_preprocess_should_process_available_segments_only(data_dir, segments):
     with temp_data_dir(segments):
         commands.dataset.preprocess(data_dir, segments.filename)
-        assert not os.path.exists(segments[1].frame(segments[1].start_frames))
-        assert not os.path.exists(segments[1].frame(segments[1].end_frames - 1))
-        assert not os.path.exists(segments[1].spectrogram(segments[1].start_frames))
-        assert not os.path.exists(segments[1].spectrogram(segments[1].end_frames - 1))
+        assert not os.path.exists(segments[1].frames_file)
+        assert not os.path.exists(segments[1].frames_index_file)
+        assert not os.path.exists(segments[1].spectrogram_file)
+
+
+def test_preprocess_local_segment(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename, workers=2)
+        s = segments[0]
+        assert os.path.exists(s.frames_index_file)
+        assert os.path.exists(s.spectrogram_file)
+
+
+def test_preprocess_should_resume_half_finished_segment(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        s = segments[0]
+        frames_time = os.path.getmtime(s.frames_file)
+        os.remove(s.spectrogram_file)
+        commands.dataset.preprocess(data_dir, segments.filename)
+        assert os.path.exists(s.spectrogram_file)
+        assert os.path.getmtime(s.frames_file) == frames_time
+
+
+def test_preprocess_should_save_manifest(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        manifest = PreprocessManifest(segments.root_dir)
+        assert segments[0].ytid in manifest
+        assert manifest.stale(segments[0]) == []
+
+
+def test_preprocess_should_skip_finished_segments(data_dir, test_raw_file, monkeypatch):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        extracted = list()
+        monkeypatch.setattr(Segment, 'extract', lambda segment, outputs=(): extracted.append(segment.ytid))
+        commands.dataset.preprocess(data_dir, segments.filename)
+        assert extracted == []
+
+
+def test_preprocess_should_report_failed_segment(data_dir, test_raw_file, monkeypatch, capsys):
+    def extract(segment, outputs=()):
+        raise ValueError('broken audio')
+
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        monkeypatch.setattr(Segment, 'extract', extract)
+        commands.dataset.preprocess(data_dir, segments.filename)
+        out = capsys.readouterr().out
+        assert '{}: Failed (broken audio)'.format(segments[0].ytid) in out
+        assert 'cannot be processed: [\'{}\']'.format(segments[0].ytid) in out
+        assert segments[0].ytid not in PreprocessManifest(segments.root_dir)
+
+
+def test_preprocess_should_extract_stale_spectrogram_only(data_dir, test_raw_file, monkeypatch):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        s = segments[0]
+        frames_time = os.stat(s.frames_file).st_mtime_ns
+        spectrogram_time = os.stat(s.spectrogram_file).st_mtime_ns
+
+        monkeypatch.setattr(ops, 'spectrogram_version', ops.spectrogram_version + 1)
+        commands.dataset.preprocess(data_dir, segments.filename)
+        assert os.stat(s.frames_file).st_mtime_ns == frames_time
+        assert os.stat(s.spectrogram_file).st_mtime_ns != spectrogram_time
+        assert PreprocessManifest(segments.root_dir).stale(s) == []
+
+
+def test_preprocess_should_keep_features_side_by_side(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        s = segments[0]
+        frames_time = os.stat(s.frames_file).st_mtime_ns
+        spectrogram_shape = np.load(s.spectrogram_file, mmap_mode='r').shape
+
+        features = ops.default_features._replace(window_length=0.02)
+        commands.dataset.preprocess(data_dir, segments.filename, features=features)
+        other = SegmentsWrapper(segments.filename, segments.root_dir, features)[0]
+        assert other.frames_file == s.frames_file
+        assert os.stat(s.frames_file).st_mtime_ns == frames_time
+        assert other.spectrogram_file != s.spectrogram_file
+        assert np.load(s.spectrogram_file, mmap_mode='r').shape == spectrogram_shape
+        assert np.load(other.spectrogram_file, mmap_mode='r').shape[1] < spectrogram_shape[1]
+
+        manifest = PreprocessManifest(segments.root_dir)
+        assert manifest.stale(s) == []
+        assert manifest.stale(other) == []
+
+
+def test_preprocess_should_extract_segment_with_modified_raw(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        s = segments[0]
+        frames_time = os.stat(s.frames_file).st_mtime_ns
+        os.utime(s.raw, ns=(0, 0))
+        commands.dataset.preprocess(data_dir, segments.filename)
+        assert os.stat(s.frames_file).st_mtime_ns != frames_time
+
+
+def test_preprocess_with_tensorflow_spectrogram_backend(data_dir, test_raw_file, monkeypatch):
+    monkeypatch.setattr(ops, 'spectrogram_backend', ops.spectrogram_backend)
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        s = segments[0]
+        spectrogram = np.load(s.spectrogram_file)
+        os.remove(s.spectrogram_file)
+        commands.dataset.preprocess(data_dir, segments.filename, spectrogram_backend='tensorflow')
+        assert ops.spectrogram_backend == 'tensorflow'
+        assert np.allclose(np.load(s.spectrogram_file), spectrogram, atol=1e-2)
+
+
+def test_preprocess_should_update_attributes_of_trimmed_segment(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        commands.dataset.preprocess(data_dir, segments.filename)
+        s = segments[0]
+        assert s.wavelength == 764587
+        length = len(s)
+        s.trim(margin=1.)
+        commands.dataset.preprocess(data_dir, segments.filename)
+
+        s = SegmentsWrapper(segments.filename, segments.root_dir)[0]
+        assert s.raw_offset == 5.
+        assert s.wavelength == len(ops.decode_audio(s.raw).audio) < 764587
+        assert len(s) == length
+
+
+def test_preprocess_worker_should_not_import_tensorflow(data_dir, test_raw_file):
+    with local_data_dir(data_dir, test_raw_file) as segments:
+        task = (segments[0], PreprocessManifest.outputs)
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            ok, tensorflow_imported = pool.apply(preprocess_task_modules, (task,))
+        assert ok
+        assert not tensorflow_imported
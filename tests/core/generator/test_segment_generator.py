@@ -275,6 +275,52 @@ def test_zip_samples_with_augmentor(test_raw_file, segments, model, augmentor):
             assert len(samples) == generator.sample_size
 
 
+def test_load_item_should_load_one_frame_and_two_spectrograms(test_raw_file, segments, model, monkeypatch):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model, 16)
+            segment = generator.segments[0]
+            segment.extract()
+
+            loads = {'frames': 0, 'spectrograms': 0}
+
+            def count(key, load):
+                def wrapper(self, index):
+                    loads[key] += 1
+                    return load(self, index)
+                return wrapper
+
+            monkeypatch.setattr(Segment, 'load_frame', count('frames', Segment.load_frame))
+            monkeypatch.setattr(Segment, 'load_spectrogram', count('spectrograms', Segment.load_spectrogram))
+
+            (positive, positive_label), (negative, negative_label) = generator.load_item(segment)
+            assert loads == {'frames': 1, 'spectrograms': 2}
+            assert positive[0] is negative[0]
+            assert positive_label == 1 and negative_label == 0
+
+
+def test_sample_indices(test_raw_file, segments, model, augmentor):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model, 16, augmentor)
+            frames, spectrograms, labels = generator.sample_indices(3)
+            assert len(frames) == len(spectrograms) == len(labels) == 3 * generator.augmentation_factor
+            assert list(labels) == [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2]
+            assert list(frames) == list(range(12))
+            assert list(spectrograms) == [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2]
+
+
+def test_getitem_should_return_float32_arrays(test_raw_file, segments, model, augmentor):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model, 16, augmentor, augmentor)
+            (frames, spectrograms), (labels,) = generator[0]
+            assert frames.shape == (generator.sample_size, *model.vision_input_shape)
+            assert spectrograms.shape == (generator.sample_size, *model.audio_input_shape)
+            assert labels.shape == (generator.sample_size, *model.output_shape)
+            assert frames.dtype == spectrograms.dtype == labels.dtype == np.float32
+
+
 def test_getitem(test_raw_file, segments, model, augmentor):
     with temp_dir(segments[0].dir):
         with temp_copy(test_raw_file, segments[0].dir):
@@ -334,3 +380,37 @@ def test_frames_should_be_normalized(test_raw_file, segments, model):
             batch = generator[0]
             frames = batch[0][0]
             assert np.max(frames) <= 1.
+
+
+def test_negative_segments_default(test_raw_file, segments, model):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model)
+            assert generator.negative_segments == generator.segments
+
+
+def test_negative_segments(test_raw_file, segments, model):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model, negative_segments=segments[:10])
+            assert len(generator.negative_segments) == 10
+
+
+def test_to_dataset_output_shape(test_raw_file, segments, model, augmentor):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model, 4, augmentor, augmentor)
+            (frames, spectrograms), labels = next(iter(generator.to_dataset(seed=1)))
+            assert frames.shape == (generator.sample_size, *model.vision_input_shape)
+            assert spectrograms.shape == (generator.sample_size, *model.audio_input_shape)
+            assert labels.shape == (generator.sample_size, *model.output_shape)
+
+
+def test_to_dataset_should_be_deterministic_with_seed(test_raw_file, segments, model):
+    with temp_dir(segments[0].dir):
+        with temp_copy(test_raw_file, segments[0].dir):
+            generator = SegmentsGenerator(segments, model, 4)
+            (frames1, _), labels1 = next(iter(generator.to_dataset(seed=1)))
+            (frames2, _), labels2 = next(iter(generator.to_dataset(seed=1)))
+            assert np.array_equal(frames1, frames2)
+            assert np.array_equal(labels1, labels2)
@@ -0,0 +1,196 @@
+import json
+
+import pytest
+
+from core import ops
+from core.manifest import PreprocessManifest, legacy_manifest_filename, manifest_filename
+from core.segments import Segment
+from tests.utils import *
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def root_dir():
+    return 'tests/.temp/manifest/raw'
+
+
+@pytest.fixture
+def segment(root_dir):
+    return Segment(root_dir=root_dir,
+                   ytid='0qZ3tI4nAZE',
+                   start_seconds=6.000,
+                   end_seconds=16.000,
+                   positive_labels=['/m/07qrkrw', '/m/09x0r'])
+
+
+def touch_outputs(segment):
+    for filename in (segment.frames_index_file, segment.spectrogram_file, segment.spectrogram_offset_file):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        open(filename, 'w').close()
+
+
+def test_stale_without_outputs(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            assert PreprocessManifest(root_dir).stale(segment) == ['frames', 'spectrogram']
+
+
+def test_stale_with_missing_output(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            os.remove(segment.frames_index_file)
+            assert manifest.stale(segment) == ['frames']
+
+
+def test_stale_should_assume_outputs_without_entry_are_up_to_date(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            assert PreprocessManifest(root_dir).stale(segment) == []
+
+
+def test_stale_after_add(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            assert segment.ytid in manifest
+            assert manifest.stale(segment) == []
+
+
+def test_stale_with_modified_raw(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir) as raw:
+            touch_outputs(segment)
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            os.utime(raw, ns=(0, 0))
+            assert manifest.stale(segment) == ['frames', 'spectrogram']
+
+
+def test_stale_with_other_spectrogram_version(test_raw_file, root_dir, segment, monkeypatch):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            monkeypatch.setattr(ops, 'spectrogram_version', ops.spectrogram_version + 1)
+            assert manifest.stale(segment) == ['spectrogram']
+
+
+def test_stale_with_other_features(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            segment.features = ops.default_features._replace(window_length=0.02)
+            assert manifest.stale(segment) == ['spectrogram']
+            touch_outputs(segment)
+            assert manifest.stale(segment) == ['spectrogram']
+            manifest.add(segment.ytid, manifest.entry(segment))
+            assert manifest.stale(segment) == []
+            segment.features = ops.default_features
+            assert manifest.stale(segment) == []
+
+
+def test_entry_should_keep_other_features(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            features = ops.default_features._replace(window_length=0.02)
+            segment.features = features
+            entry = manifest.entry(segment)
+            assert entry['frames'] == {'default': ops.frames_signature()}
+            assert entry['spectrogram'] == {'default': ops.spectrogram_signature(),
+                                            features.spectrogram_key: ops.spectrogram_signature(features)}
+
+
+def test_stale_with_entry_without_features(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            with open(os.path.join(root_dir, legacy_manifest_filename), 'w') as manifest_file:
+                json.dump({segment.ytid: {'raw': PreprocessManifest.source(segment),
+                                          'frames': ops.frames_signature(),
+                                          'spectrogram': ops.spectrogram_signature()}}, manifest_file)
+            assert PreprocessManifest(root_dir).stale(segment) == []
+
+
+def test_stale_with_other_frames_version(test_raw_file, root_dir, segment, monkeypatch):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            touch_outputs(segment)
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            monkeypatch.setattr(ops, 'frames_version', ops.frames_version + 1)
+            assert manifest.stale(segment) == ['frames']
+
+
+def test_flush(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            manifest = PreprocessManifest(root_dir)
+            manifest.add(segment.ytid, manifest.entry(segment))
+            assert not os.path.exists(os.path.join(root_dir, manifest_filename))
+            manifest.flush()
+            with open(os.path.join(root_dir, manifest_filename)) as manifest_file:
+                assert [json.loads(line) for line in manifest_file] == [{'id': segment.ytid,
+                                                                         'entry': manifest.entry(segment)}]
+            assert segment.ytid in PreprocessManifest(root_dir)
+
+
+def test_flush_should_append_lines(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            manifest = PreprocessManifest(root_dir, batch_size=1)
+            manifest.add('a', {'raw': None})
+            manifest.add('b', {'raw': None})
+            manifest.add('a', manifest.entry(segment))
+            with open(os.path.join(root_dir, manifest_filename)) as manifest_file:
+                assert len(manifest_file.readlines()) == 3
+            assert PreprocessManifest(root_dir).entries == {'a': manifest.entry(segment), 'b': {'raw': None}}
+
+
+def test_load_should_override_legacy_manifest(root_dir):
+    with temp_dir(root_dir):
+        with open(os.path.join(root_dir, legacy_manifest_filename), 'w') as manifest_file:
+            json.dump({'a': {'raw': 'legacy'}, 'b': {'raw': 'legacy'}}, manifest_file)
+        with open(os.path.join(root_dir, manifest_filename), 'w') as manifest_file:
+            manifest_file.write(json.dumps({'id': 'a', 'entry': {'raw': 'new'}}) + '\n')
+        assert PreprocessManifest(root_dir).entries == {'a': {'raw': 'new'}, 'b': {'raw': 'legacy'}}
+
+
+def test_add_should_flush_batches(test_raw_file, root_dir, segment):
+    with temp_dir(root_dir), temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            manifest = PreprocessManifest(root_dir, batch_size=2)
+            manifest.add('a', manifest.entry(segment))
+            assert len(PreprocessManifest(root_dir)) == 0
+            manifest.add('b', manifest.entry(segment))
+            assert len(PreprocessManifest(root_dir)) == 2
+
+
+def test_flush_without_root_dir(root_dir):
+    manifest = PreprocessManifest(root_dir)
+    manifest.add('a', {})
+    manifest.flush()
+    assert not os.path.exists(root_dir)
+
+
+def test_load_invalid_manifest(root_dir):
+    with temp_dir(root_dir):
+        with open(os.path.join(root_dir, legacy_manifest_filename), 'w') as manifest_file:
+            manifest_file.write('{')
+        with open(os.path.join(root_dir, manifest_filename), 'w') as manifest_file:
+            manifest_file.write(json.dumps({'id': 'a', 'entry': {}}) + '\n{"id": "b", "en')
+        assert len(PreprocessManifest(root_dir)) == 1
@@ -0,0 +1,125 @@
+import gc
+import pickle
+
+import pytest
+
+from core import metadata
+from core.metadata import MetadataStore
+from tests.utils import *
+
+
+@pytest.fixture
+def root_dir():
+    return 'tests/.temp/metadata'
+
+
+@pytest.fixture
+def filename(root_dir):
+    return os.path.join(root_dir, 'metadata.sqlite')
+
+
+def test_attributes_without_database(filename):
+    store = MetadataStore(filename)
+    assert store.attributes('0qZ3tI4nAZE') == dict()
+    assert not os.path.exists(filename)
+
+
+def test_save(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'duration', 15.929)
+        store.flush()
+        assert MetadataStore(filename).attributes('0qZ3tI4nAZE') == {'duration': 15.929}
+
+
+def test_save_should_be_batched(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename, batch_size=3)
+        store.save('a', 'duration', 1)
+        store.save('b', 'duration', 2)
+        assert not os.path.exists(filename)
+        store.save('c', 'duration', 3)
+        assert MetadataStore(filename).attributes('c') == {'duration': 3}
+
+
+def test_save_should_not_overwrite(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'wavelength', 764587)
+        store.flush()
+        store.save('0qZ3tI4nAZE', 'wavelength', 0)
+        store.flush()
+        assert MetadataStore(filename).attributes('0qZ3tI4nAZE') == {'wavelength': 764587}
+
+
+def test_save_with_overwrite(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'wavelength', 764587)
+        store.flush()
+        store.save('0qZ3tI4nAZE', 'wavelength', 524587, overwrite=True)
+        assert store.attributes('0qZ3tI4nAZE') == {'wavelength': 524587}
+        store.flush()
+        assert MetadataStore(filename).attributes('0qZ3tI4nAZE') == {'wavelength': 524587}
+
+
+def test_pending_save_with_overwrite(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'wavelength', 764587)
+        store.save('0qZ3tI4nAZE', 'wavelength', 524587, overwrite=True)
+        store.save('0qZ3tI4nAZE', 'wavelength', 0)
+        store.flush()
+        assert MetadataStore(filename).attributes('0qZ3tI4nAZE') == {'wavelength': 524587}
+
+
+def test_attributes_should_include_pending_writes(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'wavelength', 764587)
+        assert store.attributes('0qZ3tI4nAZE') == {'wavelength': 764587}
+
+
+def test_attributes_should_be_loaded_once(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'wavelength', 764587)
+        store.flush()
+        assert store.attributes('missing') == dict()
+        os.remove(filename)
+        assert store.attributes('0qZ3tI4nAZE') == {'wavelength': 764587}
+
+
+def test_pickle_should_flush(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'duration', 15.929)
+        copy = pickle.loads(pickle.dumps(store))
+        assert copy.filename == filename
+        assert copy.attributes('0qZ3tI4nAZE') == {'duration': 15.929}
+
+
+def test_flush_all(root_dir, filename):
+    with temp_dir(root_dir):
+        store = MetadataStore(filename)
+        store.save('0qZ3tI4nAZE', 'duration', 15.929)
+        metadata.flush_all()
+        assert MetadataStore(filename).attributes('0qZ3tI4nAZE') == {'duration': 15.929}
+
+
+def test_stores_should_not_keep_stores_alive(filename):
+    store = MetadataStore(filename)
+    assert store in metadata.stores
+    count = len(metadata.stores)
+    del store
+    gc.collect()
+    assert len(metadata.stores) == count - 1
+
+
+def test_pickle_should_not_register_flush(root_dir, filename):
+    store = MetadataStore(filename)
+    copy = pickle.loads(pickle.dumps(store))
+    assert store in metadata.stores
+    assert copy not in metadata.stores
+    copy.save('0qZ3tI4nAZE', 'duration', 15.929)
+    assert copy.attributes('0qZ3tI4nAZE') == {'duration': 15.929}
@@ -196,3 +196,23 @@ def test_getitem_with_invalid_type_key(test_entry_json):
     entry = Entry(None, **test_entry_json)
     with pytest.raises(KeyError):
         assert entry[1]
+
+
+def test_getitem_with_all_identifiers(test_entry_json, test_child_entry_json):
+    entry = Entry(None, **test_entry_json)
+    child = Entry(None, **test_child_entry_json)
+    entry.link(child)
+    for key in (child.id, child.name, child.slug_name, child.proper_name):
+        assert entry[key] is child
+    assert entry[entry.slug_name] is entry
+
+
+def test_getitem_after_link_below_child(test_entry_json, test_child_entry_json):
+    entry = Entry(None, **test_entry_json)
+    child = Entry(None, **test_child_entry_json)
+    grandchild = Entry(None, '/m/09x0r', 'Speech')
+    entry.link(child)
+    assert 'speech' not in entry
+    child.link(grandchild)
+    assert 'speech' in entry
+    assert entry['speech'] is grandchild
@@ -1,6 +1,12 @@
+import os
+import shutil
+
 import pytest
 
+from core import ontology as ontology_module
 from core.ontology import Ontology
+from core.segments import SegmentsTable
+from tests.utils import *
 
 
 @pytest.fixture
@@ -69,3 +75,114 @@ def test_retrieve_should_flatten_entry_in_same_hierarchy(test_ontology_file):
     ontology = Ontology(test_ontology_file, None)
     retrieve = ontology.retrieve('human-sounds', 'human-voice')
     assert len(retrieve.children) == 1
+
+
+def test_ancestors(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    assert ontology.ancestors('speech') == {'/m/09x0r', '/m/09l8g', '/m/0dgw9r'}
+    assert ontology.ancestors('/m/0dgw9r') == {'/m/0dgw9r'}
+
+
+def test_ancestors_with_invalid_key(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    with pytest.raises(KeyError):
+        ontology.ancestors('invalid-label')
+
+
+def test_descendants(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    descendants = ontology.descendants('human-sounds')
+    assert descendants == set(ontology.retrieve('human-sounds').items())
+    assert ontology.descendants('human-sounds', 'human-voice') == descendants
+    assert ontology.descendants() == set(ontology.ids)
+
+
+def test_descendants_mask(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    assert set(ontology.ids[ontology.descendants_mask('human-sounds')]) == ontology.descendants('human-sounds')
+    assert ontology.descendants_mask().all()
+
+
+def test_matches(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    table = SegmentsTable.from_csv('tests/data/segments/test.csv')
+    assert ontology.matches(table, 'animal').tolist() == [True, True, True, False, False]
+    assert ontology.matches(table, 'goat').tolist() == [False, True, False, False, False]
+    assert ontology.matches(table, 'human-sounds', 'music').tolist() == [False, True, False, True, True]
+    assert not ontology.matches(table, 'human-voice').any()
+    assert ontology.matches(table).all()
+
+
+def test_matches_should_ignore_labels_missing_from_ontology(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    table = SegmentsTable.from_csv('tests/data/segments/test.csv', labels=['/m/unknown'])
+    assert ontology.matches(table, 'animal').tolist() == [True, True, True, False, False]
+
+
+def test_getitem(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    entry = ontology['/m/09l8g']
+    assert entry.name == 'Human voice'
+    assert ontology['Human voice'] is entry
+    assert ontology['human-voice'] is entry
+    assert entry.parents[0] is ontology['human-sounds']
+
+
+def test_getitem_with_invalid_key(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    with pytest.raises(KeyError):
+        assert ontology['invalid-label']
+
+
+def test_contains(test_ontology_file):
+    ontology = Ontology(test_ontology_file, None)
+    assert 'human-voice' in ontology
+    assert 'invalid-label' not in ontology
+    assert 0 not in ontology
+
+
+def test_cache(test_root_dir, test_ontology_file, monkeypatch):
+    with temp_dir(test_root_dir):
+        filename = shutil.copyfile(test_ontology_file, os.path.join(test_root_dir, 'ontology.json'))
+        retrieve = Ontology(filename, None).retrieve('human-sounds')
+        assert os.path.exists(os.path.join(test_root_dir, 'ontology.cache.npz'))
+
+        def compile_ontology(_):
+            raise AssertionError('ontology should be loaded from cache')
+
+        monkeypatch.setattr(ontology_module, 'compile_ontology', compile_ontology)
+        ontology = Ontology(filename, None)
+        assert set(ontology.retrieve('human-sounds').items()) == set(retrieve.items())
+        assert ontology.ancestors('speech') == {'/m/09x0r', '/m/09l8g', '/m/0dgw9r'}
+
+
+def test_cache_should_be_invalidated_when_file_changes(test_root_dir, test_ontology_file):
+    with temp_dir(test_root_dir):
+        filename = shutil.copyfile(test_ontology_file, os.path.join(test_root_dir, 'ontology.json'))
+        assert len(Ontology(filename, None).ids) == 632
+
+        with open(filename, 'w') as outfile:
+            outfile.write('[{"id": "/m/0", "name": "Root", "child_ids": ["/m/1"]}, '
+                          '{"id": "/m/1", "name": "Child"}]')
+        os.utime(filename, ns=(0, 0))
+
+        ontology = Ontology(filename, None)
+        assert ontology.ids.tolist() == ['/m/0', '/m/1']
+        assert ontology['child'].parents[0] is ontology['root']
+
+
+def test_cache_with_other_version(test_root_dir, test_ontology_file, monkeypatch):
+    with temp_dir(test_root_dir):
+        filename = shutil.copyfile(test_ontology_file, os.path.join(test_root_dir, 'ontology.json'))
+        Ontology(filename, None).graph
+        monkeypatch.setattr(ontology_module, 'ontology_cache_version', ontology_module.ontology_cache_version + 1)
+        ontology = Ontology(filename, None)
+        assert ontology.load_cache(ontology.source()) is None
+        assert ontology.graph['version'] == ontology_module.ontology_cache_version
+
+
+def test_without_cache(test_root_dir, test_ontology_file):
+    with temp_dir(test_root_dir):
+        filename = shutil.copyfile(test_ontology_file, os.path.join(test_root_dir, 'ontology.json'))
+        assert len(Ontology(filename, None, cache=False).ids) == 632
+        assert not os.path.exists(os.path.join(test_root_dir, 'ontology.cache.npz'))
@@ -147,3 +147,13 @@ def test_root_entry_should_be_unable_to_be_linked(test_root_entry_json, test_ent
     entry = Entry(None, **test_entry_json)
     with pytest.raises(NotImplementedError):
         root_entry.link(entry)
+
+
+def test_getitem_should_not_retrieve_root(test_root_entry_json, test_entry_json):
+    root_entry = RootEntry(**test_root_entry_json)
+    entry = Entry(None, **test_entry_json)
+    root_entry.wrap(entry)
+    assert root_entry[entry.id] is entry
+    assert root_entry.id not in root_entry
+    with pytest.raises(KeyError):
+        assert root_entry[root_entry.name]
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from core import ops
+from util import tensorplow as tp
+
+
+@pytest.fixture
+def test_wav_file():
+    return 'tests/data/ops/test.wav'
+
+
+@pytest.fixture
+def output():
+    return 'tests/.temp/ops/spectrogram.npy'
+
+
+def test_compute_full_spectrogram(test_wav_file, output):
+    wav = tp.load_wav(test_wav_file)
+    ops.compute_full_spectrogram(wav.audio, output)
+    assert os.path.exists(output)
+    os.remove(output)
+    os.remove(ops.spectrogram_offset_file(output))
+    os.removedirs(os.path.dirname(output))
+
+
+def test_full_spectrogram_should_cover_whole_waveform(test_wav_file, output):
+    wav = tp.load_wav(test_wav_file)
+    ops.compute_full_spectrogram(wav.audio, output)
+    spc = np.load(output)
+    columns = ops.spectrogram_columns(0, len(wav.audio))
+    assert spc.shape == (257, columns.stop)
+    os.remove(output)
+    os.remove(ops.spectrogram_offset_file(output))
+    os.removedirs(os.path.dirname(output))
+
+
+def test_compute_full_spectrogram_with_dtype(test_wav_file, output):
+    wav = tp.load_wav(test_wav_file)
+    ops.compute_full_spectrogram(wav.audio, output, dtype=np.float16)
+    assert np.load(output).dtype == np.float16
+    os.remove(output)
+    os.remove(ops.spectrogram_offset_file(output))
+    os.removedirs(os.path.dirname(output))
+
+
+def test_should_skip_already_computed_full_spectrogram(test_wav_file, output):
+    wav = tp.load_wav(test_wav_file)
+    ops.compute_full_spectrogram(wav.audio, output)
+    created_time = os.path.getmtime(output)
+    ops.compute_full_spectrogram(wav.audio, output)
+    assert os.path.getmtime(output) == created_time
+    os.remove(output)
+    os.remove(ops.spectrogram_offset_file(output))
+    os.removedirs(os.path.dirname(output))
+
+
+def test_compute_full_spectrogram_of_window(test_wav_file, output):
+    wav = tp.load_wav(test_wav_file)
+    ops.compute_full_spectrogram(wav.audio, output, start_sample=4900, end_sample=36000)
+    assert ops.load_spectrogram_offset(output) == 4900 // 240
+    columns = ops.spectrogram_columns(4800, 36000 - 4800)
+    assert np.load(output).shape == (257, columns.stop - columns.start)
+    os.remove(output)
+    os.remove(ops.spectrogram_offset_file(output))
+    os.removedirs(os.path.dirname(output))
+
+
+def test_spectrogram_offset_of_whole_waveform_should_be_zero(output):
+    assert ops.load_spectrogram_offset(output) == 0
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pytest
+
+from core import ops
+from util import tensorplow as tp
+
+
+@pytest.fixture
+def test_video_file():
+    return 'tests/data/ops/test.mkv'
+
+
+@pytest.fixture
+def non_existing_test_video_file():
+    return 'tests/data/ops/missing.mkv'
+
+
+@pytest.fixture
+def output():
+    return 'tests/.temp/ops/audio.wav'
+
+
+def test_decode_audio(test_video_file):
+    waveform = ops.decode_audio(test_video_file)
+    assert waveform.sample_rate == 48000
+    assert waveform.audio.shape[1] == 1
+    assert waveform.audio.dtype == np.float32
+
+
+def test_decode_audio_should_match_extracted_wav(test_video_file, output):
+    ops.extract_audio(test_video_file, output)
+    wav = tp.load_wav(output)
+    waveform = ops.decode_audio(test_video_file)
+    assert np.array_equal(waveform.audio, wav.audio.numpy())
+    os.remove(output)
+    os.removedirs(os.path.dirname(output))
+
+
+def test_decode_audio_with_non_existing_video(non_existing_test_video_file):
+    with pytest.raises(FileNotFoundError):
+        ops.decode_audio(non_existing_test_video_file)
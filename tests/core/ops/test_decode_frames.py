@@ -0,0 +1,46 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from core import ops
+
+
+@pytest.fixture
+def test_video_file():
+    return 'tests/data/ops/test.mkv'
+
+
+@pytest.fixture
+def non_existing_test_video_file():
+    return 'tests/data/ops/missing.mkv'
+
+
+@pytest.fixture
+def output_dir():
+    return 'tests/.temp/ops/frames'
+
+
+def test_decode_frames(test_video_file):
+    frames = ops.decode_frames(test_video_file)
+    assert frames.shape == (184, 256, 455, 3)
+    assert frames.dtype == np.uint8
+
+
+def test_decode_frames_should_match_extract_frames_count(test_video_file, output_dir):
+    ops.extract_frames(test_video_file, output_dir, start_time=3)
+    frames = ops.decode_frames(test_video_file, start_time=3)
+    assert len(frames) == len(os.listdir(output_dir))
+    shutil.rmtree(os.path.dirname(output_dir))
+
+
+def test_decode_frames_with_non_existing_video(non_existing_test_video_file):
+    with pytest.raises(FileNotFoundError):
+        ops.decode_frames(non_existing_test_video_file)
+
+
+def test_decode_frames_with_other_features(test_video_file):
+    features = ops.default_features._replace(frame_rate=10, frame_size=128)
+    frames = ops.decode_frames(test_video_file, features=features)
+    assert frames.shape == (75, 128, 228, 3)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from core import ops
+
+
+@pytest.fixture
+def test_video_file():
+    return 'tests/data/ops/test.mkv'
+
+
+@pytest.fixture
+def non_existing_test_video_file():
+    return 'tests/data/ops/missing.mkv'
+
+
+def test_decode_segment(test_video_file):
+    frames, waveform, duration = ops.decode_segment(test_video_file)
+    assert frames.shape == (184, 256, 455, 3)
+    assert waveform.sample_rate == 48000
+    assert duration == pytest.approx(7.42, abs=0.01)
+
+
+def test_decode_segment_should_match_separate_decoding(test_video_file):
+    frames, waveform, _ = ops.decode_segment(test_video_file, start_time=3)
+    assert np.array_equal(frames, ops.decode_frames(test_video_file, start_time=3))
+    assert np.array_equal(waveform.audio, ops.decode_audio(test_video_file).audio)
+
+
+def test_decode_segment_with_non_existing_video(non_existing_test_video_file):
+    with pytest.raises(FileNotFoundError):
+        ops.decode_segment(non_existing_test_video_file)
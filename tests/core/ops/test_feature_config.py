@@ -0,0 +1,34 @@
+from core import ops
+
+
+def test_default_features_should_have_no_keys():
+    assert ops.default_features.frames_key is None
+    assert ops.default_features.spectrogram_key is None
+
+
+def test_frames_key_should_only_depend_on_frames_params():
+    features = ops.default_features._replace(frame_rate=30)
+    assert features.frames_key is not None
+    assert features.spectrogram_key is None
+
+
+def test_spectrogram_key_should_only_depend_on_spectrogram_params():
+    features = ops.default_features._replace(window_length=0.02)
+    assert features.frames_key is None
+    assert features.spectrogram_key is not None
+
+
+def test_keys_should_be_stable():
+    features = ops.default_features._replace(sample_rate=16000)
+    assert features.spectrogram_key == ops.default_features._replace(sample_rate=16000).spectrogram_key
+    assert features.spectrogram_key != ops.default_features._replace(sample_rate=22050).spectrogram_key
+
+
+def test_window_size_and_stride():
+    assert ops.default_features.window_size == 480
+    assert ops.default_features.stride == 240
+
+
+def test_keyed_filename():
+    assert ops.keyed_filename('frames.npy', None) == 'frames.npy'
+    assert ops.keyed_filename('frames.npy', 'abc') == 'frames.abc.npy'
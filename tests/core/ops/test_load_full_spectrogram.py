@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+import pytest
+
+from core import ops
+
+
+@pytest.fixture
+def spectrogram():
+    return 'tests/.temp/ops/spectrogram.npy'
+
+
+@pytest.fixture
+def non_existing_spectrogram():
+    return 'tests/data/ops/missing.npy'
+
+
+def test_load_full_spectrogram(spectrogram):
+    os.makedirs(os.path.dirname(spectrogram), exist_ok=True)
+    np.save(spectrogram, np.ones((257, 1000), dtype=np.float32))
+    spc = ops.load_full_spectrogram(spectrogram)
+    assert isinstance(spc, np.memmap)
+    assert spc.shape == (257, 1000)
+    del spc
+    os.remove(spectrogram)
+    os.removedirs(os.path.dirname(spectrogram))
+
+
+def test_load_non_existing_full_spectrogram(non_existing_spectrogram):
+    with pytest.raises(FileNotFoundError):
+        ops.load_full_spectrogram(non_existing_spectrogram)
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from core import ops
+from tests.utils import *
+
+
+@pytest.fixture
+def output_dir():
+    return 'tests/.temp/ops/memmaps'
+
+
+@pytest.fixture
+def filenames(output_dir):
+    return [os.path.join(output_dir, '{}.npy'.format(i)) for i in range(4)]
+
+
+def save_arrays(filenames):
+    for i, filename in enumerate(filenames):
+        np.save(filename, np.full(10, i))
+
+
+def test_load_memmap(output_dir, filenames):
+    with temp_dir(output_dir):
+        save_arrays(filenames)
+        array = ops.load_memmap(filenames[1])
+        assert isinstance(array, np.memmap)
+        assert np.array_equal(array, np.full(10, 1))
+        assert ops.load_memmap(filenames[1]) is array
+
+
+def test_load_memmap_should_keep_recently_used_maps(output_dir, filenames, monkeypatch):
+    monkeypatch.setattr(ops, 'memmap_cache_size', 2)
+    monkeypatch.setattr(ops, 'memmaps', type(ops.memmaps)())
+    with temp_dir(output_dir):
+        save_arrays(filenames)
+        for filename in filenames:
+            ops.load_memmap(filename)
+        assert [key[0] for key in ops.memmaps] == filenames[2:]
+
+
+def test_load_memmap_of_replaced_file(output_dir, filenames):
+    with temp_dir(output_dir):
+        save_arrays(filenames)
+        array = ops.load_memmap(filenames[0])
+        os.remove(filenames[0])
+        np.save(filenames[0], np.full(10, 5))
+        replaced = ops.load_memmap(filenames[0])
+        assert replaced is not array
+        assert np.array_equal(replaced, np.full(10, 5))
+        assert [key[0] for key in ops.memmaps].count(filenames[0]) == 1
+
+
+def test_release_memmaps(output_dir, filenames):
+    with temp_dir(output_dir):
+        save_arrays(filenames)
+        ops.load_memmap(filenames[0])
+        ops.release_memmaps(filenames[0])
+        assert filenames[0] not in [key[0] for key in ops.memmaps]
+
+
+def test_load_non_existing_memmap(filenames):
+    with pytest.raises(FileNotFoundError):
+        ops.load_memmap(filenames[0])
@@ -0,0 +1,51 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from core import ops
+
+
+@pytest.fixture
+def test_video_file():
+    return 'tests/data/ops/test.mkv'
+
+
+@pytest.fixture
+def frames_dir():
+    return 'tests/.temp/ops/frames'
+
+
+@pytest.fixture
+def output(frames_dir):
+    return os.path.join(frames_dir, 'frames.npy')
+
+
+@pytest.fixture
+def index_output(frames_dir):
+    return os.path.join(frames_dir, 'index.npy')
+
+
+def test_load_packed_frames(test_video_file, output, index_output):
+    decoded = ops.decode_frames(test_video_file)
+    ops.save_packed_frames(decoded, range(len(decoded)), output, index_output)
+    frames, index = ops.load_packed_frames(output, index_output)
+    assert isinstance(frames, np.memmap)
+    assert len(frames) == len(index)
+    del frames
+    shutil.rmtree(os.path.dirname(output))
+
+
+def test_load_packed_frames_value(test_video_file, output, index_output):
+    decoded = ops.decode_frames(test_video_file)
+    ops.save_packed_frames(decoded, range(len(decoded)), output, index_output)
+    frames, index = ops.load_packed_frames(output, index_output)
+    assert np.array_equal(frames[10], decoded[index[10]])
+    del frames
+    shutil.rmtree(os.path.dirname(output))
+
+
+def test_load_non_existing_packed_frames(output, index_output):
+    with pytest.raises(FileNotFoundError):
+        ops.load_packed_frames(output, index_output)
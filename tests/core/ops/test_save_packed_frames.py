@@ -0,0 +1,38 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from core import ops
+
+
+@pytest.fixture
+def frames_dir():
+    return 'tests/.temp/ops/frames'
+
+
+@pytest.fixture
+def output(frames_dir):
+    return os.path.join(frames_dir, 'frames.npy')
+
+
+@pytest.fixture
+def index_output(frames_dir):
+    return os.path.join(frames_dir, 'index.npy')
+
+
+def test_save_packed_frames(output, index_output):
+    frames = np.ones((10, 4, 4, 3), dtype=np.uint8)
+    ops.save_packed_frames(frames, range(5, 15), output, index_output)
+    packed, index = ops.load_packed_frames(output, index_output)
+    assert np.array_equal(packed, frames)
+    assert list(index) == list(range(5, 15))
+    del packed
+    shutil.rmtree(os.path.dirname(output))
+
+
+def test_save_packed_frames_with_different_length(output, index_output):
+    frames = np.ones((10, 4, 4, 3), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        ops.save_packed_frames(frames, range(5), output, index_output)
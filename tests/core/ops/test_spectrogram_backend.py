@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+from core import ops
+from util import stft, tensorplow as tp
+
+
+@pytest.fixture
+def test_wav_file():
+    return 'tests/data/ops/test.wav'
+
+
+@pytest.fixture
+def output():
+    return 'tests/.temp/ops/spectrogram.npy'
+
+
+def test_default_spectrogram_backend():
+    assert ops.spectrogram_backend == 'numpy'
+    assert ops.spectrogram_ops() is stft
+
+
+def test_set_spectrogram_backend(monkeypatch):
+    monkeypatch.setattr(ops, 'spectrogram_backend', ops.spectrogram_backend)
+    ops.set_spectrogram_backend('tensorflow')
+    assert ops.spectrogram_ops() is tp
+
+
+def test_set_invalid_spectrogram_backend():
+    with pytest.raises(ValueError):
+        ops.set_spectrogram_backend('torch')
+
+
+def test_full_spectrogram_should_match_between_backends(test_wav_file, output, monkeypatch):
+    monkeypatch.setattr(ops, 'spectrogram_backend', ops.spectrogram_backend)
+    wav = tp.load_wav(test_wav_file)
+    ops.compute_full_spectrogram(wav.audio, output)
+    expected = np.load(output)
+    ops.set_spectrogram_backend('tensorflow')
+    ops.compute_full_spectrogram(wav.audio, output, overwrite=True)
+    assert np.allclose(np.load(output), expected, atol=1e-2)
+    os.remove(output)
+    os.remove(ops.spectrogram_offset_file(output))
+    os.removedirs(os.path.dirname(output))
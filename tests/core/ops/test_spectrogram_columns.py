@@ -0,0 +1,24 @@
+from core import ops
+
+
+def test_spectrogram_columns_of_one_second():
+    columns = ops.spectrogram_columns(0, 48000)
+    assert columns.stop - columns.start == 199
+
+
+def test_spectrogram_columns_should_follow_start_sample():
+    columns = ops.spectrogram_columns(1920, 48000)
+    assert columns.start == 8
+    assert columns.stop == 8 + 199
+
+
+def test_spectrogram_columns_with_other_features():
+    features = ops.default_features._replace(sample_rate=16000, window_length=0.02)
+    columns = ops.spectrogram_columns(0, 16000, features)
+    assert columns.stop - columns.start == 99
+
+
+def test_spectrogram_columns_should_follow_start_column():
+    columns = ops.spectrogram_columns(1920, 48000, start_column=5)
+    assert columns.start == 3
+    assert columns.stop == 3 + 199
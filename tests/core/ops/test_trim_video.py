@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from core import ops
+
+
+@pytest.fixture
+def test_video_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def test_mkv_file():
+    return 'tests/data/ops/test.mkv'
+
+
+@pytest.fixture
+def output_dir():
+    return 'tests/.temp/ops/trim_video'
+
+
+def test_trim_video(test_video_file, output_dir):
+    output = os.path.join(output_dir, 'trimmed.mp4')
+    try:
+        offset = ops.trim_video(test_video_file, output, 6., 9.)
+        assert offset == pytest.approx(5.4)
+
+        frames = ops.decode_frames(test_video_file, 7.)
+        trimmed_frames = ops.decode_frames(output, 7. - offset)
+        assert np.array_equal(frames[:len(trimmed_frames)], trimmed_frames)
+
+        start = int(offset * 48000)
+        audio = ops.decode_audio(test_video_file).audio
+        trimmed_audio = ops.decode_audio(output).audio
+        assert len(trimmed_audio) < len(audio)
+        assert np.allclose(audio[start:start + 48000], trimmed_audio[:48000], atol=1e-2)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def test_trim_video_to_mkv(test_video_file, output_dir):
+    output = os.path.join(output_dir, 'trimmed.mkv')
+    try:
+        offset = ops.trim_video(test_video_file, output, 6., 9.)
+        assert 5.3 < offset <= 5.4
+
+        frames = ops.decode_frames(test_video_file, 7.)
+        trimmed_frames = ops.decode_frames(output, 7. - offset)
+        assert np.array_equal(frames[:len(trimmed_frames)], trimmed_frames)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def test_trim_video_before_first_keyframe(test_video_file, output_dir):
+    output = os.path.join(output_dir, 'trimmed.mp4')
+    try:
+        assert ops.trim_video(test_video_file, output, -1., 3.) == 0.
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def test_trim_video_after_end_of_video(test_video_file, output_dir):
+    output = os.path.join(output_dir, 'trimmed.mp4')
+    with pytest.raises(ValueError):
+        ops.trim_video(test_video_file, output, 29., 41.)
+    assert not os.path.exists(output)
+
+
+def test_trim_video_with_non_existing_video(output_dir):
+    with pytest.raises(FileNotFoundError):
+        ops.trim_video('tests/data/ops/missing.mkv', os.path.join(output_dir, 'trimmed.mkv'), 0., 1.)
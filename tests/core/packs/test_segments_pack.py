@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import ops, packs
+from core.segments import Segment
+from tests.utils import *
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def pack_dir():
+    return 'tests/.temp/packs/pack'
+
+
+@pytest.fixture
+def segment():
+    return Segment(root_dir='tests/.temp/packs/raw',
+                   ytid='0qZ3tI4nAZE',
+                   start_seconds=6.000,
+                   end_seconds=16.000,
+                   positive_labels=['/m/07qrkrw', '/m/09x0r'])
+
+
+def test_with_invalid_pack_dir_type():
+    with pytest.raises(TypeError):
+        assert packs.SegmentsPack(0)
+
+
+def test_with_missing_pack(pack_dir):
+    with pytest.raises(FileNotFoundError):
+        assert packs.SegmentsPack(pack_dir)
+
+
+def test_segments(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+            pack = packs.SegmentsPack(pack_dir)
+            packed = pack['0qZ3tI4nAZE']
+            assert len(pack) == 1
+            assert '0qZ3tI4nAZE' in pack
+            assert pack[0] is packed
+            assert packed == segment
+            assert packed.positive_labels == segment.positive_labels
+            assert packed.start_seconds == segment.start_seconds
+            assert packed.end_seconds == segment.end_seconds
+            assert len(packed) == len(segment)
+            assert packed.positive_indices == segment.positive_indices
+            assert packed.is_available
+
+
+def test_packed_segment_should_load_same_samples(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+            packed = packs.SegmentsPack(pack_dir)[0]
+            assert packed.spectrogram_offset == segment.spectrogram_offset > 0
+            for index in (segment.start_frames, segment.start_frames + 100, segment.positive_indices[-1]):
+                assert np.array_equal(packed.load_frame(index), segment.load_frame(index))
+                assert np.array_equal(packed.load_spectrogram(index), segment.load_spectrogram(index))
+
+
+def test_packed_segment_should_not_touch_segment_dir(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+        shutil.rmtree(segment.dir)
+        packed = packs.SegmentsPack(pack_dir)[0]
+        frame_index, frame = packed.sample_frame()
+        assert frame.shape == (256, 341, 3)
+        assert packed.sample_spectrogram(frame_index).shape == (257, 199, 1)
+        assert not os.path.exists(packed.dir)
+        os.makedirs(segment.dir)
+
+
+def test_packed_segment_should_load_same_samples_of_trimmed_segment(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        shutil.copy(test_raw_file, segment.dir)
+        segment.trim(margin=1.)
+        segment.extract()
+        packs.write_pack([segment], pack_dir)
+        packed = packs.SegmentsPack(pack_dir)[0]
+        assert packed.raw_offset == segment.raw_offset == 5.
+        assert len(packed) == len(segment)
+        for index in (segment.start_frames, segment.start_frames + 100, segment.positive_indices[-1]):
+            assert np.array_equal(packed.load_frame(index), segment.load_frame(index))
+            assert np.array_equal(packed.load_spectrogram(index), segment.load_spectrogram(index))
+
+
+def test_packed_segment_without_raw_offset(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+        # packs written before trimmed videos
+        index_file = os.path.join(pack_dir, packs.index_filename)
+        pd.read_csv(index_file).drop(columns='raw_offset').to_csv(index_file, index=False)
+        packed = packs.SegmentsPack(pack_dir)[0]
+        assert packed.raw_offset == 0.
+        index = segment.start_frames
+        assert np.array_equal(packed.load_spectrogram(index), segment.load_spectrogram(index))
+
+
+def test_packed_segment_duration(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+        packed = packs.SegmentsPack(pack_dir)[0]
+        assert packed.duration == pytest.approx(segment.duration)
+        assert packed.metadata is None
+
+
+def test_packed_segment_without_duration(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+        # packs written before durations
+        index_file = os.path.join(pack_dir, packs.index_filename)
+        pd.read_csv(index_file).drop(columns='duration').to_csv(index_file, index=False)
+        packed = packs.SegmentsPack(pack_dir)[0]
+        assert packed.duration == pytest.approx(segment.duration, abs=0.1)
+
+
+def test_pack_without_features(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+        # packs written before features could be configured
+        os.remove(os.path.join(pack_dir, packs.features_filename))
+        pack = packs.SegmentsPack(pack_dir)
+        assert pack.features == ops.default_features
+        assert pack[0].features == ops.default_features
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from core import ops, packs
+from core.segments import Segment
+from tests.utils import *
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def pack_dir():
+    return 'tests/.temp/packs/pack'
+
+
+@pytest.fixture
+def segment():
+    return Segment(root_dir='tests/.temp/packs/raw',
+                   ytid='0qZ3tI4nAZE',
+                   start_seconds=6.000,
+                   end_seconds=16.000,
+                   positive_labels=['/m/07qrkrw', '/m/09x0r'])
+
+
+def test_write_pack(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            assert packs.write_pack([segment], pack_dir) == 1
+            assert os.path.exists(os.path.join(pack_dir, packs.index_filename))
+            assert os.path.exists(os.path.join(pack_dir, packs.shard_filename.format(0)))
+
+
+def test_write_pack_should_split_shards(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack(3 * [segment], pack_dir, shard_size=1)
+            assert os.path.exists(os.path.join(pack_dir, packs.shard_filename.format(2)))
+
+
+def test_write_pack_should_align_records(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            packs.write_pack(2 * [segment], pack_dir)
+            index = packs.SegmentsPack(pack_dir).index
+            offsets = index[['frames_offset', 'frame_indices_offset', 'spectrogram_offset']].values
+            assert np.all(offsets % packs.record_alignment == 0)
+
+
+def test_write_pack_with_unprocessed_segment(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            with pytest.raises(FileNotFoundError):
+                packs.write_pack([segment], pack_dir)
+            assert not os.path.exists(os.path.join(pack_dir, packs.index_filename))
+
+
+def test_write_pack_with_no_segments(pack_dir):
+    with temp_dir(pack_dir):
+        assert packs.write_pack([], pack_dir) == 0
+        assert len(packs.SegmentsPack(pack_dir)) == 0
+
+
+def test_write_pack_should_save_features(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.features = ops.default_features._replace(window_length=0.02)
+            segment.extract()
+            packs.write_pack([segment], pack_dir)
+            pack = packs.SegmentsPack(pack_dir)
+            assert pack.features == segment.features
+            assert pack[0].frame_rate == segment.frame_rate
+            assert np.array_equal(pack[0].load_spectrogram(segment.start_frames),
+                                  segment.load_spectrogram(segment.start_frames))
+
+
+def test_write_pack_with_different_features(test_raw_file, segment, pack_dir):
+    with temp_dir(segment.dir), temp_dir(pack_dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            other = Segment(segment.root_dir, segment.ytid, segment.start_seconds, segment.end_seconds,
+                            segment.positive_labels, features=ops.default_features._replace(window_length=0.02))
+            other.extract()
+            with pytest.raises(ValueError):
+                packs.write_pack([segment, other], pack_dir)
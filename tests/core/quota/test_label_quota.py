@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from core.quota import LabelQuota
+from core.segments import Segment
+
+
+@pytest.fixture
+def labels():
+    return {'animal': {'/m/0jbk', '/m/03fwl'}, 'music': {'/m/04rlf'}}
+
+
+def segment(ytid, *positive_labels):
+    return Segment('tests/.temp/quota', ytid, 0, 10, list(positive_labels))
+
+
+def test_labels_of(labels):
+    quota = LabelQuota(labels)
+    assert quota.labels_of(segment('a', '/m/03fwl', '/m/04rlf')) == ['animal', 'music']
+    assert quota.labels_of(segment('b', '/m/unknown')) == []
+
+
+def test_initial_counts(labels):
+    quota = LabelQuota(labels, downloaded=[segment('a', '/m/0jbk'), segment('b', '/m/0jbk', '/m/04rlf')])
+    assert quota.counts == {'animal': 2, 'music': 1}
+
+
+def test_reserve_without_limit(labels):
+    quota = LabelQuota(labels)
+    for i in range(10):
+        assert quota.reserve(segment(str(i), '/m/0jbk')) == []
+    assert quota.reserved['animal'] == 10
+    assert not quota.finished
+
+
+def test_reserve_should_count_pending_segments(labels):
+    quota = LabelQuota(labels, limit=1)
+    assert quota.reserve(segment('a', '/m/0jbk')) == []
+    assert quota.reserve(segment('b', '/m/0jbk', '/m/04rlf')) == ['animal']
+    assert quota.reserved == {'animal': 1, 'music': 0}
+
+
+def test_release(labels):
+    quota = LabelQuota(labels, limit=1)
+    quota.reserve(segment('a', '/m/0jbk'))
+    quota.release(segment('a', '/m/0jbk'))
+    assert quota.reserve(segment('b', '/m/0jbk')) == []
+    assert quota.counts['animal'] == 0
+
+
+def test_commit(labels):
+    quota = LabelQuota(labels, limit=1)
+    quota.reserve(segment('a', '/m/0jbk', '/m/04rlf'))
+    quota.commit(segment('a', '/m/0jbk', '/m/04rlf'))
+    assert quota.counts == {'animal': 1, 'music': 1}
+    assert quota.reserved == {'animal': 0, 'music': 0}
+    assert quota.finished
+
+
+def test_concurrent_reserve(labels):
+    quota = LabelQuota(labels, limit=5)
+    reserved = list()
+
+    def reserve(i):
+        if not quota.reserve(segment(str(i), '/m/0jbk')):
+            reserved.append(i)
+
+    threads = [threading.Thread(target=reserve, args=(i,)) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(reserved) == 5
@@ -1,8 +1,11 @@
 import json
 import random
 
+import numpy as np
 import pytest
 
+from core import ops
+from core.metadata import MetadataStore
 from core.segments import Segment
 from tests.utils import *
 from util import youtube as yt
@@ -201,6 +204,58 @@ def test_wav_should_be_in_the_same_folder_as_raw(segment):
     assert os.path.dirname(segment.wav) == segment.dir
 
 
+def test_load_attributes_from_metadata(root_dir, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])):
+        metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+        metadata.save(segment_dict['ytid'], 'duration', 15.929)
+        metadata.save(segment_dict['ytid'], 'wavelength', 764587)
+        segment = Segment(root_dir, **segment_dict, metadata=metadata)
+        assert segment.duration == 15.929
+        assert segment.wavelength == 764587
+
+
+def test_save_attribute_to_metadata(root_dir, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])):
+        metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+        segment = Segment(root_dir, **segment_dict, metadata=metadata)
+        segment.save_attribute('duration', 20)
+        metadata.flush()
+        assert MetadataStore(metadata.filename).attributes(segment.ytid) == {'duration': 20}
+        assert not os.path.exists(segment.attrs_file)
+
+
+def test_metadata_should_import_attributes_file(root_dir, test_attributes_file, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])):
+        with temp_copy(test_attributes_file, os.path.join(root_dir, segment_dict['ytid'])):
+            metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+            segment = Segment(root_dir, **segment_dict, metadata=metadata)
+            assert segment.wavelength == 764587
+            assert metadata.attributes(segment.ytid) == {'duration': 15.929, 'wavelength': 764587}
+
+
+def test_extract_should_save_attributes_to_metadata(test_raw_file, root_dir, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        with temp_copy(test_raw_file, segment_dir):
+            metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+            Segment(root_dir, **segment_dict, metadata=metadata).extract()
+            attrs = MetadataStore(metadata.filename).attributes(segment_dict['ytid'])
+            assert attrs['wavelength'] == 764587
+
+
+def test_raw_should_use_known_raw_file(test_raw_file, root_dir, segment_dict):
+    with temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        with temp_copy_file(test_raw_file, os.path.join(segment_dir, 'known.mp4')):
+            raw = os.path.join(segment_dir, 'known.mp4')
+            assert Segment(root_dir, **segment_dict, raw=raw).raw == raw
+
+
+def test_raw_should_glob_missing_known_raw_file(test_raw_file, root_dir, segment_dict):
+    with temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        with temp_copy(test_raw_file, segment_dir):
+            segment = Segment(root_dir, **segment_dict, raw=os.path.join(segment_dir, 'missing.mp4'))
+            assert segment.raw == os.path.join(segment_dir, '0qZ3tI4nAZE.mp4')
+
+
 def test_attrs_file_should_be_in_the_same_directory_as_raw(segment):
     assert os.path.dirname(segment.attrs_file) == segment.dir
 
@@ -210,6 +265,10 @@ def test_frame_should_be_inside_frames_dir(segment):
     assert cp == segment.frames_dir
 
 
+def test_spectrogram_file_should_be_inside_spectrograms_dir(segment):
+    assert os.path.dirname(segment.spectrogram_file) == segment.spectrograms_dir
+
+
 def test_spectrogram_should_be_inside_frames_dir(segment):
     cp = os.path.commonprefix([segment.spectrogram(0), segment.spectrograms_dir])
     assert cp == segment.spectrograms_dir
@@ -284,10 +343,27 @@ def test_waveform(test_raw_file, segment):
     with temp_dir(segment.dir):
         with temp_copy(test_raw_file, segment.dir):
             waveform = segment.waveform
-            assert waveform.sample_rate.numpy() == segment.sample_rate
+            assert waveform.sample_rate == segment.sample_rate
             assert len(waveform.audio) == segment.wavelength
 
 
+def test_waveform_should_not_create_wav(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            assert segment.waveform is not None
+            assert not os.path.exists(segment.wav)
+
+
+def test_waveform_should_match_extracted_wav(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            decoded = segment.waveform
+            ops.extract_audio(segment.raw, segment.wav)
+            extracted = segment.waveform
+            assert np.array_equal(decoded.audio, extracted.audio)
+            assert decoded.sample_rate == extracted.sample_rate
+
+
 def test_extract_frames_with_non_rounded_seconds(test_raw_file, non_rounded_segment):
     with temp_dir(non_rounded_segment.dir):
         with temp_copy(test_raw_file, non_rounded_segment.dir):
@@ -361,6 +437,38 @@ def test_get_positive_sample(test_raw_file, segment):
             assert spectrogram.shape == (257, 199, 1)
 
 
+def test_sample_frame(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            frame_index, frame = segment.sample_frame()
+            assert frame_index in segment.positive_indices
+            assert frame.shape == (256, 341, 3)
+            assert np.array_equal(frame, segment.load_frame(frame_index))
+
+
+def test_sample_audio_index_should_be_in_1_second_distance(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            for frame_index in segment.positive_indices:
+                audio_index = segment.sample_audio_index(frame_index)
+                assert 0 <= frame_index - audio_index < segment.frame_rate
+
+
+def test_sample_spectrogram(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            assert segment.sample_spectrogram().shape == (257, 199, 1)
+            assert segment.sample_spectrogram(segment.start_frames).shape == (257, 199, 1)
+
+
+def test_sample_spectrogram_should_not_load_frames(test_raw_file, segment, monkeypatch):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            monkeypatch.setattr(Segment, 'load_frame', None)
+            assert segment.sample_spectrogram().shape == (257, 199, 1)
+
+
 def test_equality(test_raw_file, segment, segment_dict):
     with temp_dir(segment.dir):
         with temp_copy(test_raw_file, segment.dir):
@@ -377,3 +485,295 @@ def test_equality_fail(segment):
 
 def test_equality_against_invalid_type(segment):
     assert segment != 0
+
+
+def test_frames_file_should_be_inside_frames_dir(segment):
+    assert os.path.dirname(segment.frames_file) == segment.frames_dir
+    assert os.path.dirname(segment.frames_index_file) == segment.frames_dir
+
+
+def test_extract_frames_should_pack_frames(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract_frames()
+            assert os.path.exists(segment.frames_file)
+            assert os.path.exists(segment.frames_index_file)
+            assert sorted(os.listdir(segment.frames_dir)) == ['frames.npy', 'index.npy']
+
+
+def test_load_frame_from_packed_frames(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract_frames()
+            frame = segment.load_frame(segment.start_frames)
+            assert frame.shape == (256, 341, 3)
+            assert isinstance(frame, np.memmap)
+
+
+def test_load_frame_from_packed_frames_with_missing_index(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract_frames()
+            with pytest.raises(FileNotFoundError):
+                segment.load_frame(segment.end_frames + 1)
+
+
+def test_load_frame_should_fallback_to_jpg(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            ops.extract_all_frames(segment.raw, segment.frames_dir)
+            assert segment.load_frame(0).shape == (256, 341, 3)
+            assert not os.path.exists(segment.frames_file)
+
+
+def test_compute_spectrogram(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.compute_spectrogram()
+            assert os.path.exists(segment.spectrogram_file)
+            assert sorted(os.listdir(segment.spectrograms_dir)) == \
+                sorted(map(os.path.basename, (segment.spectrogram_file, segment.spectrogram_offset_file)))
+
+
+def test_load_spectrogram_should_slice_full_spectrogram(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            spectrogram = segment.load_spectrogram(segment.start_frames)
+            assert np.shares_memory(spectrogram, segment.full_spectrogram)
+            assert len(os.listdir(segment.spectrograms_dir)) == 2
+
+
+def test_load_spectrogram_should_fallback_to_npz(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            os.makedirs(segment.spectrograms_dir)
+            shutil.copyfile('tests/data/ops/spectrogram.npz', segment.spectrogram(segment.start_frames))
+            assert segment.load_spectrogram(segment.start_frames).shape == (257, 199, 1)
+            assert not os.path.exists(segment.spectrogram_file)
+
+
+def test_extract(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            assert os.path.exists(segment.frames_index_file)
+            assert os.path.exists(segment.spectrogram_file)
+            assert segment.duration == pytest.approx(15.93, abs=0.01)
+            assert segment.wavelength == 764587
+
+
+def test_extract_should_only_compute_spectrogram_of_segment(test_raw_file, root_dir, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            short = Segment(root_dir, segment.ytid, 2., 5., segment.positive_labels)
+            short.extract()
+            columns = ops.spectrogram_columns(0, short.wavelength)
+            assert short.spectrogram_offset == short.get_sample_index(short.start_frames - short.frame_rate) // 240
+            assert short.full_spectrogram.shape[1] < columns.stop
+            assert short.load_spectrogram(short.start_frames - short.frame_rate).shape == (257, 199, 1)
+            assert short.load_spectrogram(short.end_frames).shape == (257, 199, 1)
+            with pytest.raises(FileNotFoundError):
+                short.load_spectrogram(0)
+
+
+def test_extract_should_save_attributes(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            with open(segment.attrs_file) as attrs_file:
+                attrs = json.load(attrs_file)
+            assert attrs['wavelength'] == 764587
+
+
+def test_raw_offset(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            assert segment.raw_offset == 0.
+
+
+def test_raw_offset_without_raw(segment):
+    assert segment.raw_offset == 0.
+
+
+def test_raw_should_find_trimmed_raw_file(test_raw_file, root_dir, segment_dict):
+    with temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        trimmed_raw_file = os.path.join(segment_dir, '0qZ3tI4nAZE.5000ms.mp4')
+        with temp_copy_file(test_raw_file, trimmed_raw_file):
+            segment = Segment(root_dir, **segment_dict)
+            assert segment.raw == trimmed_raw_file
+            assert segment.raw_offset == 5.
+
+
+def test_trim(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        shutil.copy(test_raw_file, segment.dir)
+        assert segment.wavelength == 764587
+        raw = segment.trim(margin=1.)
+        assert raw == os.path.join(segment.dir, '0qZ3tI4nAZE.5000ms.mp4')
+        assert segment.raw == raw
+        assert segment.raw_offset == 5.
+        assert segment.wavelength < 764587
+        assert os.listdir(segment.dir) == ['0qZ3tI4nAZE.5000ms.mp4']
+        assert os.path.getsize(raw) < os.path.getsize(test_raw_file)
+
+
+def test_trim_should_keep_trimmed_raw(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        shutil.copy(test_raw_file, segment.dir)
+        raw = segment.trim(margin=1.)
+        mtime = os.stat(raw).st_mtime_ns
+        assert segment.trim(margin=0.) == raw
+        assert os.stat(raw).st_mtime_ns == mtime
+
+
+def test_trim_should_keep_frames_and_spectrograms(test_raw_file, segment, segment_dict):
+    trimmed_segment = Segment('tests/.temp/trimmed_segments', **segment_dict)
+    with temp_dir(segment.dir), temp_dir(trimmed_segment.dir):
+        shutil.copy(test_raw_file, segment.dir)
+        shutil.copy(test_raw_file, trimmed_segment.dir)
+        trimmed_segment.trim(margin=1.)
+        segment.extract()
+        trimmed_segment.extract()
+
+        assert trimmed_segment.wavelength < segment.wavelength
+        assert len(trimmed_segment) == len(segment)
+        assert trimmed_segment.positive_indices == segment.positive_indices
+        assert np.array_equal(trimmed_segment.packed_frames[1], segment.packed_frames[1])
+
+        # spectrograms are floored 80dB below the loudest bin of the whole video
+        floor = max(segment.full_spectrogram.min(), trimmed_segment.full_spectrogram.min())
+        for index in segment.positive_indices[::25]:
+            assert np.array_equal(trimmed_segment.load_frame(index), segment.load_frame(index))
+            assert np.allclose(np.maximum(trimmed_segment.load_spectrogram(index), floor),
+                               np.maximum(segment.load_spectrogram(index), floor), atol=1e-3)
+    shutil.rmtree(trimmed_segment.root_dir)
+
+
+def test_raw_offset_should_follow_trimmed_raw(test_raw_file, root_dir, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        shutil.copy(test_raw_file, segment_dir)
+        metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+        segment = Segment(root_dir, **segment_dict, metadata=metadata)
+        segment.extract()
+        assert segment.raw_offset == 0.
+        Segment(root_dir, **segment_dict, metadata=metadata).trim(margin=1.)
+        segment.extract(['frames', 'spectrogram'])
+        assert segment.raw_offset == 5.
+        assert 'raw_offset' not in metadata.attributes(segment_dict['ytid'])
+        assert Segment(root_dir, **segment_dict, metadata=metadata).raw_offset == 5.
+
+
+def test_extract_should_overwrite_attributes_of_replaced_raw(test_raw_file, root_dir, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        shutil.copy(test_raw_file, segment_dir)
+        metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+        Segment(root_dir, **segment_dict, metadata=metadata).extract()
+        assert metadata.attributes(segment_dict['ytid'])['wavelength'] == 764587
+
+        Segment(root_dir, **segment_dict, metadata=metadata).trim(margin=1.)
+        trimmed = Segment(root_dir, **segment_dict, metadata=metadata)
+        wavelength = len(ops.decode_audio(trimmed.raw).audio)
+        trimmed.extract(['frames', 'spectrogram'])
+
+        attrs = MetadataStore(metadata.filename).attributes(segment_dict['ytid'])
+        assert attrs['wavelength'] == wavelength < 764587
+        assert Segment(root_dir, **segment_dict, metadata=metadata).wavelength == wavelength
+
+
+def test_sample_audio_index_should_be_after_raw_offset(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        shutil.copy(test_raw_file, segment.dir)
+        segment.trim(margin=1.)
+        rng = random.Random(0)
+        for _ in range(100):
+            assert segment.sample_audio_index(segment.positive_indices[0], rng) >= segment.raw_offset_frames
+
+
+def test_extract_should_extract_given_outputs_again(test_raw_file, segment, monkeypatch):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            frames_time = os.stat(segment.frames_file).st_mtime_ns
+            spectrogram_time = os.stat(segment.spectrogram_file).st_mtime_ns
+            monkeypatch.setattr(ops, 'decode_segment', None)
+            segment.extract(['spectrogram'])
+            assert os.stat(segment.frames_file).st_mtime_ns == frames_time
+            assert os.stat(segment.spectrogram_file).st_mtime_ns != spectrogram_time
+
+
+def test_files_of_other_features(root_dir, segment_dict):
+    segment = Segment(root_dir, **segment_dict)
+    other = Segment(root_dir, **segment_dict, features=ops.default_features._replace(frame_rate=10,
+                                                                                     window_length=0.02))
+    assert other.frames_file != segment.frames_file
+    assert other.frames_index_file != segment.frames_index_file
+    assert other.spectrogram_file != segment.spectrogram_file
+    assert other.frame_rate == 10
+
+
+def test_extract_should_keep_other_features(test_raw_file, segment):
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract()
+            spectrogram = np.load(segment.spectrogram_file)
+            features = ops.default_features._replace(frame_rate=10, window_length=0.02)
+            other = Segment(segment.root_dir, segment.ytid, segment.start_seconds, segment.end_seconds,
+                            segment.positive_labels, features=features)
+            other.extract()
+            assert np.array_equal(np.load(segment.spectrogram_file), spectrogram)
+            assert len(other.packed_frames[0]) < len(segment.packed_frames[0])
+            assert other.full_spectrogram.shape[1] < spectrogram.shape[1]
+            assert other.load_spectrogram(other.start_frames).shape[1] < \
+                segment.load_spectrogram(segment.start_frames).shape[1]
+
+
+def test_wavelength_of_other_sample_rate_should_not_be_saved(test_raw_file, root_dir, segment_dict):
+    with temp_dir(root_dir), temp_dir(os.path.join(root_dir, segment_dict['ytid'])) as segment_dir:
+        with temp_copy(test_raw_file, segment_dir):
+            metadata = MetadataStore(os.path.join(root_dir, 'metadata.sqlite'))
+            features = ops.default_features._replace(sample_rate=16000)
+            segment = Segment(root_dir, **segment_dict, metadata=metadata, features=features)
+            assert segment.wavelength == pytest.approx(764587 / 3, abs=2)
+            assert 'wavelength' not in metadata.attributes(segment_dict['ytid'])
+            assert Segment(root_dir, **segment_dict, metadata=metadata).wavelength == 764587
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc to count file descriptors')
+def test_segments_should_not_keep_frames_open(test_raw_file, segment, segment_dict, monkeypatch):
+    monkeypatch.setattr(ops, 'memmap_cache_size', 4)
+    root_dir = 'tests/.temp/many_segments'
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.extract_frames()
+            segments = list()
+            for i in range(20):
+                copy = Segment(root_dir, **{**segment_dict, 'ytid': '{}{}'.format(segment.ytid, i)})
+                shutil.copytree(segment.frames_dir, copy.frames_dir)
+                segments.append(copy)
+
+            open_files = len(os.listdir('/proc/self/fd'))
+            frames = [s.load_frame(s.start_frames).copy() for s in segments]
+            assert len(os.listdir('/proc/self/fd')) <= open_files + 4
+            assert all(np.array_equal(frame, frames[0]) for frame in frames)
+    shutil.rmtree(root_dir)
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc to count file descriptors')
+def test_segments_should_not_keep_spectrograms_open(test_raw_file, segment, segment_dict, monkeypatch):
+    monkeypatch.setattr(ops, 'memmap_cache_size', 4)
+    root_dir = 'tests/.temp/many_segments'
+    with temp_dir(segment.dir):
+        with temp_copy(test_raw_file, segment.dir):
+            segment.compute_spectrogram()
+            segments = list()
+            for i in range(20):
+                copy = Segment(root_dir, **{**segment_dict, 'ytid': '{}{}'.format(segment.ytid, i)})
+                shutil.copytree(segment.spectrograms_dir, copy.spectrograms_dir)
+                copy._Segment__wavelength = segment.wavelength
+                segments.append(copy)
+
+            open_files = len(os.listdir('/proc/self/fd'))
+            spectrograms = [s.load_spectrogram(s.start_frames).copy() for s in segments]
+            assert len(os.listdir('/proc/self/fd')) <= open_files + 4
+            assert all(np.array_equal(spectrogram, spectrograms[0]) for spectrogram in spectrograms)
+    shutil.rmtree(root_dir)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from core.segments import SegmentsTable
+
+
+@pytest.fixture
+def segments_file():
+    return 'tests/data/segments/test.csv'
+
+
+@pytest.fixture
+def table(segments_file):
+    return SegmentsTable.from_csv(segments_file)
+
+
+def test_from_csv(table):
+    assert len(table) == 5
+    assert table.ytids.tolist() == ['SmOwn_OEJTo', '--aE2O5G5WE', 'iYWvaxU5OXk', 'vmCvyAgLJWc', 'xxxxxxxxxxx']
+    assert table.start_seconds.tolist() == [30, 0, 30, 26, 0]
+    assert table.end_seconds.tolist() == [40, 10, 40, 36, 10]
+
+
+def test_from_csv_should_intern_labels(table):
+    assert len(table.labels) == 5
+    assert table.label_ids.dtype == np.int32
+    assert len(table.label_ids) == 8
+    assert table.label_offsets.tolist() == [0, 2, 5, 6, 7, 8]
+
+
+def test_from_csv_with_labels(segments_file):
+    table = SegmentsTable.from_csv(segments_file, labels=['/m/0dgw9r', '/m/unused'])
+    assert table.labels[:2].tolist() == ['/m/0dgw9r', '/m/unused']
+    assert table.positive_label_ids(4).tolist() == [0]
+    assert len(table.labels) == 6
+
+
+def test_positive_labels(table):
+    assert table.positive_labels(0) == ['/m/0jbk', '/t/dd00088']
+    assert table.positive_labels(1) == ['/m/0jbk', '/m/04rlf', '/m/03fwl']
+
+
+def test_label_rows(table):
+    assert table.label_rows().tolist() == [0, 0, 1, 1, 1, 2, 3, 4]
+
+
+def test_position(table):
+    assert table.position('iYWvaxU5OXk') == 2
+    assert table.position('--aE2O5G5WE') == 1
+
+
+def test_position_with_missing_ytid(table):
+    with pytest.raises(KeyError):
+        assert table.position('missing')
+
+
+def test_take(table):
+    taken = table.take([1, 3])
+    assert taken.ytids.tolist() == ['--aE2O5G5WE', 'vmCvyAgLJWc']
+    assert taken.positive_labels(0) == ['/m/0jbk', '/m/04rlf', '/m/03fwl']
+    assert taken.positive_labels(1) == ['/m/0dgw9r']
+    assert taken.label_offsets.tolist() == [0, 3, 4]
+
+
+def test_take_nothing(table):
+    assert len(table.take([])) == 0
+
+
+def test_nbytes(table):
+    assert table.nbytes > 0
+
+
+def test_rows_with_labels(table):
+    selected = table.labels == '/m/0dgw9r'
+    assert table.rows_with_labels(selected).tolist() == [False, False, False, True, True]
+    assert not table.rows_with_labels(np.zeros(len(table.labels), dtype=bool)).any()
@@ -1,6 +1,13 @@
 import pytest
 
+from core.ontology import Ontology
 from core.segments import SegmentsWrapper
+from tests.utils import *
+
+
+@pytest.fixture
+def test_raw_file():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
 
 
 @pytest.fixture
@@ -103,3 +110,109 @@ def test_filter(segments):
 def test_filter_by_invalid_type(segments):
     with pytest.raises(TypeError):
         assert segments.filter(0)
+
+
+def test_table(segments):
+    assert len(segments.table) == 5
+    assert segments.table.ytids[1] == '--aE2O5G5WE'
+    assert segments.table.positive_labels(1) == ['/m/0jbk', '/m/04rlf', '/m/03fwl']
+
+
+def test_table_with_empty_segments_file():
+    with temp_dir('tests/.temp/segments') as root_dir:
+        filename = os.path.join(root_dir, 'empty.csv')
+        with open(filename, 'w') as f:
+            f.write('# YTID, start_seconds, end_seconds, positive_labels\n')
+        assert len(SegmentsWrapper(filename, root_dir)) == 0
+
+
+def test_getitem_by_negative_index(segments):
+    assert segments[-1].ytid == 'xxxxxxxxxxx'
+
+
+def test_getitem_by_out_of_range_index(segments):
+    with pytest.raises(IndexError):
+        assert segments[5]
+
+
+def test_getitem_should_return_same_segment(segments):
+    assert segments[0] is segments['SmOwn_OEJTo']
+
+
+def test_iter(segments):
+    assert list(map(lambda s: s.ytid, segments)) == segments.table.ytids.tolist()
+
+
+def test_filter_should_keep_segments(segments):
+    segment = segments[0]
+    assert segments.filter('/m/0jbk')[0] is segment
+
+
+def test_segments_should_share_metadata(segments):
+    assert segments[0].metadata is segments[1].metadata is segments.metadata
+    assert segments.filter('/m/0jbk')[0].metadata is segments.metadata
+
+
+def test_available(test_raw_file):
+    segments = SegmentsWrapper('tests/data/segments/test.csv', 'tests/.temp/segments')
+    with temp_dir('tests/.temp/segments'), temp_dir('tests/.temp/segments/iYWvaxU5OXk'):
+        with temp_copy_file(test_raw_file, 'tests/.temp/segments/iYWvaxU5OXk/iYWvaxU5OXk.mp4'):
+            available = segments.available()
+            assert len(available) == 1
+            assert available[0].ytid == 'iYWvaxU5OXk'
+            assert available[0].is_available
+            assert available[0].raw == 'tests/.temp/segments/iYWvaxU5OXk/iYWvaxU5OXk.mp4'
+
+
+def test_available_without_downloaded_segments(segments):
+    assert len(segments.available()) == 0
+
+
+def test_filter_with_multiple_labels(segments):
+    filtered = segments.filter('/m/03fwl', '/m/0dgw9r')
+    assert filtered.table.ytids.tolist() == ['--aE2O5G5WE', 'vmCvyAgLJWc', 'xxxxxxxxxxx']
+
+
+def test_filter_with_exclude(segments):
+    filtered = segments.filter('/m/0jbk', exclude=['/m/04rlf', '/t/dd00088'])
+    assert filtered.table.ytids.tolist() == ['iYWvaxU5OXk']
+
+
+def test_filter_with_ontology(segments):
+    ontology = Ontology('tests/data/ontology/ontology.json', None)
+    assert len(segments.filter('animal', ontology=ontology)) == 3
+    assert len(segments.filter('domestic-animals-pets', ontology=ontology)) == 0
+    assert len(segments.filter('/m/0dgw9r', ontology=ontology)) == 2
+    assert len(segments.filter(ontology=ontology)) == 5
+
+
+def test_filter_with_ontology_and_exclude(segments):
+    ontology = Ontology('tests/data/ontology/ontology.json', None)
+    filtered = segments.filter('animal', ontology=ontology, exclude=['livestock-farm-animals-working-animals'])
+    assert filtered.table.ytids.tolist() == ['SmOwn_OEJTo', 'iYWvaxU5OXk']
+
+
+def test_table_with_ontology():
+    ontology = Ontology('tests/data/ontology/ontology.json', None)
+    segments = SegmentsWrapper('tests/data/segments/test.csv', 'tests/.temp/segments', ontology=ontology)
+    assert segments.table.labels[:len(ontology.ids)].tolist() == ontology.ids.tolist()
+    for position in range(len(segments)):
+        ids = segments.table.positive_label_ids(position)
+        assert ontology.ids[ids[ids < len(ontology.ids)]].tolist() == \
+            [label for label in segments[position].positive_labels if label in ontology]
+
+
+def test_filter_with_ontology_of_segments(segments):
+    ontology = Ontology('tests/data/ontology/ontology.json', None)
+    with_ontology = SegmentsWrapper('tests/data/segments/test.csv', 'tests/.temp/segments', ontology=ontology)
+    for labels, exclude in ((('animal',), None), (('/m/0dgw9r',), None), ((), None),
+                            (('animal',), ['livestock-farm-animals-working-animals'])):
+        filtered = with_ontology.filter(*labels, ontology=ontology, exclude=exclude)
+        assert filtered.ontology is ontology
+        assert filtered.table.ytids.tolist() == \
+            segments.filter(*labels, ontology=ontology, exclude=exclude).table.ytids.tolist()
+
+
+def test_filter_with_invalid_exclude_type(segments):
+    with pytest.raises(TypeError):
+        assert segments.filter('/m/0jbk', exclude=[0])
@@ -0,0 +1,46 @@
+import os
+import shutil
+
+import pytest
+
+from util import ffmpeg
+
+
+@pytest.fixture
+def test_infile():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def non_existing_test_infile():
+    return 'tests/data/ffmpeg/infile'
+
+
+@pytest.fixture
+def output_dir():
+    return 'tests/.temp/ffmpeg/cut'
+
+
+def test_cut(test_infile, output_dir):
+    outfile = os.path.join(output_dir, 'cut.mp4')
+    ffmpeg.cut(test_infile, outfile, 5., 4.)
+    try:
+        assert os.path.getsize(outfile) < os.path.getsize(test_infile)
+        assert ffmpeg.keyframes(outfile)[0] == 0.
+        assert ffmpeg.keyframes(outfile)[-1] == pytest.approx(0.4)
+    finally:
+        shutil.rmtree(output_dir)
+
+
+def test_cut_without_copy(test_infile, output_dir):
+    outfile = os.path.join(output_dir, 'cut.mp4')
+    ffmpeg.cut(test_infile, outfile, 6., 4., copy=False)
+    try:
+        assert ffmpeg.keyframes(outfile)[0] == 0.
+    finally:
+        shutil.rmtree(output_dir)
+
+
+def test_cut_with_non_existing_infile(non_existing_test_infile, output_dir):
+    with pytest.raises(FileNotFoundError):
+        ffmpeg.cut(non_existing_test_infile, os.path.join(output_dir, 'cut.mp4'), 0., 1.)
@@ -0,0 +1,27 @@
+import pytest
+
+from util import ffmpeg
+
+
+@pytest.fixture
+def test_infile():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def non_existing_test_infile():
+    return 'tests/data/ffmpeg/infile'
+
+
+def test_duration(test_infile):
+    assert ffmpeg.duration(test_infile) == pytest.approx(15.93)
+
+
+def test_duration_with_non_existing_infile(non_existing_test_infile):
+    with pytest.raises(FileNotFoundError):
+        ffmpeg.duration(non_existing_test_infile)
+
+
+def test_duration_of_invalid_infile():
+    with pytest.raises(ValueError):
+        ffmpeg.duration('tests/data/segments/test.csv')
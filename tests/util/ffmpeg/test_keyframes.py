@@ -0,0 +1,22 @@
+import pytest
+
+from util import ffmpeg
+
+
+@pytest.fixture
+def test_infile():
+    return 'tests/data/segments/0qZ3tI4nAZE.mp4'
+
+
+@pytest.fixture
+def non_existing_test_infile():
+    return 'tests/data/ffmpeg/infile'
+
+
+def test_keyframes(test_infile):
+    assert ffmpeg.keyframes(test_infile) == pytest.approx([0., 5., 5.4, 10.4, 10.8])
+
+
+def test_keyframes_with_non_existing_infile(non_existing_test_infile):
+    with pytest.raises(FileNotFoundError):
+        ffmpeg.keyframes(non_existing_test_infile)
@@ -0,0 +1,36 @@
+import pytest
+
+from util import ffmpeg
+
+
+@pytest.fixture
+def test_infile():
+    return 'tests/data/ffmpeg/test.mp4'
+
+
+@pytest.fixture
+def non_existing_test_infile():
+    return 'tests/data/ffmpeg/infile'
+
+
+def test_pipe(test_infile):
+    output, log = ffmpeg.pipe(test_infile, frames=1, f='rawvideo', pix_fmt='rgb24')
+    width, height = ffmpeg.parse_video_size(log)
+    assert len(output) == width * height * 3
+
+
+def test_pipe_with_non_existing_infile(non_existing_test_infile):
+    with pytest.raises(FileNotFoundError):
+        ffmpeg.pipe(non_existing_test_infile)
+
+
+def test_pipe_with_invalid_parameters(test_infile):
+    with pytest.raises(RuntimeError):
+        ffmpeg.pipe(test_infile, 'invalid_flag', f='rawvideo')
+    with pytest.raises(RuntimeError):
+        ffmpeg.pipe(test_infile, invalid_option=True)
+
+
+def test_parse_video_size_without_video_output():
+    with pytest.raises(ValueError):
+        ffmpeg.parse_video_size('Output #0, s16le, to \'pipe:1\':')
@@ -0,0 +1,48 @@
+import pytest
+
+from util import ffmpeg
+
+
+@pytest.fixture
+def test_infile():
+    return 'tests/data/ffmpeg/test.mp4'
+
+
+@pytest.fixture
+def non_existing_test_infile():
+    return 'tests/data/ffmpeg/infile'
+
+
+def test_pipes(test_infile):
+    (video, audio), log = ffmpeg.pipes(test_infile,
+                                       dict(frames=1, an=None, f='rawvideo', pix_fmt='rgb24'),
+                                       dict(vn=None, ac=1, f='s16le'))
+    width, height = ffmpeg.parse_video_size(log, output=0)
+    assert len(video) == width * height * 3
+    assert len(audio) > 0
+
+
+def test_pipes_should_match_pipe(test_infile):
+    (video,), _ = ffmpeg.pipes(test_infile, dict(frames=1, f='rawvideo', pix_fmt='rgb24'))
+    output, _ = ffmpeg.pipe(test_infile, frames=1, f='rawvideo', pix_fmt='rgb24')
+    assert video == output
+
+
+def test_pipes_with_non_existing_infile(non_existing_test_infile):
+    with pytest.raises(FileNotFoundError):
+        ffmpeg.pipes(non_existing_test_infile, dict(f='rawvideo'))
+
+
+def test_pipes_with_invalid_parameters(test_infile):
+    with pytest.raises(RuntimeError):
+        ffmpeg.pipes(test_infile, dict(invalid_option=True, f='rawvideo'))
+
+
+def test_parse_duration(test_infile):
+    _, log = ffmpeg.pipe(test_infile, frames=1, f='rawvideo')
+    assert ffmpeg.parse_duration(log) > 0
+
+
+def test_parse_duration_without_duration():
+    with pytest.raises(ValueError):
+        ffmpeg.parse_duration('Input #0, wav, from \'pipe:0\':')
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from util import filesystem as fs
+
+
+@pytest.fixture
+def output():
+    return 'tests/.temp/filesystem/output.txt'
+
+
+def test_atomic_output(output):
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with fs.atomic_output(output) as temp_output:
+        with open(temp_output, 'w') as f:
+            f.write('test')
+        assert not os.path.exists(output)
+    assert os.path.exists(output)
+    assert not os.path.exists(temp_output)
+    os.remove(output)
+
+
+def test_atomic_output_should_keep_extension(output):
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with fs.atomic_output(output) as temp_output:
+        open(temp_output, 'w').close()
+        assert temp_output != output
+        assert os.path.splitext(temp_output)[1] == os.path.splitext(output)[1]
+    os.remove(output)
+
+
+def test_atomic_output_should_discard_on_error(output):
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with pytest.raises(RuntimeError):
+        with fs.atomic_output(output) as temp_output:
+            with open(temp_output, 'w') as f:
+                f.write('test')
+            raise RuntimeError()
+    assert not os.path.exists(output)
+    assert not os.path.exists(temp_output)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from util import stft, tensorplow as tp
+
+
+@pytest.fixture
+def test_wav_file():
+    return 'tests/data/tensorplow/test.wav'
+
+
+@pytest.fixture
+def waveforms():
+    random = np.random.RandomState(0)
+    return random.uniform(-1, 1, (3, 48000)).astype(np.float32)
+
+
+def test_spectrogram(test_wav_file):
+    wav = tp.load_wav(test_wav_file)
+    spc = stft.spectrogram(wav.audio, 48000, 0.01, 0.5)
+    assert spc.shape == (257, 199)
+    assert spc.dtype == np.float32
+
+
+def test_spectrogram_should_match_tensorflow(test_wav_file):
+    wav = tp.load_wav(test_wav_file)
+    expected = tp.spectrogram(wav.audio, 48000, 0.01, 0.5).numpy()
+    assert np.allclose(stft.spectrogram(wav.audio.numpy(), 48000, 0.01, 0.5), expected, atol=1e-2)
+
+
+def test_spectrogram_with_other_parameters_should_match_tensorflow(test_wav_file):
+    wav = tp.load_wav(test_wav_file)
+    expected = tp.spectrogram(wav.audio, 16000, 0.025, 0.4).numpy()
+    spc = stft.spectrogram(wav.audio.numpy(), 16000, 0.025, 0.4)
+    assert spc.shape == expected.shape
+    assert np.allclose(spc, expected, atol=1e-2)
+
+
+def test_batch_spectrogram_should_match_tensorflow(waveforms):
+    expected = tp.batch_spectrogram(waveforms, 48000, 0.01, 0.5).numpy()
+    spc = stft.batch_spectrogram(waveforms, 48000, 0.01, 0.5)
+    assert spc.shape == (3, 257, 199)
+    assert np.allclose(spc, expected, atol=1e-2)
+
+
+def test_batch_spectrogram_should_match_spectrogram(waveforms):
+    spc = stft.batch_spectrogram(waveforms, 48000, 0.01, 0.5)
+    for i, waveform in enumerate(waveforms):
+        assert np.allclose(spc[i], stft.spectrogram(waveform, 48000, 0.01, 0.5), atol=1e-4)
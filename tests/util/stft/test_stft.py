@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from util import stft
+
+
+@pytest.fixture
+def signals():
+    random = np.random.RandomState(0)
+    return random.uniform(-1, 1, (2, 4800)).astype(np.float32)
+
+
+def test_hann_window():
+    assert np.allclose(stft.hann_window(480), tf.signal.hann_window(480).numpy(), atol=1e-6)
+
+
+def test_frame(signals):
+    frames = stft.frame(signals, 480, 240)
+    assert frames.shape == (2, 19, 480)
+    assert np.array_equal(frames[1, 3], signals[1, 720:1200])
+    assert np.shares_memory(frames, signals)
+    assert not frames.flags.writeable
+
+
+def test_frame_with_short_signal():
+    assert stft.frame(np.zeros(100), 480, 240).shape == (0, 480)
+
+
+def test_stft_should_match_tensorflow(signals):
+    expected = tf.signal.stft(signals, 480, 240).numpy()
+    result = stft.stft(signals, 480, 240)
+    assert result.shape == expected.shape == (2, 19, 257)
+    assert np.allclose(result, expected, atol=1e-3)
@@ -1,4 +1,5 @@
 import pytest
+import tensorflow as tf
 
 from util import tensorplow as tp
 
@@ -12,3 +13,10 @@ def test_spectrogram(test_wav_file):
     wav = tp.load_wav(test_wav_file)
     spc = tp.spectrogram(wav.audio, 48000, 0.01, 0.5)
     assert spc.shape == (257, 199)
+
+
+def test_batch_spectrogram(test_wav_file):
+    wav = tp.load_wav(test_wav_file)
+    waveforms = tf.stack(2 * [tf.squeeze(wav.audio)])
+    spc = tp.batch_spectrogram(waveforms, 48000, 0.01, 0.5)
+    assert spc.shape == (2, 257, 199)
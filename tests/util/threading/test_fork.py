@@ -23,3 +23,10 @@ def test_fork_with_different_arguments_length(target):
     args = ((test_list,) for i in range(2))
     with pytest.raises(ValueError):
         fork(3, target, *args)
+
+
+def test_fork_should_pass_own_arguments_to_each_thread():
+    test_list = list()
+    args = ((i,) for i in range(3))
+    fork(3, test_list.append, *args)
+    assert sorted(test_list) == [0, 1, 2]
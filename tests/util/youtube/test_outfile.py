@@ -0,0 +1,31 @@
+from util import youtube as yt
+
+
+def test_outfile():
+    assert yt.outfile('raw/0qZ3tI4nAZE/0qZ3tI4nAZE', 'mp4') == 'raw/0qZ3tI4nAZE/0qZ3tI4nAZE.mp4'
+
+
+def test_outfile_with_offset():
+    assert yt.outfile('raw/0qZ3tI4nAZE/0qZ3tI4nAZE', 'mkv', 5.4) == 'raw/0qZ3tI4nAZE/0qZ3tI4nAZE.5400ms.mkv'
+
+
+def test_parse_outfile():
+    assert yt.parse_outfile('raw/0qZ3tI4nAZE/0qZ3tI4nAZE.mp4') == ('0qZ3tI4nAZE', None, 'mp4')
+    assert yt.parse_outfile('--aE2O5G5WE.webm') == ('--aE2O5G5WE', None, 'webm')
+
+
+def test_parse_outfile_with_offset():
+    assert yt.parse_outfile('raw/0qZ3tI4nAZE/0qZ3tI4nAZE.5400ms.mkv') == ('0qZ3tI4nAZE', 5.4, 'mkv')
+    assert yt.parse_outfile(yt.outfile('0qZ3tI4nAZE', 'mp4', 0.)) == ('0qZ3tI4nAZE', 0., 'mp4')
+
+
+def test_parse_outfile_with_other_files():
+    assert yt.parse_outfile('0qZ3tI4nAZE.json') is None
+    assert yt.parse_outfile('0qZ3tI4nAZE.wav') is None
+    assert yt.parse_outfile('0qZ3tI4nAZE.part.mp4') is None
+    assert yt.parse_outfile('0qZ3tI4nAZE.mp4.part') is None
+
+
+def test_is_outfile():
+    assert yt.is_outfile('raw/0qZ3tI4nAZE/0qZ3tI4nAZE.5400ms.mkv', '0qZ3tI4nAZE')
+    assert not yt.is_outfile('raw/0qZ3tI4nAZE/other.mp4', '0qZ3tI4nAZE')
@@ -0,0 +1,260 @@
+import os
+import threading
+
+import pytest
+import youtube_dl
+from furl import furl
+
+from tests.utils import *
+from util import youtube as yt
+
+os.environ[yt.YDL_EXECUTE_MODE] = yt.YDL_TESTING_MODE
+
+
+@pytest.fixture
+def output_dir():
+    return 'tests/.temp/youtube'
+
+
+@pytest.fixture
+def failures_file(output_dir):
+    return os.path.join(output_dir, yt.failures_filename)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = list()
+    monkeypatch.setattr(yt.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """
+    youtube_dl stand-in raising the errors queued in `errors[ytid]` before succeeding.
+    """
+    backend = {'errors': dict(), 'requests': list(), 'instances': list(), 'processed': list()}
+
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or dict()
+            backend['instances'].append(self)
+
+        def request(self, url):
+            v = furl(url).args['v']
+            backend['requests'].append(v)
+            errors = backend['errors'].get(v)
+            if errors:
+                raise youtube_dl.DownloadError(errors.pop(0))
+            return v
+
+        def extract_info(self, url, download=True):
+            return {'id': self.request(url),
+                    'duration': 10,
+                    'requested_formats': [{'format_id': '18', 'url': 'https://example.com/18'}],
+                    'formats': [{'format_id': '18', 'ext': 'mp4', 'filesize': 1024, 'url': 'https://example.com/18'},
+                                {'format_id': '22', 'ext': 'mp4', 'filesize': None, 'url': 'https://example.com/22'}]}
+
+        def process_ie_result(self, info, download=True):
+            backend['outtmpl'] = self.params.get('outtmpl')
+            backend['processed'].append(info)
+            errors = backend['errors'].get(info['id'])
+            if errors:
+                raise youtube_dl.DownloadError(errors.pop(0))
+            return info
+
+        def download(self, urls):
+            backend['outtmpl'] = self.params.get('outtmpl')
+            self.request(urls[0])
+            return 0
+
+    monkeypatch.setattr(youtube_dl, 'YoutubeDL', YoutubeDL)
+    return backend
+
+
+def test_info(backend):
+    assert yt.YoutubeDownloader().info('SmOwn_OEJTo')['id'] == 'SmOwn_OEJTo'
+
+
+def test_dl_with_outtmpl(backend):
+    downloader = yt.YoutubeDownloader()
+    assert downloader.dl('SmOwn_OEJTo', outtmpl='raw/%(id)s.%(ext)s') == 0
+    assert backend['outtmpl'] == 'raw/%(id)s.%(ext)s'
+
+
+def test_should_reuse_youtube_dl(backend):
+    downloader = yt.YoutubeDownloader()
+    downloader.info('SmOwn_OEJTo')
+    downloader.dl('SmOwn_OEJTo', outtmpl='a')
+    downloader.dl('iYWvaxU5OXk', outtmpl='b')
+    assert len(backend['instances']) == 1
+
+
+def test_should_use_youtube_dl_per_thread(backend):
+    downloader = yt.YoutubeDownloader()
+    threads = [threading.Thread(target=downloader.info, args=('SmOwn_OEJTo',)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(backend['instances']) == 3
+
+
+def test_retry_with_backoff(backend, sleeps):
+    backend['errors']['SmOwn_OEJTo'] = ['ERROR: timed out'] * 3
+    downloader = yt.YoutubeDownloader(backoff=1, max_backoff=3)
+    assert downloader.info('SmOwn_OEJTo')['id'] == 'SmOwn_OEJTo'
+    assert sleeps == [1, 2, 3]
+    assert backend['requests'] == ['SmOwn_OEJTo'] * 4
+
+
+def test_retry_should_stop_after_max_attempts(backend, sleeps):
+    backend['errors']['SmOwn_OEJTo'] = ['ERROR: timed out'] * 5
+    downloader = yt.YoutubeDownloader(max_attempts=3)
+    assert downloader.info('SmOwn_OEJTo') == -1
+    assert len(backend['requests']) == 3
+    assert 'SmOwn_OEJTo' not in downloader.failures
+
+
+def test_retry_should_stop_after_max_attempts_and_raise_exception(backend, sleeps):
+    backend['errors']['SmOwn_OEJTo'] = ['ERROR: timed out'] * 5
+    with pytest.raises(youtube_dl.DownloadError):
+        yt.YoutubeDownloader(max_attempts=2).info('SmOwn_OEJTo', raise_exception=True)
+
+
+def test_permanent_failure(backend, sleeps, output_dir, failures_file):
+    backend['errors']['xxxxxxxxxxx'] = ['ERROR: This video is unavailable.']
+    with temp_dir(output_dir):
+        downloader = yt.YoutubeDownloader(failures_file)
+        assert downloader.dl('xxxxxxxxxxx', outtmpl='a') == -1
+        assert downloader.info('xxxxxxxxxxx') == -1
+        assert backend['requests'] == ['xxxxxxxxxxx']
+        assert not sleeps
+
+        failures = yt.YoutubeDownloader(failures_file).failures
+    assert failures == {'xxxxxxxxxxx': 'ERROR: This video is unavailable.'}
+
+
+def test_permanent_failure_with_raise_exception(backend, sleeps):
+    backend['errors']['xxxxxxxxxxx'] = ['ERROR: This video is unavailable.']
+    downloader = yt.YoutubeDownloader()
+    with pytest.raises(youtube_dl.DownloadError):
+        downloader.info('xxxxxxxxxxx', raise_exception=True)
+    with pytest.raises(youtube_dl.DownloadError):
+        downloader.info('xxxxxxxxxxx', raise_exception=True)
+    assert backend['requests'] == ['xxxxxxxxxxx']
+
+
+# noinspection PyTypeChecker
+def test_invalid_max_attempts_type():
+    with pytest.raises(TypeError):
+        yt.YoutubeDownloader(max_attempts=1.5)
+
+
+def test_invalid_max_attempts():
+    with pytest.raises(ValueError):
+        yt.YoutubeDownloader(max_attempts=0)
+
+
+@pytest.fixture
+def info_file(output_dir):
+    return os.path.join(output_dir, yt.info_cache_filename)
+
+
+@pytest.fixture
+def info():
+    return {'id': 'SmOwn_OEJTo',
+            'duration': 10,
+            'formats': [{'format_id': '18', 'ext': 'mp4', 'filesize': 1024, 'url': 'https://example.com/18'},
+                        {'format_id': '22', 'ext': 'mp4', 'filesize': 2048, 'url': 'https://example.com/22'}]}
+
+
+def test_summarize(info):
+    summary = yt.summarize(info)
+    assert summary['id'] == 'SmOwn_OEJTo'
+    assert summary['duration'] == 10
+    assert summary['filesize'] == 2048
+    assert summary['formats'][0] == {'format_id': '18', 'ext': 'mp4', 'filesize': 1024}
+
+
+def test_summarize_without_filesize():
+    assert yt.summarize({'id': 'SmOwn_OEJTo', 'formats': [{'filesize': None}]})['filesize'] is None
+    assert yt.summarize({'id': 'SmOwn_OEJTo'})['filesize'] is None
+
+
+def test_info_cache(output_dir, info_file, info):
+    with temp_dir(output_dir):
+        cache = yt.InfoCache(info_file)
+        assert cache.get('SmOwn_OEJTo') is None
+        cache.put('SmOwn_OEJTo', info)
+        assert cache.get('SmOwn_OEJTo') == yt.summarize(info)
+        assert yt.InfoCache(info_file).get('SmOwn_OEJTo') == yt.summarize(info)
+
+
+def test_info_cache_with_expired_entry(output_dir, info_file, info, monkeypatch):
+    with temp_dir(output_dir):
+        cache = yt.InfoCache(info_file, ttl=60)
+        cache.put('SmOwn_OEJTo', info)
+        now = yt.time.time()
+        monkeypatch.setattr(yt.time, 'time', lambda: now + 60)
+        assert cache.get('SmOwn_OEJTo') is None
+
+
+def test_info_cache_with_interrupted_write(output_dir, info_file, info):
+    with temp_dir(output_dir):
+        yt.InfoCache(info_file).put('SmOwn_OEJTo', info)
+        with open(info_file, 'a') as outfile:
+            outfile.write('{"id": "iYWvaxU5OXk", "fetch')
+        cache = yt.InfoCache(info_file)
+        assert cache.get('SmOwn_OEJTo') is not None
+        assert cache.get('iYWvaxU5OXk') is None
+
+
+def test_probe(backend, output_dir, info_file):
+    with temp_dir(output_dir):
+        summary = yt.YoutubeDownloader(info_file=info_file).probe('SmOwn_OEJTo')
+        assert summary['filesize'] == 1024
+        assert yt.YoutubeDownloader(info_file=info_file).probe('SmOwn_OEJTo') == summary
+    assert backend['requests'] == ['SmOwn_OEJTo']
+
+
+def test_probe_without_info_cache(backend):
+    downloader = yt.YoutubeDownloader()
+    assert downloader.probe('SmOwn_OEJTo')['filesize'] == 1024
+    assert downloader.probe('SmOwn_OEJTo')['filesize'] == 1024
+    assert backend['requests'] == ['SmOwn_OEJTo', 'SmOwn_OEJTo']
+
+
+def test_probe_with_permanent_failure(backend):
+    backend['errors']['xxxxxxxxxxx'] = ['ERROR: This video is unavailable.']
+    assert yt.YoutubeDownloader().probe('xxxxxxxxxxx') == -1
+
+
+def test_dl_should_reuse_info(backend):
+    downloader = yt.YoutubeDownloader()
+    downloader.info('SmOwn_OEJTo')
+    assert downloader.dl('SmOwn_OEJTo', outtmpl='a') == 0
+    assert backend['requests'] == ['SmOwn_OEJTo']
+    assert backend['outtmpl'] == 'a'
+    assert 'requested_formats' not in backend['processed'][0]
+
+    # the info is only reused once
+    downloader.dl('SmOwn_OEJTo', outtmpl='a')
+    assert backend['requests'] == ['SmOwn_OEJTo', 'SmOwn_OEJTo']
+
+
+def test_dl_should_not_reuse_info_of_other_video(backend):
+    downloader = yt.YoutubeDownloader()
+    downloader.info('SmOwn_OEJTo')
+    downloader.dl('iYWvaxU5OXk', outtmpl='a')
+    assert not backend['processed']
+    assert backend['requests'] == ['SmOwn_OEJTo', 'iYWvaxU5OXk']
+
+
+def test_dl_with_expired_info(backend, sleeps):
+    downloader = yt.YoutubeDownloader()
+    downloader.info('SmOwn_OEJTo')
+    backend['errors']['SmOwn_OEJTo'] = ['ERROR: HTTP Error 403: Forbidden']
+    assert downloader.dl('SmOwn_OEJTo', outtmpl='a') == 0
+    assert len(backend['processed']) == 1
+    assert backend['requests'] == ['SmOwn_OEJTo', 'SmOwn_OEJTo']